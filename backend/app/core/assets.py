@@ -0,0 +1,209 @@
+# --- START OF FILE backend/app/core/assets.py ---
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+
+from . import http_cache
+
+try: # Optional: brotli gives ~15-20% smaller JS/CSS than gzip
+    import brotli
+except ImportError: # pragma: no cover - depends on the environment
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Versioned URLs (?v=<content hash>) never change content, so they can be cached for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Unversioned assets and HTML shells: cache, but always revalidate with the ETag
+REVALIDATE = "public, no-cache"
+
+_COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "image/x-icon",
+                       "image/vnd.microsoft.icon")
+# Quoted references to /static/... in HTML (href/src attributes and inline `import ... from '/static/...'`)
+_STATIC_REFERENCE = re.compile(r"""(["'])(/static/[^"'?#\s]+)\1""")
+_MIN_COMPRESS_BYTES = 512
+
+
+class Asset:
+    """One file from the frontend directory with its validators and (for small files) cached bodies."""
+
+    def __init__(self, path: Path, media_type: str, mtime: float, content_hash: str, body: Optional[bytes]):
+        self.path = path
+        self.media_type = media_type
+        self.mtime = mtime
+        self.content_hash = content_hash
+        self.body = body # None when the file is larger than the in-memory cache limit
+        self.encoded: Dict[str, bytes] = {} # "gzip"/"br" -> precompressed body
+        self.etag = f'W/"{content_hash}"' # Weak: the same validator covers every content-coding
+
+    @property
+    def compressible(self) -> bool:
+        return (self.body is not None and len(self.body) >= _MIN_COMPRESS_BYTES
+                and self.media_type.startswith(_COMPRESSIBLE_TYPES))
+
+
+class AssetStore:
+    """
+    Serves files from the frontend directory with in-memory caching of small files,
+    precompressed gzip/brotli variants, content-hash ETags and cache headers.
+    HTML shells are rewritten so that /static/... references carry ?v=<hash>.
+    Cache hits are answered on the event loop; misses (disk reads, hashing, compression) in the threadpool.
+    """
+
+    def __init__(self, root: Path, max_cached_bytes: int = 256 * 1024, reload: bool = False):
+        self.root = root.resolve()
+        self.max_cached_bytes = max_cached_bytes
+        self.reload = reload # Dev mode: re-stat files on every request and pick up edits
+        self._assets: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+
+    # --- Loading ---
+    def _resolve(self, rel_path: str) -> Optional[Path]:
+        candidate = (self.root / rel_path).resolve()
+        if candidate != self.root and self.root not in candidate.parents:
+            return None # Path traversal attempt
+        return candidate if candidate.is_file() else None
+
+    def _load(self, rel_path: str) -> Optional[Asset]:
+        path = self._resolve(rel_path)
+        if path is None:
+            return None
+        stat = path.stat()
+        media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if stat.st_size <= self.max_cached_bytes:
+            body = path.read_bytes()
+            if media_type == "text/html":
+                body = self._versionize_html(body)
+            content_hash = hashlib.sha256(body).hexdigest()[:16]
+        else:
+            body = None
+            digest = hashlib.sha256()
+            with path.open("rb") as handle:
+                for chunk in iter(lambda: handle.read(64 * 1024), b""):
+                    digest.update(chunk)
+            content_hash = digest.hexdigest()[:16]
+        return Asset(path, media_type, stat.st_mtime, content_hash, body)
+
+    def get(self, rel_path: str) -> Optional[Asset]:
+        rel_path = rel_path.lstrip("/")
+        asset = self._assets.get(rel_path)
+        if asset is not None and self.reload:
+            try:
+                stale = asset.path.stat().st_mtime != asset.mtime or asset.media_type == "text/html"
+            except OSError:
+                stale = True
+            if stale:
+                asset = None
+        if asset is None:
+            asset = self._load(rel_path)
+            if asset is None:
+                return None
+            with self._lock:
+                self._assets[rel_path] = asset
+        return asset
+
+    def _versionize_html(self, body: bytes) -> bytes:
+        def add_version(match: "re.Match[str]") -> str:
+            quote, url = match.group(1), match.group(2)
+            asset = self.get(url)
+            if asset is None:
+                return match.group(0)
+            return f"{quote}{url}?v={asset.content_hash}{quote}"
+        return _STATIC_REFERENCE.sub(add_version, body.decode("utf-8")).encode("utf-8")
+
+    def _encoded_body(self, asset: Asset, encoding: str) -> bytes:
+        body = asset.encoded.get(encoding)
+        if body is None:
+            if encoding == "br":
+                body = brotli.compress(asset.body, quality=11)
+            else:
+                body = gzip.compress(asset.body, compresslevel=9, mtime=0)
+            asset.encoded[encoding] = body
+        return body
+
+    def preload(self, rel_dir: str = "") -> int:
+        """Load and precompress every file under `rel_dir` up front. Returns the number of files."""
+        base = self.root / rel_dir
+        count = 0
+        for dirpath, _, filenames in os.walk(base):
+            for filename in filenames:
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, "/")
+                asset = self.get(rel_path)
+                if asset is None:
+                    continue
+                count += 1
+                if asset.compressible:
+                    self._encoded_body(asset, "gzip")
+                    if brotli is not None:
+                        self._encoded_body(asset, "br")
+        return count
+
+    # --- Serving ---
+    @staticmethod
+    def _accepted_encodings(request: Request) -> set:
+        accepted = set()
+        for token in request.headers.get("accept-encoding", "").split(","):
+            name, _, params = token.strip().partition(";")
+            if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(name.strip().lower())
+        return accepted
+
+    def _negotiate(self, request: Request, asset: Asset) -> Optional[str]:
+        if not asset.compressible:
+            return None
+        accepted = self._accepted_encodings(request)
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _in_memory(self, request: Request, rel_path: str) -> bool:
+        """True if the response is ready in memory: the file is loaded and, if negotiated, compressed."""
+        asset = self._assets.get(rel_path.lstrip("/"))
+        if asset is None or self.reload: # Reload mode stats the file on every request
+            return False
+        encoding = self._negotiate(request, asset)
+        return encoding is None or encoding in asset.encoded
+
+    async def serve(self, request: Request, rel_path: str, cache_control: str = REVALIDATE) -> Response:
+        """Serve one file; a ?v= query matching the content hash upgrades it to an immutable response."""
+        if self._in_memory(request, rel_path):
+            return self._respond(request, rel_path, cache_control)
+        return await run_in_threadpool(self._respond, request, rel_path, cache_control)
+
+    def _respond(self, request: Request, rel_path: str, cache_control: str) -> Response:
+        asset = self.get(rel_path)
+        if asset is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"{rel_path} not found")
+        if request.query_params.get("v") == asset.content_hash:
+            cache_control = IMMUTABLE
+
+        headers = {"ETag": asset.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+        if http_cache.is_not_modified(request, asset.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        if asset.body is None:
+            return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+
+        encoding = self._negotiate(request, asset)
+        body = asset.body
+        if encoding is not None:
+            body = self._encoded_body(asset, encoding)
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=asset.media_type, headers=headers)
+
+    async def serve_page(self, request: Request, name: str) -> Response:
+        """Serve an HTML shell. Always revalidated, so new asset versions are picked up on the next load."""
+        return await self.serve(request, name, cache_control=REVALIDATE)
+# --- END OF FILE backend/app/core/assets.py ---
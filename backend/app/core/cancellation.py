@@ -0,0 +1,126 @@
+# --- START OF FILE backend/app/core/cancellation.py ---
+"""
+Request-scoped cancellation of LLM work.
+
+A model call whose result nobody will read still burns quota and holds a concurrency slot.
+run_cancellable runs such a call as a task and cancels it as soon as the request's deadline
+passes or its client disconnects (polled every CANCEL_POLL_INTERVAL_MS through
+Request.is_disconnected(), which never blocks). Cancelling the task cancels the awaited gRPC
+call; services undo their own partial state on asyncio.CancelledError (ChatService forgets the
+unfinished turn). Work whose own task gets cancelled (a closed WebSocket, a StreamingResponse
+whose client left) is cancelled with it and counted as a disconnect.
+
+Outcomes are counted per operation for GET /api/debug/cancellations (per worker process).
+"""
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Dict, Optional
+
+from starlette.requests import Request
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+CLIENT_CLOSED_REQUEST = 499 # nginx's status for "client went away"; only ever seen in logs
+COMPLETED, FAILED, DISCONNECT, DEADLINE = "completed", "failed", "disconnect", "deadline"
+
+
+class RequestCancelled(Exception):
+    """The LLM work of a request was cancelled before it finished."""
+    reason = "cancelled"
+
+    def __init__(self, operation: str, elapsed: float):
+        super().__init__(f"{operation} cancelled ({self.reason}) after {elapsed:.1f}s")
+        self.operation = operation
+        self.elapsed = elapsed
+
+class ClientDisconnected(RequestCancelled):
+    reason = DISCONNECT
+
+class DeadlineExceeded(RequestCancelled):
+    reason = DEADLINE
+
+
+class CancellationStats:
+    """Per-operation counts of LLM work completed, failed and cancelled (by disconnect or deadline)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.operations: Dict[str, Dict[str, float]] = {}
+            self.since = time.time()
+
+    def record(self, operation: str, outcome: str, elapsed: float) -> None:
+        with self._lock:
+            stats = self.operations.setdefault(operation, {
+                COMPLETED: 0, FAILED: 0, DISCONNECT: 0, DEADLINE: 0, "cancelled_seconds": 0.0,
+            })
+            stats[outcome] += 1
+            if outcome in (DISCONNECT, DEADLINE):
+                stats["cancelled_seconds"] += elapsed # Model time spent on results nobody read
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            operations = {name: dict(stats) for name, stats in self.operations.items()}
+        return {
+            "since": self.since,
+            "cancelled": sum(stats[DISCONNECT] + stats[DEADLINE] for stats in operations.values()),
+            "operations": operations,
+        }
+
+
+async def run_cancellable(work: Awaitable, operation: str, request: Optional[Request] = None,
+                          deadline_seconds: Optional[float] = None) -> Any:
+    """
+    Await `work` as a task, cancelling it once `deadline_seconds` have passed (None or 0: no
+    deadline) or `request`'s client has disconnected. Returns its result or re-raises its error;
+    raises DeadlineExceeded / ClientDisconnected after a cancellation.
+    """
+    task = asyncio.ensure_future(work)
+    start = time.monotonic()
+    deadline = start + deadline_seconds if deadline_seconds else None
+    poll = settings.CANCEL_POLL_INTERVAL_MS / 1000 if request is not None else None
+    cancelled: Optional[type] = None
+    try:
+        while not task.done():
+            timeout = poll
+            if deadline is not None:
+                remaining = max(deadline - time.monotonic(), 0)
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            await asyncio.wait({task}, timeout=timeout)
+            if task.done():
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                cancelled = DeadlineExceeded
+            elif request is not None and await request.is_disconnected():
+                cancelled = ClientDisconnected
+            if cancelled is not None:
+                task.cancel()
+                await asyncio.wait({task}) # Let the work clean up before answering
+                break
+    except asyncio.CancelledError:
+        # Our own task was cancelled (socket closed, streaming client gone, shutdown): take the work down too
+        task.cancel()
+        cancellation_stats.record(operation, DISCONNECT, time.monotonic() - start)
+        raise
+
+    elapsed = time.monotonic() - start
+    if cancelled is not None:
+        cancellation_stats.record(operation, cancelled.reason, elapsed)
+        logger.info(f"Cancelled {operation} after {elapsed:.1f}s: {cancelled.reason}")
+        if not task.cancelled():
+            task.exception() # It finished in the same instant: drop the outcome, mark any error retrieved
+        raise cancelled(operation, elapsed)
+    cancellation_stats.record(operation, FAILED if task.cancelled() or task.exception() is not None else COMPLETED, elapsed)
+    return task.result()
+
+
+# Process-wide counters, exported at GET /api/debug/cancellations
+cancellation_stats = CancellationStats()
+# --- END OF FILE backend/app/core/cancellation.py ---
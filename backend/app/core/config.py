@@ -14,6 +14,120 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
     GEMINI : str = os.getenv("GEMINI", "Gemini")
 
+    # --- Database connection pool ---
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", 10)) # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", 1800)) # Seconds; -1 disables recycling
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 15000)) # PostgreSQL only; 0 disables
+    DB_POOL_SATURATION_THRESHOLD: float = float(os.getenv("DB_POOL_SATURATION_THRESHOLD", 0.9)) # /api/ready reports 503 above this
+
+    # --- SQLite (DATABASE_URL unset or sqlite:///<file>) ---
+    SQLITE_TUNING: bool = os.getenv("SQLITE_TUNING", "true").lower() == "true" # WAL, one writer connection, pooled read-only readers
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "normal").upper() # NORMAL survives app crashes in WAL mode; FULL also power loss
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", 65536)) # Page cache per connection
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", 256)) # Memory-mapped reads; 0 disables
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)) # Wait this long for a lock instead of failing
+    SQLITE_READER_POOL_SIZE: int = int(os.getenv("SQLITE_READER_POOL_SIZE", 4)) # Read-only connections; 0 reads on the writer
+
+    # --- Read replicas ---
+    DATABASE_REPLICA_URLS: str = os.getenv("DATABASE_REPLICA_URLS", "") # Comma-separated; empty = primary only
+    DB_READ_YOUR_WRITES_SECONDS: float = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", 5)) # Reads stick to primary this long after a user's write
+
+    # --- Journal table partitioning (PostgreSQL only; see db/partitioning.py) ---
+    JOURNAL_PARTITIONING: str = os.getenv("JOURNAL_PARTITIONING", "off").lower() # off | time | owner | time_owner
+    JOURNAL_PARTITION_MONTHS: int = int(os.getenv("JOURNAL_PARTITION_MONTHS", 1)) # Width of a created_at range partition (1, 3, 6 or 12)
+    JOURNAL_OWNER_PARTITIONS: int = int(os.getenv("JOURNAL_OWNER_PARTITIONS", 8)) # Hash partitions per table or per range
+    JOURNAL_PARTITIONS_AHEAD: int = int(os.getenv("JOURNAL_PARTITIONS_AHEAD", 3)) # Future ranges kept created (at startup / ensure-partitions)
+
+    # --- SQL profiling (GET /api/debug/sql-profile) ---
+    SQL_PROFILING_ENABLED: bool = os.getenv("SQL_PROFILING_ENABLED", "false").lower() == "true"
+    SQL_SLOW_QUERY_MS: float = float(os.getenv("SQL_SLOW_QUERY_MS", 200)) # Slower statements are logged, parameters redacted
+    SQL_N_PLUS_ONE_THRESHOLD: int = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5)) # Same statement this often in one request = N+1
+
+    # --- Event loop monitoring (GET /api/debug/loop-lag) ---
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+    LOOP_MONITOR_INTERVAL_MS: float = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", 100)) # Lag sampling period
+    LOOP_BLOCK_THRESHOLD_MS: float = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", 200)) # Capture the stack of longer stalls
+    LOOP_MONITOR_DEBUG: bool = os.getenv("LOOP_MONITOR_DEBUG", "false").lower() == "true" # asyncio debug mode + full stacks
+
+    # --- Frontend asset serving ---
+    STATIC_CACHE_MAX_FILE_BYTES: int = int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES", 256 * 1024)) # Larger files are streamed from disk
+    STATIC_PRECOMPRESS_ON_STARTUP: bool = os.getenv("STATIC_PRECOMPRESS_ON_STARTUP", "true").lower() == "true"
+    STATIC_ASSETS_RELOAD: bool = os.getenv("STATIC_ASSETS_RELOAD", "false").lower() == "true" # Dev: pick up file edits without restart
+
+    # --- AI service ---
+    AI_WARMUP_ON_STARTUP: bool = os.getenv("AI_WARMUP_ON_STARTUP", "false").lower() == "true" # Open the Gemini channel at startup
+    AI_WARMUP_IDLE_SECONDS: int = int(os.getenv("AI_WARMUP_IDLE_SECONDS", 300)) # Re-warm on chat page open after this much idle time; 0 disables
+    CONSULT_BATCH_CONCURRENCY: int = int(os.getenv("CONSULT_BATCH_CONCURRENCY", 4)) # Model calls in flight per batch consultation
+    CHAT_WS_HEARTBEAT_SECONDS: float = float(os.getenv("CHAT_WS_HEARTBEAT_SECONDS", 20)) # Server pings an idle socket this often; 2 missed = dead
+    CHAT_WS_AUTH_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_WS_AUTH_TIMEOUT_SECONDS", 10)) # A new socket must send its `auth` frame within this
+    CHAT_WS_IDLE_TIMEOUT_SECONDS: float = float(os.getenv("CHAT_WS_IDLE_TIMEOUT_SECONDS", 900)) # Close after this long without a user message; 0 disables
+    CHAT_DEADLINE_SECONDS: float = float(os.getenv("CHAT_DEADLINE_SECONDS", 60)) # A chat turn still running after this is cancelled (504); 0 disables
+    CONSULT_DEADLINE_SECONDS: float = float(os.getenv("CONSULT_DEADLINE_SECONDS", 90)) # Same per consultation (single or batch item); 0 disables
+    CANCEL_POLL_INTERVAL_MS: int = int(os.getenv("CANCEL_POLL_INTERVAL_MS", 250)) # How often a waiting request checks whether its client left
+
+    # --- Chat transcripts ---
+    CHAT_HISTORY_BATCH_SIZE: int = int(os.getenv("CHAT_HISTORY_BATCH_SIZE", 100)) # Messages per INSERT
+    CHAT_HISTORY_FLUSH_MS: int = int(os.getenv("CHAT_HISTORY_FLUSH_MS", 500)) # Max wait for a batch to fill
+    CHAT_RESUME_TAIL_MESSAGES: int = int(os.getenv("CHAT_RESUME_TAIL_MESSAGES", 20)) # Messages reloaded into a resumed session
+
+    # --- Journal digests (weekly/monthly summaries as chat context) ---
+    DIGESTS_ENABLED: bool = os.getenv("DIGESTS_ENABLED", "false").lower() == "true" # Build digests and chat with them
+    DIGEST_INTERVAL_SECONDS: float = float(os.getenv("DIGEST_INTERVAL_SECONDS", 60)) # How often the scheduler looks for stale digests
+    DIGEST_SETTLE_SECONDS: float = float(os.getenv("DIGEST_SETTLE_SECONDS", 600)) # Leave a changed week alone this long before re-summarizing
+    DIGEST_BATCH_SIZE: int = int(os.getenv("DIGEST_BATCH_SIZE", 20)) # Periods summarized per scheduler round
+    DIGEST_LEASE_SECONDS: float = float(os.getenv("DIGEST_LEASE_SECONDS", 300)) # A worker's claim on a digest it is summarizing; expires if the worker dies
+    DIGEST_MAX_CHARS: int = int(os.getenv("DIGEST_MAX_CHARS", 1200)) # Upper bound on one stored summary
+    DIGEST_CONTEXT_WEEKS: int = int(os.getenv("DIGEST_CONTEXT_WEEKS", 8)) # Recent history given week by week...
+    DIGEST_CONTEXT_MONTHS: int = int(os.getenv("DIGEST_CONTEXT_MONTHS", 12)) # ...and older history month by month
+    DIGEST_RECENT_ENTRIES: int = int(os.getenv("DIGEST_RECENT_ENTRIES", 3)) # Full entries kept in the chat context alongside digests
+
+    # --- LLM usage metering and budgets ---
+    USAGE_FLUSH_SECONDS: float = float(os.getenv("USAGE_FLUSH_SECONDS", 10)) # Token counters are written at most this late
+    USAGE_FLUSH_BATCH: int = int(os.getenv("USAGE_FLUSH_BATCH", 500)) # ...or as soon as this many (user, day, feature) counters are pending
+    USAGE_DAILY_TOKEN_BUDGET: int = int(os.getenv("USAGE_DAILY_TOKEN_BUDGET", 0)) # Tokens per user per UTC day; 0 = unlimited
+    USAGE_DEGRADE_AT: float = float(os.getenv("USAGE_DEGRADE_AT", 0.7)) # Share of the budget after which contexts shrink
+    USAGE_REFUSE_CONSULT_AT: float = float(os.getenv("USAGE_REFUSE_CONSULT_AT", 0.9)) # ...consults are refused (429); chat stops at 100%
+    USAGE_DEGRADED_CONTEXT_ENTRIES: int = int(os.getenv("USAGE_DEGRADED_CONTEXT_ENTRIES", 2)) # Context entries while degraded (no digests)
+    USAGE_BUDGET_REFRESH_SECONDS: float = float(os.getenv("USAGE_BUDGET_REFRESH_SECONDS", 30)) # Re-read today's total (other workers' usage) this often
+
+    # --- Editor autosave ---
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", 1)) # Worker processes (exported by gunicorn_conf.py)
+    # Autosaves within this window share one UPDATE; 0 writes each one. The window lives in one worker's
+    # memory and other workers would read stale entries, so it is off by default with several workers
+    AUTOSAVE_COALESCE_MS: int = int(os.getenv("AUTOSAVE_COALESCE_MS", 3000 if WEB_CONCURRENCY <= 1 else 0))
+    AUTOSAVE_MAX_PENDING_EDITS: int = int(os.getenv("AUTOSAVE_MAX_PENDING_EDITS", 20)) # Write early after this many unwritten autosaves
+
+    # --- Local mood scoring (torch + transformers, CPU) ---
+    MOOD_SCORING_ENABLED: bool = os.getenv("MOOD_SCORING_ENABLED", "false").lower() == "true"
+    MOOD_MODEL: str = os.getenv("MOOD_MODEL", "cardiffnlp/twitter-xlm-roberta-base-sentiment") # Multilingual, handles Vietnamese
+    MOOD_QUANTIZE: bool = os.getenv("MOOD_QUANTIZE", "true").lower() == "true" # Dynamic int8 quantization of Linear layers
+    MOOD_BATCH_SIZE: int = int(os.getenv("MOOD_BATCH_SIZE", 16))
+    MOOD_BATCH_WAIT_MS: int = int(os.getenv("MOOD_BATCH_WAIT_MS", 200)) # How long to wait for a micro-batch to fill
+    MOOD_MAX_TOKENS: int = int(os.getenv("MOOD_MAX_TOKENS", 256)) # Longer entries are truncated
+    MOOD_NUM_THREADS: int = int(os.getenv("MOOD_NUM_THREADS", 0)) # torch intra-op threads; 0 = torch default
+
+    # --- Local fallback model when Gemini is over quota or down (torch + transformers, CPU) ---
+    LOCAL_LLM_ENABLED: bool = os.getenv("LOCAL_LLM_ENABLED", "false").lower() == "true"
+    LOCAL_LLM_MODEL: str = os.getenv("LOCAL_LLM_MODEL", "Qwen/Qwen2.5-0.5B-Instruct") # Small multilingual instruction model, handles Vietnamese
+    LOCAL_LLM_QUANTIZE: bool = os.getenv("LOCAL_LLM_QUANTIZE", "true").lower() == "true" # Dynamic int8 quantization of Linear layers
+    LOCAL_LLM_MAX_BATCH: int = int(os.getenv("LOCAL_LLM_MAX_BATCH", 8)) # Concurrent requests decoded together
+    LOCAL_LLM_BATCH_WAIT_MS: int = int(os.getenv("LOCAL_LLM_BATCH_WAIT_MS", 50)) # How long a lone request waits for others to batch with
+    LOCAL_LLM_MAX_QUEUE: int = int(os.getenv("LOCAL_LLM_MAX_QUEUE", 32)) # Requests waiting beyond this are refused (503)
+    LOCAL_LLM_MAX_INPUT_TOKENS: int = int(os.getenv("LOCAL_LLM_MAX_INPUT_TOKENS", 2048)) # Longer prompts lose their oldest tokens
+    LOCAL_LLM_MAX_NEW_TOKENS: int = int(os.getenv("LOCAL_LLM_MAX_NEW_TOKENS", 384))
+    LOCAL_LLM_TEMPERATURE: float = float(os.getenv("LOCAL_LLM_TEMPERATURE", 0.7)) # 0 = greedy decoding
+    LOCAL_LLM_NUM_THREADS: int = int(os.getenv("LOCAL_LLM_NUM_THREADS", 0)) # torch intra-op threads; 0 = torch default
+    LOCAL_LLM_FAILOVER_SECONDS: float = float(os.getenv("LOCAL_LLM_FAILOVER_SECONDS", 30)) # After a Gemini outage/quota error, go straight to the local model this long
+
+    # --- Compression at rest (journal content) ---
+    CONTENT_COMPRESSION: str = os.getenv("CONTENT_COMPRESSION", "off").lower() # off | zlib | zstd; reads always decode
+    CONTENT_COMPRESSION_MIN_BYTES: int = int(os.getenv("CONTENT_COMPRESSION_MIN_BYTES", 2048)) # Smaller entries stay plain text
+    CONTENT_COMPRESSION_LEVEL: int = int(os.getenv("CONTENT_COMPRESSION_LEVEL", 0)) # 0 = codec default
+    CONTENT_DICT_DIR: str = os.getenv("CONTENT_DICT_DIR", "") # Trained zstd dictionaries (manage.py train-content-dict)
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
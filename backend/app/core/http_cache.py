@@ -0,0 +1,74 @@
+# --- START OF FILE backend/app/core/http_cache.py ---
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+# Per-user data: browsers may cache it, but must revalidate every time (cheap with 304s)
+PRIVATE_REVALIDATE = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the given version ingredients (ids, timestamps, counts...)."""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes for func.now(); they are UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def http_date(value: datetime) -> str:
+    """Format a datetime as an HTTP-date (RFC 9110), e.g. for Last-Modified."""
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+def _etag_matches(header_value: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison: W/"x" matches "x"
+    if header_value.strip() == "*":
+        return True
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header_value.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == wanted:
+            return True
+    return False
+
+def has_conditional_headers(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """
+    Evaluate If-None-Match / If-Modified-Since against the current representation.
+    If-None-Match takes precedence, as required by RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+    return False
+
+def apply_cache_headers(response: Response, etag: str, last_modified: Optional[datetime] = None,
+                        cache_control: str = PRIVATE_REVALIDATE) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None,
+                          cache_control: str = PRIVATE_REVALIDATE) -> Response:
+    """Empty 304 response carrying the validators the client should keep using."""
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    apply_cache_headers(response, etag, last_modified, cache_control)
+    return response
+# --- END OF FILE backend/app/core/http_cache.py ---
@@ -0,0 +1,196 @@
+# --- START OF FILE backend/app/core/loop_monitor.py ---
+import asyncio
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the lag histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_STALLS = 50 # Recent stalls kept for /api/debug/loop-lag
+
+_APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop runs and catches what blocks it.
+
+    A task on the loop sleeps LOOP_MONITOR_INTERVAL_MS at a time and records how much later than
+    asked it woke up (the lag) into a histogram. A watchdog thread checks the task's heartbeat:
+    when the loop has not run it for LOOP_BLOCK_THRESHOLD_MS, the loop thread is stuck in some
+    synchronous call (sync SQLAlchemy, bcrypt, ...), so the watchdog snapshots that thread's stack
+    (sys._current_frames) and records the stall with the handler and app call site on the stack.
+    LOOP_MONITOR_DEBUG additionally turns on asyncio debug mode, which logs every callback or task
+    step slower than the threshold by name, and keeps full stacks.
+    """
+
+    def __init__(self, interval_ms: float = settings.LOOP_MONITOR_INTERVAL_MS,
+                 threshold_ms: float = settings.LOOP_BLOCK_THRESHOLD_MS,
+                 debug: bool = settings.LOOP_MONITOR_DEBUG):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.debug = debug
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._open_stall: Optional[Dict[str, Any]] = None
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=MAX_STALLS)
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counts = [0] * (len(BUCKETS_MS) + 1)
+            self.samples = 0
+            self.total_lag = 0.0
+            self.max_lag = 0.0
+            self.stall_count = 0
+            self.stalls.clear()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Start measuring; must be called from the running event loop (app lifespan)."""
+        if self.running:
+            return
+        loop = asyncio.get_running_loop()
+        if self.debug:
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.threshold
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopping.clear()
+        self._task = loop.create_task(self._measure(), name="loop-lag-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started (interval {self.interval * 1000:.0f} ms, "
+                    f"block threshold {self.threshold * 1000:.0f} ms{', debug' if self.debug else ''}).")
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=2)
+            self._watchdog = None
+
+    def record(self, lag: float) -> None:
+        lag = max(lag, 0.0)
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS_MS, lag * 1000)] += 1
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            stall = self._open_stall
+            if stall is not None: # The loop is running again: the stall is over
+                stall["duration_ms"] = round(lag * 1000, 1)
+                self._open_stall = None
+
+    async def _measure(self) -> None:
+        while True:
+            start = time.monotonic()
+            self._heartbeat = start
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            self.record(now - start - self.interval)
+
+    def _watch(self) -> None:
+        check_every = max(self.threshold / 4, 0.005)
+        while not self._stopping.wait(check_every):
+            stalled_for = time.monotonic() - self._heartbeat - self.interval
+            if stalled_for < self.threshold:
+                continue
+            with self._lock:
+                if self._open_stall is not None: # Already captured this stall
+                    continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            self._capture(traceback.extract_stack(frame), stalled_for)
+
+    def _capture(self, stack: traceback.StackSummary, stalled_for: float) -> None:
+        app_frames = [f for f in stack if f.filename.startswith(_APP_DIR)]
+        handler = next((f for f in app_frames if os.sep + "routers" + os.sep in f.filename or f.filename.endswith("main.py")), None)
+        call_site = app_frames[-1] if app_frames else None
+        blocking = stack[-1] if stack else None
+        stall = {
+            "at": time.time(),
+            "duration_ms": None, # Filled in when the loop runs again
+            "detected_after_ms": round(stalled_for * 1000, 1),
+            "handler": _describe(handler),
+            "call_site": _describe(call_site),
+            "blocking_call": _describe(blocking),
+            "stack": [_describe(f) for f in (stack if self.debug else app_frames or stack[-5:])],
+        }
+        with self._lock:
+            self._open_stall = stall
+            self.stalls.append(stall)
+            self.stall_count += 1
+        logger.warning(
+            f"Event loop blocked for >{stalled_for * 1000:.0f} ms in {stall['handler'] or 'unknown handler'}"
+            f" at {stall['call_site'] or '?'} (innermost: {stall['blocking_call']})"
+            + ("\n" + "".join(stack.format()) if self.debug else "")
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self.counts)
+            samples = self.samples
+            histogram = [{"le_ms": bound, "count": count} for bound, count in zip(BUCKETS_MS, counts)]
+            histogram.append({"le_ms": None, "count": counts[-1]})
+            return {
+                "running": self.running,
+                "debug": self.debug,
+                "interval_ms": self.interval * 1000,
+                "block_threshold_ms": self.threshold * 1000,
+                "samples": samples,
+                "mean_lag_ms": round(self.total_lag / samples * 1000, 3) if samples else 0.0,
+                "p50_lag_ms": _quantile(counts, samples, 0.5),
+                "p99_lag_ms": _quantile(counts, samples, 0.99),
+                "max_lag_ms": round(self.max_lag * 1000, 3),
+                "histogram": histogram,
+                "stalls": self.stall_count,
+                "recent_stalls": list(reversed(self.stalls)),
+            }
+
+
+def _describe(frame: Optional[traceback.FrameSummary]) -> Optional[str]:
+    if frame is None:
+        return None
+    filename = frame.filename[len(_APP_DIR) - len("app" + os.sep):] if frame.filename.startswith(_APP_DIR) else frame.filename
+    return f"{frame.name} ({filename}:{frame.lineno})"
+
+def _quantile(counts: List[int], samples: int, q: float) -> Optional[float]:
+    """Upper bound of the bucket holding the q-quantile (None if it is the open-ended bucket)."""
+    if not samples:
+        return 0.0
+    rank, seen = q * samples, 0
+    for bound, count in zip(BUCKETS_MS, counts):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None
+
+
+loop_monitor = LoopLagMonitor()
+# --- END OF FILE backend/app/core/loop_monitor.py ---
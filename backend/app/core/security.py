@@ -12,6 +12,7 @@ from .config import settings
 from ..db import database, models
 from ..schemas import schemas as user_schemas # Rename to avoid conflict
 from ..crud import crud
+from ..services.autosave_service import autosave_buffer
 
 # OAuth2PasswordBearer yêu cầu tokenUrl là đường dẫn tương đối đến endpoint token
 # Đảm bảo nó khớp với prefix của auth router + đường dẫn của token endpoint
@@ -29,31 +30,50 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
-                           db: Annotated[Session, Depends(database.get_db)]) -> models.User:
-    """Giải mã token, xác thực và trả về user hiện tại."""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def get_token_expiry(token: str) -> Optional[float]:
+    """Thời điểm hết hạn (`exp`, giây Unix) của token, hoặc None nếu token không hợp lệ hay không có exp."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        return None
+    exp = payload.get("exp")
+    return float(exp) if isinstance(exp, (int, float)) else None
+
+def get_user_from_token(db: Session, token: str) -> Optional[models.User]:
+    """
+    Giải mã token và trả về user tương ứng, hoặc None nếu token không hợp lệ.
+    Dùng chung cho dependency HTTP và WebSocket (xác thực một lần khi kết nối).
+    """
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: Optional[str] = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            return None
         # Use the renamed import for Pydantic schema
         token_data = user_schemas.TokenData(email=email)
     except JWTError:
-        raise credentials_exception
+        return None
     except Exception as e: # Catch potential Pydantic validation errors too
          print(f"Error decoding token or validating schema: {e}")
-         raise credentials_exception
+         return None
+    return crud.get_user_by_email(db, email=token_data.email)
 
-
-    user = crud.get_user_by_email(db, email=token_data.email)
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)],
+                           db: Annotated[Session, Depends(database.get_db)]) -> models.User:
+    """Giải mã token, xác thực và trả về user hiện tại."""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    user = get_user_from_token(db, token)
     if user is None:
         raise credentials_exception
+    # End the read transaction (the user stays loaded, detached): the remaining dependencies may await
+    # the threadpool before the handler queries, and tuned SQLite pools have no connection to spare meanwhile
+    db.close()
+    # Lets the routing session apply read-your-writes stickiness for this user
+    db.info["user_id"] = user.id
     return user
 
 async def get_current_active_user(current_user: Annotated[models.User, Depends(get_current_user)]) -> models.User:
@@ -69,4 +89,10 @@ async def get_current_active_user(current_user: Annotated[models.User, Depends(g
 # Type alias for dependency injection clarity
 CurrentUser = Annotated[models.User, Depends(get_current_active_user)]
 DbSession = Annotated[Session, Depends(database.get_db)]
+
+def flush_autosaves(current_user: CurrentUser) -> None:
+    """Write the user's buffered autosaves before a handler reads or replaces entries (sync: runs in the threadpool)."""
+    autosave_buffer.flush_user(current_user.id)
+
+FlushAutosaves = Depends(flush_autosaves)
 # --- END OF FILE backend/app/core/security.py ---
\ No newline at end of file
@@ -5,10 +5,19 @@ from .crud import (
     create_user,
     get_journal,
     get_journals,
+    get_journal_summaries,
+    get_journal_version,
+    get_journals_version,
+    get_recent_entry_versions,
     get_recent_entries_before,
+    get_consultation_targets,
+    get_recent_entries_before_many,
     create_journal,
     update_journal,
-    delete_journal
+    delete_journal,
+    create_journals,
+    update_journals,
+    delete_journals
 )
 
 __all__ = [
@@ -17,8 +26,17 @@ __all__ = [
     "create_user",
     "get_journal",
     "get_journals",
+    "get_journal_summaries",
+    "get_journal_version",
+    "get_journals_version",
+    "get_recent_entry_versions",
     "get_recent_entries_before",
+    "get_consultation_targets",
+    "get_recent_entries_before_many",
     "create_journal",
     "update_journal",
-    "delete_journal"
+    "delete_journal",
+    "create_journals",
+    "update_journals",
+    "delete_journals"
 ]
@@ -1,12 +1,17 @@
 # --- START OF FILE backend/app/crud/crud.py ---
+import bisect
+from sqlalchemy import func, or_, select, insert, update, delete
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 from datetime import datetime
 
 # Use relative imports
 from ..db import models
+from ..db.database import use_primary
+from ..db.compression import is_compressed
 from ..schemas import schemas
 from ..core.hashing import get_password_hash
+from ..services import digest_service, stats_service
 
 # --- User CRUD ---
 def get_user(db: Session, user_id: int) -> Optional[models.User]:
@@ -35,30 +40,131 @@ def get_journal(db: Session, journal_id: int, user_id: int) -> Optional[models.J
         models.JournalEntry.owner_id == user_id
     ).first()
 
-def get_journals(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.JournalEntry]:
-    """Lấy danh sách journal entries của một user cụ thể."""
-    return db.query(models.JournalEntry)\
-             .filter(models.JournalEntry.owner_id == user_id)\
-             .order_by(models.JournalEntry.created_at.desc())\
+def _timestamp_param(db: Session, value: datetime):
+    """SQLite lưu server default dạng 'YYYY-MM-DD HH:MM:SS' (text): chuẩn hóa tham số về cùng định dạng để so sánh."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.datetime(value)
+    return value
+
+def get_journals(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                 before: Optional[datetime] = None, before_id: Optional[int] = None) -> List[models.JournalEntry]:
+    """
+    Lấy danh sách journal entries của một user cụ thể, mới nhất trước (created_at, rồi id).
+    (`before`, `before_id`) = (created_at, id) của entry cuối trang trước là con trỏ phân trang
+    thay cho `skip`: không phải bỏ qua các dòng đã đọc, và với bảng phân vùng theo thời gian thì
+    Postgres chỉ quét các partition không mới hơn mốc đó. Cần cả id vì nhiều entries có thể trùng
+    created_at (tạo theo batch, SQLite chỉ lưu đến giây); chỉ có `before` thì các entries trùng mốc bị bỏ qua.
+    """
+    entry = models.JournalEntry
+    query = db.query(entry).filter(entry.owner_id == user_id)
+    if before is not None:
+        before_ts = _timestamp_param(db, before)
+        if before_id is None:
+            query = query.filter(entry.created_at < before_ts)
+        else:
+            # (created_at, id) < (before, before_id); điều kiện `<=` riêng giữ cho việc loại partition
+            query = query.filter(entry.created_at <= before_ts,
+                                 or_(entry.created_at < before_ts, entry.id < before_id))
+    return query.order_by(entry.created_at.desc(), entry.id.desc())\
              .offset(skip)\
              .limit(limit)\
              .all()
 
+def get_journal_summaries(db: Session, user_id: int, skip: int = 0, limit: int = 100,
+                          preview_length: int = 160) -> List[Dict[str, Any]]:
+    """
+    Lấy danh sách rút gọn (id, title, created_at, updated_at, preview) của user, dạng dict.
+    Chỉ select các cột cần thiết, preview được cắt ngay trong SQL, và không tạo ORM object
+    (không qua identity map). Với entries lưu nén, substr trả về dạng nén nên preview được
+    tính lại từ content đã giải nén (một câu SELECT thêm cho riêng các entries đó).
+    """
+    entry = models.JournalEntry
+    stmt = select(
+        entry.id,
+        entry.title,
+        entry.created_at,
+        entry.updated_at,
+        func.substr(entry.content, 1, preview_length).label("preview"),
+    ).where(entry.owner_id == user_id)\
+     .order_by(entry.created_at.desc(), entry.id.desc())\
+     .offset(skip)\
+     .limit(limit)
+    rows = [row._asdict() for row in db.execute(stmt)]
+
+    compressed = {row["id"]: row for row in rows if is_compressed(row["preview"])}
+    if compressed:
+        for journal_id, content in db.execute(
+            select(entry.id, entry.content).where(entry.id.in_(compressed))
+        ):
+            compressed[journal_id]["preview"] = content[:preview_length]
+    return rows
+
+def get_journal_version(db: Session, journal_id: int, user_id: int) -> Optional[Tuple[int, int, Optional[datetime], Optional[datetime]]]:
+    """
+    Lấy (id, version, created_at, updated_at) của một entry mà không tải content.
+    Dùng để tính ETag (theo version, tăng ở mọi lần ghi, và created_at, phân biệt entry mới nếu id bị dùng lại)
+    / Last-Modified; trả về None nếu không tìm thấy.
+    """
+    return db.query(models.JournalEntry.id, models.JournalEntry.version, models.JournalEntry.created_at,
+                    models.JournalEntry.updated_at).filter(
+        models.JournalEntry.id == journal_id,
+        models.JournalEntry.owner_id == user_id
+    ).first()
+
+def get_recent_entry_versions(db: Session, user_id: int, limit: int = 10) -> Sequence[Any]:
+    """
+    Lấy (id, version) của `limit` entries mới nhất (theo created_at, rồi id như get_journals), không tải content.
+    Dùng để tính fingerprint của ngữ cảnh chat: thứ tự phải ổn định khi nhiều entry trùng created_at.
+    """
+    return db.execute(
+        select(models.JournalEntry.id, models.JournalEntry.version)
+        .where(models.JournalEntry.owner_id == user_id)
+        .order_by(models.JournalEntry.created_at.desc(), models.JournalEntry.id.desc())
+        .limit(limit)
+    ).all()
+
+def get_journals_version(db: Session, user_id: int) -> Tuple[int, Optional[int], int, Optional[datetime]]:
+    """
+    Lấy (số lượng, id lớn nhất, tổng version, created_at lớn nhất) của các entries thuộc user, dùng làm
+    version cho danh sách: thay đổi ở mỗi lần tạo, sửa hoặc xóa entry (kể cả nhiều lần trong cùng một giây),
+    và created_at phân biệt entry mới nhất bị xóa rồi tạo lại với cùng id.
+    Không có "thời điểm sửa" nào của danh sách: updated_at không thấy các lần xóa.
+    """
+    count, max_id, version_sum, max_created_at = db.query(
+        func.count(models.JournalEntry.id),
+        func.max(models.JournalEntry.id),
+        func.coalesce(func.sum(models.JournalEntry.version), 0),
+        func.max(models.JournalEntry.created_at),
+    ).filter(models.JournalEntry.owner_id == user_id).one()
+    return count, max_id, version_sum, max_created_at
+
 def create_journal(db: Session, journal: schemas.JournalEntryCreate, user_id: int) -> models.JournalEntry:
     """Tạo một journal entry mới cho user_id."""
     db_journal = models.JournalEntry(**journal.model_dump(), owner_id=user_id)
     db.add(db_journal)
+    db.flush() # Cần created_at (server default) để cập nhật thống kê trong cùng transaction
+    stats_service.apply_deltas(db, user_id, stats_service.ActivityDeltas().add(
+        db_journal.created_at, 1, stats_service.count_words(db_journal.content)
+    ))
+    digest_service.mark_dirty(db, user_id, [db_journal.created_at])
     db.commit()
     db.refresh(db_journal)
     return db_journal
 
 def update_journal(db: Session, journal_id: int, journal_update: schemas.JournalEntryUpdate, user_id: int) -> Optional[models.JournalEntry]:
     """Cập nhật một journal entry nếu nó tồn tại và thuộc về user_id."""
-    db_journal = get_journal(db=db, journal_id=journal_id, user_id=user_id)
+    # Đọc từ primary: entry sẽ được ghi lại ngay sau đó
+    db_journal = get_journal(db=use_primary(db), journal_id=journal_id, user_id=user_id)
     if db_journal:
         update_data = journal_update.model_dump(exclude_unset=True) # Chỉ cập nhật các trường được cung cấp
+        if "content" in update_data:
+            word_delta = stats_service.count_words(update_data["content"]) - stats_service.count_words(db_journal.content)
+            stats_service.apply_deltas(db, user_id, stats_service.ActivityDeltas().add(db_journal.created_at, 0, word_delta))
         for key, value in update_data.items():
             setattr(db_journal, key, value)
+        if update_data:
+            db_journal.version = models.JournalEntry.version + 1 # Tính trong SQL; autosave dựa trên version này
+            digest_service.mark_dirty(db, user_id, [db_journal.created_at])
         db.commit()
         db.refresh(db_journal)
     return db_journal
@@ -66,12 +172,118 @@ def update_journal(db: Session, journal_id: int, journal_update: schemas.Journal
 
 def delete_journal(db: Session, journal_id: int, user_id: int) -> Optional[models.JournalEntry]:
     """Xóa một journal entry nếu nó tồn tại và thuộc về user_id."""
-    db_journal = get_journal(db=db, journal_id=journal_id, user_id=user_id)
+    db_journal = get_journal(db=use_primary(db), journal_id=journal_id, user_id=user_id)
     if db_journal:
+        stats_service.apply_deltas(db, user_id, stats_service.ActivityDeltas().add(
+            db_journal.created_at, -1, -stats_service.count_words(db_journal.content)
+        ))
+        digest_service.mark_dirty(db, user_id, [db_journal.created_at])
+        db.execute(delete(models.JournalMoodScore).where(models.JournalMoodScore.entry_id == journal_id))
         db.delete(db_journal)
         db.commit()
     return db_journal # Trả về object đã xóa (hoặc None nếu không tìm thấy)
 
+# --- Batch Journal Entry CRUD (một transaction, câu lệnh theo tập) ---
+
+def _detach(db: Session, objects: Sequence[models.JournalEntry]) -> None:
+    # Tách object khỏi session trước khi commit để chúng không bị expire (tránh N câu SELECT refresh)
+    for obj in objects:
+        db.expunge(obj)
+
+def create_journals(db: Session, journals: Sequence[schemas.JournalEntryCreate], user_id: int) -> List[models.JournalEntry]:
+    """
+    Tạo nhiều journal entries bằng một câu INSERT ... RETURNING trong một transaction.
+    Kết quả có cùng thứ tự với `journals`.
+    """
+    rows = [{**journal.model_dump(), "owner_id": user_id} for journal in journals]
+    created = db.scalars(
+        insert(models.JournalEntry).returning(models.JournalEntry, sort_by_parameter_order=True),
+        rows,
+    ).all()
+    deltas = stats_service.ActivityDeltas()
+    for entry in created:
+        deltas.add(entry.created_at, 1, stats_service.count_words(entry.content))
+    stats_service.apply_deltas(db, user_id, deltas)
+    digest_service.mark_dirty(db, user_id, [entry.created_at for entry in created])
+    _detach(db, created)
+    db.commit()
+    return list(created)
+
+def update_journals(db: Session, items: Sequence[schemas.JournalBatchUpdateItem], user_id: int) -> Dict[int, models.JournalEntry]:
+    """
+    Cập nhật nhiều journal entries của user trong một transaction:
+    1 SELECT kiểm tra quyền sở hữu, 1 UPDATE executemany theo primary key, 1 SELECT lấy kết quả.
+    Trả về dict {id: entry} cho các entries tồn tại và thuộc về user_id.
+    """
+    use_primary(db)
+    requested_ids = {item.id for item in items}
+    # (created_at, content, version) hiện tại, để tính chênh lệch số từ cho thống kê và tăng version
+    current = {
+        row.id: row for row in db.execute(
+            select(models.JournalEntry.id, models.JournalEntry.created_at, models.JournalEntry.content,
+                   models.JournalEntry.version).where(
+                models.JournalEntry.id.in_(requested_ids),
+                models.JournalEntry.owner_id == user_id,
+            )
+        )
+    }
+    owned_ids: Set[int] = set(current)
+    params = []
+    latest_content: Dict[int, str] = {}
+    for item in items:
+        update_data = item.model_dump(exclude_unset=True, exclude={"id"})
+        if item.id in owned_ids and update_data:
+            params.append({"id": item.id, **update_data, "version": current[item.id].version + 1})
+            if "content" in update_data:
+                latest_content[item.id] = update_data["content"]
+    if params:
+        db.execute(update(models.JournalEntry), params)
+        digest_service.mark_dirty(db, user_id, [current[param["id"]].created_at for param in params])
+
+    deltas = stats_service.ActivityDeltas()
+    for journal_id, content in latest_content.items():
+        row = current[journal_id]
+        deltas.add(row.created_at, 0, stats_service.count_words(content) - stats_service.count_words(row.content))
+    stats_service.apply_deltas(db, user_id, deltas)
+
+    updated = db.scalars(
+        select(models.JournalEntry).where(models.JournalEntry.id.in_(owned_ids))
+    ).all() if owned_ids else []
+    _detach(db, updated)
+    db.commit()
+    return {entry.id: entry for entry in updated}
+
+def delete_journals(db: Session, journal_ids: Sequence[int], user_id: int) -> Set[int]:
+    """
+    Xóa nhiều journal entries của user bằng một câu DELETE ... RETURNING.
+    Trả về tập id đã bị xóa (id không tồn tại hoặc không thuộc về user sẽ bị bỏ qua).
+    """
+    owned_ids = select(models.JournalEntry.id).where(
+        models.JournalEntry.id.in_(set(journal_ids)),
+        models.JournalEntry.owner_id == user_id,
+    )
+    db.execute(
+        delete(models.JournalMoodScore)
+        .where(models.JournalMoodScore.entry_id.in_(owned_ids))
+        .execution_options(synchronize_session=False)
+    )
+    deleted = db.execute(
+        delete(models.JournalEntry)
+        .where(
+            models.JournalEntry.id.in_(set(journal_ids)),
+            models.JournalEntry.owner_id == user_id,
+        )
+        .returning(models.JournalEntry.id, models.JournalEntry.created_at, models.JournalEntry.content)
+        .execution_options(synchronize_session=False)
+    ).all()
+    deltas = stats_service.ActivityDeltas()
+    for row in deleted:
+        deltas.add(row.created_at, -1, -stats_service.count_words(row.content))
+    stats_service.apply_deltas(db, user_id, deltas)
+    digest_service.mark_dirty(db, user_id, [row.created_at for row in deleted])
+    db.commit()
+    return {row.id for row in deleted}
+
 def get_recent_entries_before(db: Session, user_id: int, target_entry_id: int, limit: int = 5) -> List[models.JournalEntry]:
     """
     Lấy n entries gần nhất trước một entry cụ thể.
@@ -97,4 +309,52 @@ def get_recent_entries_before(db: Session, user_id: int, target_entry_id: int, l
              .order_by(models.JournalEntry.created_at.desc())\
              .limit(limit)\
              .all()
+
+def get_consultation_targets(db: Session, user_id: int, ids: Optional[Sequence[int]] = None,
+                             start: Optional[datetime] = None, end: Optional[datetime] = None,
+                             limit: int = 50) -> List[models.JournalEntry]:
+    """
+    Lấy các entries cần tham vấn trong một câu SELECT: theo danh sách `ids`, và/hoặc các entries
+    tạo trong khoảng [start, end). Sắp xếp theo thời gian tăng dần, tối đa `limit` entries.
+    """
+    entry = models.JournalEntry
+    query = db.query(entry).filter(entry.owner_id == user_id)
+    if ids is not None:
+        query = query.filter(entry.id.in_(ids))
+    if start is not None:
+        query = query.filter(entry.created_at >= _timestamp_param(db, start))
+    if end is not None:
+        query = query.filter(entry.created_at < _timestamp_param(db, end))
+    return query.order_by(entry.created_at, entry.id).limit(limit).all()
+
+def get_recent_entries_before_many(db: Session, user_id: int, targets: Sequence[models.JournalEntry],
+                                   limit: int = 5) -> Dict[int, List[models.JournalEntry]]:
+    """
+    Như get_recent_entries_before nhưng cho nhiều target cùng lúc: {target id: n entries gần nhất trước nó}.
+    Các target của một lần review thường gần nhau nên bối cảnh của chúng chồng lên nhau: thay vì
+    mỗi target một câu truy vấn, chỉ cần hai câu (mốc dưới, rồi một lần quét theo khoảng created_at)
+    và chia bối cảnh cho từng target trong Python.
+    """
+    if not targets:
+        return {}
+    entry = models.JournalEntry
+    earliest = min(target.created_at for target in targets)
+    latest = max(target.created_at for target in targets)
+    # Mốc dưới: entry thứ `limit` trước target sớm nhất
+    lower = db.query(entry.created_at)\
+              .filter(entry.owner_id == user_id, entry.created_at < _timestamp_param(db, earliest))\
+              .order_by(entry.created_at.desc())\
+              .offset(limit - 1)\
+              .limit(1)\
+              .scalar()
+    query = db.query(entry).filter(entry.owner_id == user_id, entry.created_at < _timestamp_param(db, latest))
+    if lower is not None:
+        query = query.filter(entry.created_at >= _timestamp_param(db, lower))
+    window = query.order_by(entry.created_at).all()
+    created = [row.created_at for row in window]
+    contexts = {}
+    for target in targets:
+        end = bisect.bisect_left(created, target.created_at)
+        contexts[target.id] = window[max(0, end - limit):end][::-1] # Mới nhất trước
+    return contexts
 # --- END OF FILE backend/app/crud/crud.py ---
\ No newline at end of file
@@ -0,0 +1,182 @@
+# --- START OF FILE backend/app/db/compression.py ---
+import base64
+import logging
+import os
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+from sqlalchemy import Text
+from sqlalchemy.types import TypeDecorator
+
+from ..core.config import settings
+
+try: # Optional: zstd compresses short texts much better, especially with a trained dictionary
+    import zstandard
+except ImportError: # pragma: no cover - depends on the environment
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Stored form of a compressed value: MARKER + codec tag + ":" + base64(payload).
+# Plain text is stored as-is, so existing rows and uncompressed rows stay readable by anything.
+MARKER = "\x01"
+_ZLIB = "zl"
+_ZSTD = "zs"
+_ZSTD_DICT = "zd" # followed by the dictionary id, e.g. "zd123456:"
+DICT_SUFFIX = ".zdict"
+
+class CompressionError(Exception):
+    """Raised when a stored value cannot be encoded or decoded"""
+    pass
+
+
+def is_compressed(value: Optional[str]) -> bool:
+    return bool(value) and value.startswith(MARKER)
+
+
+class ContentCodec:
+    """
+    Compresses text above a size threshold with zstd (optionally with a trained dictionary) or zlib.
+    Every dictionary found in `dict_dir` is kept for decoding; the newest one is used for new writes.
+    """
+
+    def __init__(self, codec: str = settings.CONTENT_COMPRESSION, min_bytes: int = settings.CONTENT_COMPRESSION_MIN_BYTES,
+                 level: int = settings.CONTENT_COMPRESSION_LEVEL, dict_dir: str = settings.CONTENT_DICT_DIR):
+        if codec == "zstd" and zstandard is None:
+            logger.warning("CONTENT_COMPRESSION=zstd but zstandard is not installed; using zlib instead.")
+            codec = "zlib"
+        if codec not in ("off", "zlib", "zstd"):
+            raise CompressionError(f"Unknown CONTENT_COMPRESSION value: {codec}")
+        self.codec = codec
+        self.min_bytes = min_bytes
+        self.level = level
+        self.dict_dir = dict_dir
+        self._dicts: Optional[Dict[int, "zstandard.ZstdCompressionDict"]] = None
+        self._active_dict_id: Optional[int] = None
+        self._local = threading.local() # zstd (de)compressor objects are not thread-safe
+        self._lock = threading.Lock()
+
+    # --- Dictionaries ---
+    def _load_dicts(self) -> None:
+        if self._dicts is not None:
+            return
+        with self._lock:
+            if self._dicts is not None:
+                return
+            dicts, newest = {}, None
+            if self.dict_dir and zstandard is not None and os.path.isdir(self.dict_dir):
+                paths = sorted(
+                    (os.path.join(self.dict_dir, name) for name in os.listdir(self.dict_dir) if name.endswith(DICT_SUFFIX)),
+                    key=os.path.getmtime,
+                )
+                for path in paths:
+                    with open(path, "rb") as handle:
+                        zdict = zstandard.ZstdCompressionDict(handle.read())
+                    dicts[zdict.dict_id()] = zdict
+                    newest = zdict.dict_id()
+                if dicts:
+                    logger.info(f"Loaded {len(dicts)} zstd dictionaries from {self.dict_dir} (active: {newest})")
+            self._dicts, self._active_dict_id = dicts, newest
+
+    def reload_dicts(self) -> None:
+        """Pick up newly trained dictionaries (drops cached compressors)."""
+        with self._lock:
+            self._dicts = None
+        self._local = threading.local()
+
+    def _compressor(self) -> "zstandard.ZstdCompressor":
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            self._load_dicts()
+            zdict = self._dicts.get(self._active_dict_id) if self._active_dict_id is not None else None
+            compressor = zstandard.ZstdCompressor(level=self.level or 3, dict_data=zdict, write_content_size=True)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, dict_id: Optional[int]) -> "zstandard.ZstdDecompressor":
+        cache = getattr(self._local, "decompressors", None)
+        if cache is None:
+            cache = self._local.decompressors = {}
+        decompressor = cache.get(dict_id)
+        if decompressor is None:
+            if zstandard is None:
+                raise CompressionError("Stored content is zstd-compressed but zstandard is not installed")
+            zdict = None
+            if dict_id is not None:
+                self._load_dicts()
+                zdict = self._dicts.get(dict_id)
+                if zdict is None:
+                    raise CompressionError(f"zstd dictionary {dict_id} not found in CONTENT_DICT_DIR")
+            decompressor = cache[dict_id] = zstandard.ZstdDecompressor(dict_data=zdict)
+        return decompressor
+
+    # --- Encoding ---
+    def encode(self, value: Optional[str], force: bool = False) -> Optional[str]:
+        """Compress `value` if compression is on and it is large enough (or `force`). Returns the stored form."""
+        if value is None:
+            return None
+        raw = value.encode("utf-8")
+        if value.startswith(MARKER):
+            force = True # Never store plain text that would read back as a compressed value
+        if not force and (self.codec == "off" or len(raw) < self.min_bytes):
+            return value
+        if self.codec == "zstd":
+            compressor = self._compressor()
+            payload = compressor.compress(raw)
+            tag = _ZSTD if self._active_dict_id is None else f"{_ZSTD_DICT}{self._active_dict_id}"
+        else:
+            payload = zlib.compress(raw, self.level or 6)
+            tag = _ZLIB
+        encoded = f"{MARKER}{tag}:{base64.b64encode(payload).decode('ascii')}"
+        if len(encoded) >= len(value) and not value.startswith(MARKER):
+            return value # Incompressible (or too short to gain after base64): keep it plain
+        return encoded
+
+    def decode(self, value: Optional[str]) -> Optional[str]:
+        """Turn a stored value back into text; plain values are returned unchanged."""
+        if not is_compressed(value):
+            return value
+        tag, _, data = value[1:].partition(":")
+        try:
+            payload = base64.b64decode(data)
+            if tag == _ZLIB:
+                return zlib.decompress(payload).decode("utf-8")
+            if tag == _ZSTD:
+                return self._decompressor(None).decompress(payload).decode("utf-8")
+            if tag.startswith(_ZSTD_DICT):
+                return self._decompressor(int(tag[len(_ZSTD_DICT):])).decompress(payload).decode("utf-8")
+        except CompressionError:
+            raise
+        except Exception as e:
+            raise CompressionError(f"Cannot decode stored content ({tag}): {e}")
+        raise CompressionError(f"Unknown compression tag: {tag}")
+
+
+def train_dictionary(samples: List[str], dict_size: int = 64 * 1024) -> "zstandard.ZstdCompressionDict":
+    """Train a zstd dictionary from sample texts (a few thousand entries is plenty)."""
+    if zstandard is None:
+        raise CompressionError("Training a dictionary needs zstandard installed")
+    return zstandard.train_dictionary(dict_size, [sample.encode("utf-8") for sample in samples])
+
+
+# Process-wide codec configured from settings
+content_codec = ContentCodec()
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column that stores large values compressed (see ContentCodec) and decodes them transparently.
+    Values written through the ORM or Core statements on the column are encoded; SQL functions
+    applied to the raw column (substr, length, LIKE...) see the stored form.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return content_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return content_codec.decode(value)
+# --- END OF FILE backend/app/db/compression.py ---
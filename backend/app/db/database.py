@@ -1,10 +1,19 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc, text, Insert, Update, Delete
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
+from contextvars import ContextVar
+from http.cookies import CookieError, SimpleCookie
+from typing import Any, Dict, Optional
+import itertools
+import math
 import os
+import threading
+import time
 
 # Use relative import for settings
 from ..core.config import settings
+from . import partitioning
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
@@ -16,31 +25,303 @@ if not SQLALCHEMY_DATABASE_URL:
     print("Warning: DATABASE_URL not set. Using default SQLite database 'journal_app.db'.")
     SQLALCHEMY_DATABASE_URL = "sqlite:///./journal_app.db" # Default fallback
 
-# Add connect_args for SQLite only if using SQLite
-connect_args = {}
+def _hide_credentials(url: str) -> str:
+    return url.split('@')[1] if '@' in url else url
+
+
+# Report which backend is in use (connect_args are built in _build_engine)
 if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
     print(f"Using SQLite database at: {SQLALCHEMY_DATABASE_URL}")
 elif SQLALCHEMY_DATABASE_URL.startswith("postgresql"):
      print(f"Connecting to PostgreSQL database...")
 else:
-     print(f"Connecting to database: {SQLALCHEMY_DATABASE_URL.split('@')[1] if '@' in SQLALCHEMY_DATABASE_URL else SQLALCHEMY_DATABASE_URL}") # Hide credentials
+     print(f"Connecting to database: {_hide_credentials(SQLALCHEMY_DATABASE_URL)}") # Hide credentials
 
 
-try:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL,
-        connect_args=connect_args # Pass connect_args here
+class PoolMetrics:
+    """Thread-safe counters describing how long requests wait for a pooled connection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += seconds
+            self.last_wait = seconds
+            if seconds > self.max_wait:
+                self.max_wait = seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / attempts * 1000, 3) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "last_wait_ms": round(self.last_wait * 1000, 3),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait time (including pre-ping) into PoolMetrics."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        # engine.dispose() recreates the pool; keep the counters across it
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+def _is_memory_sqlite(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite://"))
+
+
+def is_tuned_sqlite(url: str) -> bool:
+    """File-backed SQLite with SQLITE_TUNING: WAL mode, one writer connection and a pool of readers."""
+    return settings.SQLITE_TUNING and url.startswith("sqlite") and not _is_memory_sqlite(url)
+
+
+def _set_sqlite_pragmas(dbapi_connection, reader: bool):
+    cursor = dbapi_connection.cursor()
+    try:
+        if not reader:
+            # Persistent in the file; readers then never block the writer, nor it them
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size={-int(settings.SQLITE_CACHE_SIZE_KB)}") # Negative = KiB
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE_MB) * 1024 * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if reader:
+            cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+def _build_engine(url: str, reader: bool = False):
+    """
+    Create an engine for `url` using the pool and timeout settings from config.
+    For tuned SQLite (is_tuned_sqlite) the writer engine holds a single connection, so writers
+    queue in the pool (see PoolMetrics) instead of retrying on "database is locked";
+    `reader=True` builds the pool of SQLITE_READER_POOL_SIZE read-only connections, which may
+    overflow by DB_MAX_OVERFLOW (async handlers keep theirs until the request ends).
+    """
+    connect_args: Dict[str, Any] = {}
+    engine_kwargs: Dict[str, Any] = {"pool_pre_ping": settings.DB_POOL_PRE_PING}
+
+    if url.startswith("sqlite"):
+        connect_args["check_same_thread"] = False
+    elif url.startswith("postgresql") and settings.DB_STATEMENT_TIMEOUT_MS > 0:
+        # Server-side default for every statement on this connection; see set_statement_timeout for overrides
+        connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+
+    if not _is_memory_sqlite(url):
+        engine_kwargs.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    tuned = is_tuned_sqlite(url)
+    if tuned:
+        # pysqlite waits on its own lock timeout too; keep it in line with busy_timeout
+        connect_args["timeout"] = settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+        engine_kwargs.update(pool_size=settings.SQLITE_READER_POOL_SIZE if reader else 1,
+                             max_overflow=settings.DB_MAX_OVERFLOW if reader else 0,
+                             pool_pre_ping=False, pool_recycle=-1) # A local file connection does not go stale
+
+    bind = create_engine(
+        url,
+        connect_args=connect_args, # Pass connect_args here
+        **engine_kwargs
         # echo=True # Uncomment for debugging SQL queries
     )
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    if tuned:
+        event.listen(bind, "connect", lambda dbapi_connection, record: _set_sqlite_pragmas(dbapi_connection, reader))
+    return bind
+
+
+class WriteTracker:
+    """Remembers when each user last committed a write, for read-your-writes stickiness."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._last_write: Dict[int, float] = {}
+
+    def mark(self, user_id: Optional[int]):
+        if user_id is None:
+            return
+        with self._lock:
+            self._last_write[user_id] = time.monotonic()
+
+    def is_sticky(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        with self._lock:
+            last = self._last_write.get(user_id)
+            if last is None:
+                return False
+            if time.monotonic() - last > self.window_seconds:
+                del self._last_write[user_id] # Window expired, keep the map small
+                return False
+            return True
+
+
+write_tracker = WriteTracker(settings.DB_READ_YOUR_WRITES_SECONDS)
+_replica_cycle = itertools.count()
+
+# write_tracker only sees this process's commits; with several workers the stickiness travels with the
+# client instead, as a cookie set after a write (ReadYourWritesMiddleware). Per-request state:
+# {"sticky": the request carried a fresh cookie, "wrote": it committed a write}
+WRITE_COOKIE = "db_last_write"
+_request_state: ContextVar[Optional[Dict[str, bool]]] = ContextVar("db_request_state", default=None)
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware (installed with read replicas) that carries read-your-writes across worker
+    processes: a response to a request that committed a write sets a WRITE_COOKIE lasting
+    DB_READ_YOUR_WRITES_SECONDS, and requests that send a fresh one read from the primary.
+    """
+
+    def __init__(self, app, window_seconds: float = settings.DB_READ_YOUR_WRITES_SECONDS):
+        self.app = app
+        self.window_seconds = window_seconds
+
+    def _is_sticky(self, scope) -> bool:
+        for name, value in scope.get("headers", []):
+            if name != b"cookie":
+                continue
+            try:
+                morsel = SimpleCookie(value.decode("latin-1")).get(WRITE_COOKIE)
+                return morsel is not None and time.time() - float(morsel.value) <= self.window_seconds
+            except (CookieError, ValueError):
+                return False
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        state = {"sticky": self._is_sticky(scope), "wrote": False}
+        token = _request_state.set(state) # Copied into threadpool handlers, which update the same dict
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and state["wrote"]:
+                cookie = (f"{WRITE_COOKIE}={time.time():.3f}; Max-Age={math.ceil(self.window_seconds)}; "
+                          f"Path=/; HttpOnly; SameSite=Lax")
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request_state.reset(token)
+
+def _request_is_sticky() -> bool:
+    state = _request_state.get()
+    return state is not None and state["sticky"]
+
+
+class RoutingSession(Session):
+    """
+    Session that sends writes (flushes, INSERT/UPDATE/DELETE) to the primary and plain reads
+    to a replica. A session that has written, whose user (session.info["user_id"]) wrote within
+    DB_READ_YOUR_WRITES_SECONDS in this process, or whose request carries a fresh WRITE_COOKIE
+    (a write served by any worker) reads from the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.info["use_primary"] = True
+            self.info["writing"] = True
+            return engine
+        if sqlite_reader_engine is not None:
+            # Same file in WAL mode: readers see every commit at once, so no stickiness is needed
+            return engine if self.info.get("use_primary") else sqlite_reader_engine
+        if (not replica_engines or self.info.get("use_primary") or write_tracker.is_sticky(self.info.get("user_id"))
+                or _request_is_sticky()):
+            return engine
+        # Pin one replica per session so a request sees a single consistent snapshot
+        if "replica" not in self.info:
+            self.info["replica"] = replica_engines[next(_replica_cycle) % len(replica_engines)]
+        return self.info["replica"]
+
+
+try:
+    engine = _build_engine(SQLALCHEMY_DATABASE_URL)
+    REPLICA_URLS = [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+    replica_engines = [_build_engine(url) for url in REPLICA_URLS]
+    sqlite_reader_engine = _build_engine(SQLALCHEMY_DATABASE_URL, reader=True) \
+        if is_tuned_sqlite(SQLALCHEMY_DATABASE_URL) and settings.SQLITE_READER_POOL_SIZE > 0 else None
+    if is_tuned_sqlite(SQLALCHEMY_DATABASE_URL):
+        print(f"SQLite tuned: WAL, synchronous={settings.SQLITE_SYNCHRONOUS}, 1 writer connection, "
+              f"{settings.SQLITE_READER_POOL_SIZE if sqlite_reader_engine is not None else 0} reader connection(s).")
+    for url in REPLICA_URLS:
+        print(f"Read replica configured: {_hide_credentials(url)}")
+    SessionLocal = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False, bind=engine)
     Base = declarative_base()
-    print("Database engine created successfully.")
+    print(f"Database engine created successfully (pool_size={settings.DB_POOL_SIZE}, max_overflow={settings.DB_MAX_OVERFLOW}, pre_ping={settings.DB_POOL_PRE_PING}).")
 except Exception as e:
     print(f"Error creating database engine: {e}")
     print("Please check your DATABASE_URL in the .env file or environment variables.")
     raise
 
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_user_write(session: Session):
+    # Start (or extend) the user's stickiness window once their write is durable on the primary
+    if session.info.get("use_primary"):
+        write_tracker.mark(session.info.get("user_id"))
+    state = _request_state.get()
+    if state is not None and session.info.get("writing"):
+        state["wrote"] = True # The response sets the cookie, for this client's next requests on any worker
+    _release_sqlite_writer(session)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _release_sqlite_writer(session: Session):
+    # Once its transaction ends, a session that wrote (or was pinned) reads from the SQLite readers again,
+    # which see every commit, instead of taking the only writer connection back for e.g. the refresh
+    # after a commit and keeping it until the session is closed, across the handler's awaits
+    writing = session.info.pop("writing", False)
+    if sqlite_reader_engine is not None and (session.info.pop("pinned", False) or writing):
+        session.info.pop("use_primary", None)
+
+def use_primary(db: Session) -> Session:
+    """
+    Pin `db` to the primary for the rest of its lifetime (e.g. read-then-write checks). On tuned
+    SQLite, whose readers see every commit, only until its transaction ends; end it before any
+    await there, the primary being a single connection.
+    """
+    db.info["use_primary"] = True
+    db.info["pinned"] = True
+    return db
+
 # Dependency to get DB session
 def get_db():
     """Dependency function that yields a SQLAlchemy session."""
@@ -50,6 +331,51 @@ def get_db():
     finally:
         db.close()
 
+def set_statement_timeout(db: Session, timeout_ms: int) -> None:
+    """
+    Override the statement timeout for the rest of the current transaction.
+    Only PostgreSQL supports this; on other backends it is a no-op.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+
+def get_pool_status(bind=None) -> Dict[str, Any]:
+    """
+    Report pool occupancy and checkout wait metrics for `bind` (default: the primary engine).
+    Reads pool counters only; never checks out a connection.
+    """
+    bind = bind if bind is not None else engine
+    pool = bind.pool
+    status: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if not isinstance(pool, QueuePool):
+        return status
+
+    checked_out = pool.checkedout()
+    max_overflow = pool._max_overflow # Differs from DB_MAX_OVERFLOW for tuned SQLite
+    capacity: Optional[int] = pool.size() + max_overflow if max_overflow >= 0 else None
+    status.update(
+        size=pool.size(),
+        max_overflow=max_overflow,
+        checked_out=checked_out,
+        checked_in=pool.checkedin(),
+        overflow=max(pool.overflow(), 0),
+        capacity=capacity,
+        saturation=round(checked_out / capacity, 3) if capacity else 0.0,
+    )
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status["wait"] = metrics.snapshot()
+    return status
+
+def dispose_engines(close: bool = True) -> None:
+    """
+    Drop the pooled connections of the primary and replica engines.
+    In a forked worker (gunicorn post_fork with preload_app) call it with close=False:
+    the inherited sockets belong to the parent and must be neither reused nor closed by the child.
+    """
+    for bind in (engine, *replica_engines, *([sqlite_reader_engine] if sqlite_reader_engine is not None else [])):
+        bind.dispose(close=close)
+
 # Function to create tables (call this once at startup if needed)
 def init_db():
     """Initializes the database by creating tables."""
@@ -64,7 +390,17 @@ def init_db():
         print("Attempting to create database tables...")
         # Import models here to ensure Base is populated before create_all
         from . import models # noqa
-        Base.metadata.create_all(bind=engine)
+        if partitioning.is_enabled(SQLALCHEMY_DATABASE_URL):
+            # journal_entries is created as a partitioned table (after users, which it references)
+            Base.metadata.create_all(bind=engine, tables=[t for t in Base.metadata.sorted_tables if t.name != partitioning.TABLE])
+            with engine.begin() as connection:
+                partitioning.create_partitioned_table(connection)
+        else:
+            Base.metadata.create_all(bind=engine)
+        # Local SQLite replicas (dev/testing) need the schema too; real replicas get it via replication
+        for replica_engine, url in zip(replica_engines, REPLICA_URLS):
+            if url.startswith("sqlite"):
+                Base.metadata.create_all(bind=replica_engine)
         print("Database tables checked/created successfully.")
     except Exception as e:
         print(f"Error during database table creation: {e}")
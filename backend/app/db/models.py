@@ -1,10 +1,12 @@
 # --- START OF FILE backend/app/db/models.py ---
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, Date, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func # For server_default=func.now()
 
 # Import Base from the database module using relative import
-from .database import Base
+from .database import Base, SQLALCHEMY_DATABASE_URL
+from . import partitioning
+from .compression import CompressedText
 
 class User(Base):
     __tablename__ = "users"
@@ -24,12 +26,19 @@ class User(Base):
 
 class JournalEntry(Base):
     __tablename__ = "journal_entries"
+    __table_args__ = (
+        # Newest-first listing and "entries before X" per user; partitioned tables get their own copy
+        Index("ix_journal_entries_owner_created", "owner_id", "created_at"),
+        # Never reuse the id of a deleted newest entry: (id, version) ETags would match a different entry
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
-    content = Column(Text, nullable=False)
+    content = Column(CompressedText, nullable=False) # Large bodies may be stored compressed, see db/compression.py
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1") # Bumped by every write; autosave edits are based on it
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 
     # Relationship to User: many entries belong to one user
@@ -37,4 +46,106 @@ class JournalEntry(Base):
 
     def __repr__(self):
         return f"<JournalEntry(id={self.id}, title='{self.title}', owner_id={self.owner_id})>"
+
+class JournalActivityStat(Base):
+    """
+    Per-user writing activity, aggregated by UTC day and hour of entry creation.
+    Maintained incrementally by the journal CRUD functions (see services/stats_service.py),
+    so stats queries read at most 24 rows per day instead of every entry.
+    """
+    __tablename__ = "journal_activity_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    hour = Column(Integer, primary_key=True) # 0-23, UTC
+    entry_count = Column(Integer, nullable=False, default=0)
+    word_count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<JournalActivityStat(user_id={self.user_id}, day={self.day}, hour={self.hour}, entries={self.entry_count})>"
+
+# A partitioned journal_entries has no unique key on id alone, so nothing can reference it;
+# the journal CRUD functions delete mood rows explicitly either way
+_ENTRY_FK = () if partitioning.is_enabled(SQLALCHEMY_DATABASE_URL) else (ForeignKey("journal_entries.id", ondelete="CASCADE"),)
+
+class JournalMoodScore(Base):
+    """Sentiment of one journal entry, computed locally by services/mood_service.py."""
+    __tablename__ = "journal_mood_scores"
+
+    entry_id = Column(Integer, *_ENTRY_FK, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    label = Column(String, nullable=False) # negative / neutral / positive
+    score = Column(Float, nullable=False) # Valence in [-1, 1]: P(positive) - P(negative)
+    negative = Column(Float, nullable=False)
+    neutral = Column(Float, nullable=False)
+    positive = Column(Float, nullable=False)
+    model = Column(String, nullable=False)
+    scored_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<JournalMoodScore(entry_id={self.entry_id}, label='{self.label}', score={self.score:.2f})>"
+
+class ChatMessage(Base):
+    """
+    One message of a chat conversation (user turn or model reply), written in batches
+    by services/chat_history_service.py. `seq` orders messages within a session.
+    """
+    __tablename__ = "chat_messages"
+    __table_args__ = (
+        # History pages and conversation tails are range scans on this index
+        Index("ix_chat_messages_user_session_seq", "user_id", "session_id", "seq", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    session_id = Column(String(32), nullable=False) # uuid4 hex, one per conversation
+    seq = Column(Integer, nullable=False)
+    role = Column(String(16), nullable=False) # user / model
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<ChatMessage(user_id={self.user_id}, session_id='{self.session_id}', seq={self.seq}, role='{self.role}')>"
+
+class JournalDigest(Base):
+    """
+    Summary of a user's entries over one period, maintained by services/digest_service.py:
+    a week (starting Monday, UTC) summarizes its entries, a month summarizes the weeks that start in it.
+    Entry writes bump `revision` and set `dirty_at`; the digest scheduler rebuilds dirty periods.
+    """
+    __tablename__ = "journal_digests"
+    __table_args__ = (
+        Index("ix_journal_digests_dirty_at", "dirty_at"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    period = Column(String(8), primary_key=True) # week / month
+    period_start = Column(Date, primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    entry_count = Column(Integer, nullable=False, default=0)
+    model = Column(String, nullable=True) # Model that wrote the summary ("extractive" without one)
+    revision = Column(Integer, nullable=False, default=1) # Bumped by every change to the period's entries
+    dirty_at = Column(DateTime(timezone=True), nullable=True) # When the summary went stale; NULL = up to date
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<JournalDigest(user_id={self.user_id}, period='{self.period}', start={self.period_start}, dirty={self.dirty_at is not None})>"
+
+class LLMUsageStat(Base):
+    """
+    Gemini tokens used per user, UTC day and feature (chat, consult, digest), from the
+    responses' usage metadata. Accumulated in memory and added in batches by
+    services/usage_service.py; also the basis of the daily token budgets.
+    """
+    __tablename__ = "llm_usage_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    feature = Column(String(16), primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<LLMUsageStat(user_id={self.user_id}, day={self.day}, feature='{self.feature}', tokens={self.prompt_tokens}+{self.output_tokens})>"
 # --- END OF FILE backend/app/db/models.py ---
\ No newline at end of file
@@ -0,0 +1,243 @@
+# --- START OF FILE backend/app/db/partitioning.py ---
+"""
+Optional declarative partitioning of journal_entries on PostgreSQL (JOURNAL_PARTITIONING).
+
+    time        RANGE (created_at), JOURNAL_PARTITION_MONTHS per partition, plus a DEFAULT partition
+    owner       HASH (owner_id) into JOURNAL_OWNER_PARTITIONS partitions
+    time_owner  RANGE (created_at), each range sub-partitioned by HASH (owner_id)
+
+The primary key has to include the partition key, so it becomes (id, created_at[, owner_id]);
+ids still come from one sequence and stay unique. For the same reason nothing can reference
+journal_entries(id) with a foreign key: journal_mood_scores.entry_id is a plain column in this
+mode and the CRUD functions delete mood rows explicitly.
+
+Queries filtered on owner_id prune to one hash partition; `created_at` bounds (get_recent_entries_before,
+the `before` cursor of get_journals) prune range partitions, and ORDER BY created_at DESC LIMIT n is
+answered by an ordered append that stops at the newest partitions. Old range partitions can be
+detached for archiving and attached again (manage.py detach-partition / attach-partition).
+"""
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABLE = "journal_entries"
+SEQUENCE = "journal_entries_id_seq"
+MODES = ("off", "time", "owner", "time_owner")
+_PRIMARY_KEYS = {"time": "id, created_at", "owner": "id, owner_id", "time_owner": "id, created_at, owner_id"}
+_RANGE_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def mode() -> str:
+    value = settings.JOURNAL_PARTITIONING
+    if value not in MODES:
+        raise PartitioningError(f"JOURNAL_PARTITIONING must be one of {', '.join(MODES)}, not {value!r}")
+    return value
+
+def is_enabled(url: Optional[str] = None) -> bool:
+    """Partitioning applies to PostgreSQL only; other backends keep the plain table."""
+    url = url if url is not None else settings.DATABASE_URL
+    return mode() != "off" and url.startswith("postgresql")
+
+def _uses_time() -> bool:
+    return mode() in ("time", "time_owner")
+
+
+# --- Range arithmetic ---
+
+def _add_months(day: date, months: int) -> date:
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def range_start(day: date, months: int = None) -> date:
+    """First day of the partition range containing `day` (ranges are aligned to January)."""
+    months = months or settings.JOURNAL_PARTITION_MONTHS
+    return date(day.year, (day.month - 1) // months * months + 1, 1)
+
+def range_name(start: date) -> str:
+    return f"{TABLE}_p{start:%Y%m}"
+
+def range_bounds(name: str) -> Tuple[date, date]:
+    """(from, to) of a range partition, from its name."""
+    match = _RANGE_NAME.match(name)
+    if not match:
+        raise PartitioningError(f"{name!r} is not a range partition name like {TABLE}_p202601")
+    start = date(int(match.group(1)), int(match.group(2)), 1)
+    return start, _add_months(start, settings.JOURNAL_PARTITION_MONTHS)
+
+
+# --- DDL ---
+
+def _hash_partitions_ddl(parent: str) -> List[str]:
+    modulus = settings.JOURNAL_OWNER_PARTITIONS
+    return [
+        f"CREATE TABLE IF NOT EXISTS {parent}_h{remainder} PARTITION OF {parent} "
+        f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        for remainder in range(modulus)
+    ]
+
+def _range_partition_ddl(start: date) -> List[str]:
+    name = range_name(start)
+    end = _add_months(start, settings.JOURNAL_PARTITION_MONTHS)
+    statement = (f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+                 f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+    if mode() == "time_owner":
+        return [statement + " PARTITION BY HASH (owner_id)", *_hash_partitions_ddl(name)]
+    return [statement]
+
+def table_ddl() -> List[str]:
+    """Statements creating the partitioned parent table, its indexes and its fixed partitions."""
+    partition_by = "RANGE (created_at)" if _uses_time() else "HASH (owner_id)"
+    statements = [
+        f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE}",
+        f"""CREATE TABLE {TABLE} (
+    id INTEGER NOT NULL DEFAULT nextval('{SEQUENCE}'),
+    title VARCHAR NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    version INTEGER NOT NULL DEFAULT 1,
+    owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    CONSTRAINT {TABLE}_part_pkey PRIMARY KEY ({_PRIMARY_KEYS[mode()]})
+) PARTITION BY {partition_by}""",
+        f"ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id",
+        # Index names differ from the plain table's, so both can exist while migrating
+        f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_part_owner_created ON {TABLE} (owner_id, created_at)",
+        f"CREATE INDEX IF NOT EXISTS ix_{TABLE}_part_title ON {TABLE} (title)",
+    ]
+    if _uses_time():
+        # Rows outside every range (clock skew, imported history) land here instead of failing
+        statements.append(f"CREATE TABLE IF NOT EXISTS {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+    else:
+        statements.extend(_hash_partitions_ddl(TABLE))
+    return statements
+
+
+# --- Introspection ---
+
+def table_kind(conn: Connection) -> Optional[str]:
+    """'p' for a partitioned journal_entries, 'r' for a plain one, None if it does not exist."""
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND pg_table_is_visible(oid)"), {"name": TABLE}
+    ).scalar()
+
+def list_partitions(conn: Connection) -> List[Dict]:
+    """Direct partitions of journal_entries with their bounds and estimated row counts (sub-partitions summed)."""
+    rows = conn.execute(text("""
+        SELECT child.relname AS name,
+               pg_get_expr(child.relpartbound, child.oid) AS bound,
+               child.relkind = 'p' AS partitioned,
+               COALESCE((SELECT sum(GREATEST(leaf.reltuples, 0))::bigint
+                         FROM pg_partition_tree(child.oid) tree JOIN pg_class leaf ON leaf.oid = tree.relid
+                         WHERE tree.isleaf), 0) AS estimated_rows
+        FROM pg_inherits inh
+        JOIN pg_class parent ON parent.oid = inh.inhparent
+        JOIN pg_class child ON child.oid = inh.inhrelid
+        WHERE parent.relname = :name AND pg_table_is_visible(parent.oid)
+        ORDER BY child.relname
+    """), {"name": TABLE})
+    return [row._asdict() for row in rows]
+
+
+# --- Management ---
+
+def ensure_partitions(conn: Connection, since: Optional[date] = None, ahead: Optional[int] = None) -> List[str]:
+    """
+    Create the range partitions from `since` (default: the current range) through `ahead`
+    ranges into the future. Idempotent; returns the names of partitions that did not exist yet.
+    Hash-only partitioning has a fixed set of partitions and needs nothing here.
+    """
+    if not _uses_time():
+        return []
+    ahead = settings.JOURNAL_PARTITIONS_AHEAD if ahead is None else ahead
+    months = settings.JOURNAL_PARTITION_MONTHS
+    existing = {row["name"] for row in list_partitions(conn)}
+    current = range_start(datetime.now(timezone.utc).date())
+    start = range_start(since) if since is not None and since < current else current
+    last = _add_months(current, months * ahead)
+    created = []
+    while start <= last:
+        if range_name(start) not in existing:
+            for statement in _range_partition_ddl(start):
+                conn.execute(text(statement))
+            created.append(range_name(start))
+        start = _add_months(start, months)
+    if created:
+        logger.info(f"Created journal partitions: {', '.join(created)}")
+    return created
+
+def create_partitioned_table(conn: Connection) -> bool:
+    """
+    Create journal_entries as a partitioned table if it does not exist yet, and make sure the
+    upcoming range partitions exist. Returns False if a plain (unpartitioned) table is already
+    there: convert it with `python manage.py partition-journal`.
+    """
+    kind = table_kind(conn)
+    if kind == "r":
+        logger.warning(f"JOURNAL_PARTITIONING={mode()} but {TABLE} is a plain table; "
+                       "run `python manage.py partition-journal` to convert it.")
+        return False
+    if kind is None:
+        for statement in table_ddl():
+            conn.execute(text(statement))
+        logger.info(f"Created partitioned {TABLE} ({mode()}).")
+    ensure_partitions(conn)
+    return True
+
+def _quoted(conn: Connection, name: str) -> str:
+    return conn.dialect.identifier_preparer.quote(name)
+
+def detach_partition(conn: Connection, name: str, concurrently: bool = False) -> None:
+    """
+    Detach a range partition; it stays in the database as a standalone table (archive it, then drop it).
+    CONCURRENTLY (PostgreSQL 14+) avoids blocking queries but cannot run inside a transaction block,
+    so pass an AUTOCOMMIT connection.
+    """
+    range_bounds(name) # Validates the name
+    conn.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {_quoted(conn, name)}"
+                      f"{' CONCURRENTLY' if concurrently else ''}"))
+
+def attach_partition(conn: Connection, name: str) -> None:
+    """Attach a previously detached (or restored) range partition; its bounds come from its name."""
+    start, end = range_bounds(name)
+    conn.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {_quoted(conn, name)} "
+                      f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"))
+
+def migrate_plain_table(conn: Connection) -> int:
+    """
+    Convert an existing plain journal_entries into the configured partitioned layout, in one transaction.
+    The old table is kept as journal_entries_unpartitioned (drop it once the copy is verified).
+    Takes an exclusive lock for the duration of the copy: run it in a maintenance window.
+    Returns the number of rows copied.
+    """
+    if table_kind(conn) != "r":
+        raise PartitioningError(f"{TABLE} is not a plain table (already partitioned or missing)")
+    old = f"{TABLE}_unpartitioned"
+    conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+    # Nothing may reference the partitioned table's id (see module docstring)
+    conn.execute(text("ALTER TABLE IF EXISTS journal_mood_scores DROP CONSTRAINT IF EXISTS journal_mood_scores_entry_id_fkey"))
+    # Keep the id sequence: the new table continues numbering where the old one stopped
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {SEQUENCE} OWNED BY NONE"))
+    conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {old}"))
+    oldest = conn.execute(text(f"SELECT min(created_at) FROM {old}")).scalar()
+    for statement in table_ddl():
+        conn.execute(text(statement))
+    ensure_partitions(conn, since=oldest.date() if oldest else None)
+    copied = conn.execute(text(f"""
+        INSERT INTO {TABLE} (id, title, content, created_at, updated_at, version, owner_id)
+        SELECT id, title, content, COALESCE(created_at, now()), updated_at, version, owner_id FROM {old}
+    """)).rowcount
+    conn.execute(text(f"SELECT setval('{SEQUENCE}', GREATEST((SELECT COALESCE(max(id), 0) FROM {TABLE}), 1))"))
+    return copied
+# --- END OF FILE backend/app/db/partitioning.py ---
@@ -0,0 +1,250 @@
+# --- START OF FILE backend/app/db/profiler.py ---
+"""
+Opt-in SQL profiling (SQL_PROFILING_ENABLED=true).
+
+Engine events time every statement and attribute it to the HTTP request being served,
+through a context variable set by SQLProfilerMiddleware (FastAPI copies the context into
+threadpool calls, so sync dependencies and handlers are covered). At the end of each
+request the counts are folded into per-endpoint aggregates, keyed by route template,
+and reported in a Server-Timing header. Within one request it flags:
+  - repeated statements: the same SQL with the same parameters (redundant round trips);
+  - N+1 patterns: the same SQL run SQL_N_PLUS_ONE_THRESHOLD or more times.
+Statements slower than SQL_SLOW_QUERY_MS are logged with their parameters redacted
+(only types and lengths are shown: entries and passwords must not reach the logs).
+Statements outside a request (background workers) are grouped under "(background)".
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND = "(background)"
+_MAX_SQL_CHARS = 300 # Statements are shortened to this in reports
+
+
+def _shorten(statement: str) -> str:
+    statement = " ".join(statement.split())
+    statement = re.sub(r"^SELECT .+? FROM ", "SELECT ... FROM ", statement) # The column list is noise in reports
+    return statement if len(statement) <= _MAX_SQL_CHARS else statement[:_MAX_SQL_CHARS] + "..."
+
+def _redact_value(value: Any) -> str:
+    if value is None or isinstance(value, bool):
+        return repr(value)
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+def redact_parameters(parameters: Any, executemany: bool = False) -> str:
+    """Parameters as type/length placeholders, never their values."""
+    if executemany:
+        parameters = list(parameters or ())
+        return f"{len(parameters)} rows of {redact_parameters(parameters[0]) if parameters else '()'}"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key}: {_redact_value(value)}" for key, value in parameters.items()) + "}"
+    return "(" + ", ".join(_redact_value(value) for value in parameters or ()) + ")"
+
+def _parameters_key(parameters: Any) -> int:
+    try:
+        return hash(tuple(parameters.items()) if isinstance(parameters, dict) else tuple(parameters or ()))
+    except TypeError:
+        return hash(repr(parameters))
+
+
+class RequestProfile:
+    """Statements issued while serving one request."""
+    __slots__ = ("queries", "sql_seconds", "slow_queries", "statements", "calls")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.slow_queries = 0
+        self.statements: Counter = Counter() # SQL text -> executions
+        self.calls: Counter = Counter() # (SQL text, parameters) -> executions
+
+    def record(self, statement: str, parameters: Any, bulk: bool, seconds: float, slow: bool) -> None:
+        self.queries += 1
+        self.sql_seconds += seconds
+        self.slow_queries += slow
+        if not bulk: # Batches of one bulk statement are not N+1
+            self.statements[statement] += 1
+            self.calls[(statement, _parameters_key(parameters))] += 1
+
+
+class _EndpointStats:
+    __slots__ = ("requests", "queries", "max_queries", "sql_seconds", "max_sql_seconds",
+                 "slow_queries", "repeated_requests", "n_plus_one_requests", "offenders")
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.sql_seconds = 0.0
+        self.max_sql_seconds = 0.0
+        self.slow_queries = 0
+        self.repeated_requests = 0
+        self.n_plus_one_requests = 0
+        self.offenders: Dict[str, Dict[str, Any]] = {} # SQL -> {"kind", "max_per_request"}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "queries": self.queries,
+            "avg_queries": round(self.queries / self.requests, 2) if self.requests else 0.0,
+            "max_queries": self.max_queries,
+            "total_sql_ms": round(self.sql_seconds * 1000, 3),
+            "avg_sql_ms": round(self.sql_seconds / self.requests * 1000, 3) if self.requests else 0.0,
+            "max_sql_ms": round(self.max_sql_seconds * 1000, 3),
+            "slow_queries": self.slow_queries,
+            "repeated_statement_requests": self.repeated_requests,
+            "n_plus_one_requests": self.n_plus_one_requests,
+            "offenders": [{"sql": sql, **info} for sql, info in self.offenders.items()],
+        }
+
+
+class SQLProfiler:
+    def __init__(self, slow_query_ms: float = settings.SQL_SLOW_QUERY_MS,
+                 n_plus_one_threshold: int = settings.SQL_N_PLUS_ONE_THRESHOLD):
+        self.slow_query_seconds = slow_query_ms / 1000
+        self.n_plus_one_threshold = max(2, n_plus_one_threshold)
+        self.current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("sql_profile", default=None)
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, _EndpointStats] = {}
+        self._engines = []
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self._engines)
+
+    def install(self, *engines) -> None:
+        for bind in engines:
+            if bind in self._engines:
+                continue
+            event.listen(bind, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(bind, "after_cursor_execute", self._after_cursor_execute)
+            self._engines.append(bind)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_profiler_start", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("sql_profiler_start")
+        if not starts:
+            return
+        seconds = time.perf_counter() - starts.pop()
+        slow = seconds >= self.slow_query_seconds
+        profile = self.current.get()
+        if profile is not None:
+            # Drivers without multi-row RETURNING (e.g. SQLite) run an INSERT ... RETURNING batch row by row
+            bulk = executemany or getattr(context, "execute_style", None) is ExecuteStyle.INSERTMANYVALUES
+            profile.record(statement, parameters, bulk, seconds, slow)
+        else:
+            self._merge(BACKGROUND, None, seconds=seconds)
+        if slow:
+            logger.warning(f"Slow query ({seconds * 1000:.1f} ms): {_shorten(statement)} "
+                           f"params={redact_parameters(parameters, executemany)}")
+
+    def start_request(self) -> contextvars.Token:
+        return self.current.set(RequestProfile())
+
+    def finish_request(self, token: contextvars.Token, endpoint: str) -> Optional[RequestProfile]:
+        profile = self.current.get()
+        self.current.reset(token)
+        if profile is not None:
+            self._merge(endpoint, profile)
+        return profile
+
+    def _merge(self, endpoint: str, profile: Optional[RequestProfile], seconds: float = 0.0) -> None:
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = _EndpointStats()
+            if profile is None: # A single background statement
+                stats.queries += 1
+                stats.sql_seconds += seconds
+                stats.slow_queries += seconds >= self.slow_query_seconds
+                return
+
+            stats.requests += 1
+            stats.queries += profile.queries
+            stats.max_queries = max(stats.max_queries, profile.queries)
+            stats.sql_seconds += profile.sql_seconds
+            stats.max_sql_seconds = max(stats.max_sql_seconds, profile.sql_seconds)
+            stats.slow_queries += profile.slow_queries
+
+            repeated = {sql for (sql, _), count in profile.calls.items() if count > 1}
+            n_plus_one = {sql: count for sql, count in profile.statements.items() if count >= self.n_plus_one_threshold}
+            stats.repeated_requests += bool(repeated)
+            stats.n_plus_one_requests += bool(n_plus_one)
+            for sql, count in n_plus_one.items():
+                self._note_offender(stats, endpoint, sql, "n_plus_one", count)
+            for sql in repeated - n_plus_one.keys():
+                self._note_offender(stats, endpoint, sql, "repeated", profile.statements[sql])
+
+    def _note_offender(self, stats: _EndpointStats, endpoint: str, sql: str, kind: str, count: int) -> None:
+        sql = _shorten(sql)
+        info = stats.offenders.get(sql)
+        if info is None:
+            stats.offenders[sql] = {"kind": kind, "max_per_request": count}
+            logger.warning(f"{endpoint}: {'N+1' if kind == 'n_plus_one' else 'repeated'} query x{count}: {sql}")
+        else:
+            if kind == "n_plus_one":
+                info["kind"] = kind
+            info["max_per_request"] = max(info["max_per_request"], count)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {name: stats.to_dict() for name, stats in self._endpoints.items()}
+        return {
+            "enabled": self.enabled,
+            "slow_query_ms": self.slow_query_seconds * 1000,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "endpoints": dict(sorted(endpoints.items(), key=lambda item: -item[1]["queries"])),
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._endpoints.clear()
+
+
+class SQLProfilerMiddleware:
+    """ASGI middleware that opens a RequestProfile per HTTP request and adds a Server-Timing header."""
+
+    def __init__(self, app, profiler: "SQLProfiler"):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        token = self.profiler.start_request()
+        profile = self.profiler.current.get()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing",
+                                f'db;dur={profile.sql_seconds * 1000:.2f};desc="{profile.queries} queries"'.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {route.path}" if route is not None else f"{scope['method']} (unmatched)"
+            self.profiler.finish_request(token, endpoint)
+
+
+sql_profiler = SQLProfiler()
+# --- END OF FILE backend/app/db/profiler.py ---
@@ -1,16 +1,27 @@
 # --- START OF FILE backend/app/main.py ---
 from fastapi import FastAPI, Depends, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 import sqlalchemy # Import sqlalchemy to use text
 
 # Use relative imports for modules within the same package
 from .db import database, models
-from .routers import auth, journal, chat
+from .db.profiler import sql_profiler, SQLProfilerMiddleware
+from .routers import auth, journal, chat, stats
+from .services import ai_services
+from .services.mood_service import mood_scorer
+from .services.chat_history_service import transcript_writer
+from .services.autosave_service import autosave_buffer
+from .services.digest_service import digest_scheduler
+from .services.usage_service import usage_meter
+from .services.local_llm_service import local_llm
 from .core.config import settings
+from .core.assets import AssetStore
+from .core.loop_monitor import loop_monitor
+from .core.cancellation import cancellation_stats
 from .core.security import get_current_active_user # <--- THÊM DÒNG NÀY
 
 # ... (phần còn lại của file giữ nguyên) ...
@@ -23,7 +34,40 @@ try:
 except Exception as e:
      print(f"Database initialization failed: {e}")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # --- Startup ---
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if settings.AI_WARMUP_ON_STARTUP:
+        try:
+            await ai_services.get_ai_service().warm_up()
+        except ai_services.AIConfigError as e:
+            print(f"AI warm-up skipped: {e}")
+    if settings.MOOD_SCORING_ENABLED:
+        mood_scorer.start()
+    transcript_writer.start()
+    if settings.AUTOSAVE_COALESCE_MS and settings.WEB_CONCURRENCY > 1:
+        print(f"WARNING: AUTOSAVE_COALESCE_MS={settings.AUTOSAVE_COALESCE_MS} with {settings.WEB_CONCURRENCY} workers: "
+              "buffered autosaves are invisible to the other workers unless sessions are sticky.")
+    autosave_buffer.start()
+    usage_meter.start()
+    if settings.DIGESTS_ENABLED:
+        digest_scheduler.start()
+    if settings.LOCAL_LLM_ENABLED:
+        local_llm.start() # Loads the fallback model in the background
+    yield
+    # --- Shutdown ---
+    mood_scorer.stop()
+    transcript_writer.stop() # Writes the chat messages still queued
+    autosave_buffer.stop() # Writes the buffered autosaves
+    digest_scheduler.stop()
+    usage_meter.stop() # Writes the pending token counters
+    local_llm.stop()
+    await loop_monitor.stop()
+
 app = FastAPI(
+    lifespan=lifespan,
     title="AI Journal App API",
     version="0.4.0",
     description="API for an AI-powered journaling application with context-aware chat."
@@ -31,11 +75,26 @@ app = FastAPI(
 
 # ... (CORS config) ...
 
+if settings.SQL_PROFILING_ENABLED:
+    sql_profiler.install(database.engine, *database.replica_engines,
+                         *([database.sqlite_reader_engine] if database.sqlite_reader_engine is not None else []))
+    app.add_middleware(SQLProfilerMiddleware, profiler=sql_profiler)
+    print(f"SQL profiling enabled (slow query threshold {settings.SQL_SLOW_QUERY_MS} ms).")
+
+if database.replica_engines:
+    app.add_middleware(database.ReadYourWritesMiddleware)
+    if settings.WEB_CONCURRENCY > 1:
+        print(f"Read replicas with {settings.WEB_CONCURRENCY} workers: read-your-writes relies on the "
+              f"{database.WRITE_COOKIE} cookie; clients that drop cookies may read stale data for "
+              f"up to the replication lag after a write.")
+
 # --- API Routers ---
 print("Including API routers...")
 app.include_router(auth.router)
 app.include_router(journal.router)
 app.include_router(chat.router)
+app.include_router(chat.ws_router)
+app.include_router(stats.router)
 print("API routers included.")
 
 # ... (Static files config) ...
@@ -48,55 +107,56 @@ static_dir = frontend_dir / "static"
 if not frontend_dir.is_dir(): print(f"ERROR: Frontend directory not found at calculated path: {frontend_dir}")
 if not static_dir.is_dir(): print(f"WARNING: Static directory not found at calculated path: {static_dir}.")
 
+asset_store = AssetStore(
+    frontend_dir,
+    max_cached_bytes=settings.STATIC_CACHE_MAX_FILE_BYTES,
+    reload=settings.STATIC_ASSETS_RELOAD,
+)
 if static_dir.is_dir():
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
-    print(f"Mounted static directory: {static_dir}")
+    if settings.STATIC_PRECOMPRESS_ON_STARTUP:
+        print(f"Precompressed {asset_store.preload('static')} static files.")
+    print(f"Serving static directory: {static_dir}")
 else:
-     print("Static directory mounting skipped as it does not exist.")
+     print("Static directory serving skipped as it does not exist.")
+
+@app.get("/static/{asset_path:path}", include_in_schema=False)
+async def serve_static(asset_path: str, request: Request):
+    if ".." in asset_path.split("/"):
+        # Only files under /static are public through this route
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    return await asset_store.serve(request, f"static/{asset_path}")
 
 @app.get("/", include_in_schema=False)
-async def serve_index():
-    index_path = frontend_dir / "index.html"
-    if index_path.is_file(): return FileResponse(index_path, media_type='text/html')
-    else: raise HTTPException(status_code=404, detail="index.html not found")
+async def serve_index(request: Request):
+    return await asset_store.serve_page(request, "index.html")
 
 @app.get("/favicon.ico", include_in_schema=False)
-async def serve_favicon():
-    favicon_path = frontend_dir / "static/img/favicon.ico"
-    if favicon_path.is_file():
-        return FileResponse(favicon_path, media_type='image/x-icon')
-    else:
-        raise HTTPException(status_code=404, detail="favicon.ico not found")
+async def serve_favicon(request: Request):
+    return await asset_store.serve(request, "static/img/favicon.ico")
 
 @app.get("/journal.html", include_in_schema=False)
-async def serve_journal_page():
-    journal_path = frontend_dir / "journal.html"
-    if journal_path.is_file(): return FileResponse(journal_path, media_type='text/html')
-    else: raise HTTPException(status_code=404, detail="journal.html not found")
+async def serve_journal_page(request: Request):
+    return await asset_store.serve_page(request, "journal.html")
 
 @app.get("/chat.html", include_in_schema=False)
-async def serve_chat_page():
-    chat_path = frontend_dir / "chat.html"
-    if chat_path.is_file(): return FileResponse(chat_path, media_type='text/html')
-    else: raise HTTPException(status_code=404, detail="chat.html not found")
+async def serve_chat_page(request: Request):
+    return await asset_store.serve_page(request, "chat.html")
 
 @app.get("/test-connection.html", include_in_schema=False)
-async def serve_test_connection_page():
-    test_path = frontend_dir / "test-connection.html"
-    if test_path.is_file(): return FileResponse(test_path, media_type='text/html')
-    else: raise HTTPException(status_code=404, detail="test-connection.html not found")
+async def serve_test_connection_page(request: Request):
+    return await asset_store.serve_page(request, "test-connection.html")
 
 print("HTML file serving configured.")
 
 # --- Health Check and Debug Endpoints ---
 print("Configuring health check and debug endpoints...")
 @app.get("/api/health", tags=["Health"])
-async def health_check():
-    db = None
+def health_check():
+    # Plain `def` so FastAPI runs it in the threadpool: the DB round-trip must not block the event loop
     try:
-        db = next(database.get_db())
-        # Use sqlalchemy.text for executing raw SQL safely
-        db.execute(sqlalchemy.text("SELECT 1"))
+        with database.engine.connect() as connection:
+            # Use sqlalchemy.text for executing raw SQL safely
+            connection.execute(sqlalchemy.text("SELECT 1"))
         db_status = "connected"
         status_code = status.HTTP_200_OK
         print("Health check: Database connection successful.")
@@ -108,10 +168,26 @@ async def health_check():
              status_code=status_code,
              content={"status": "unhealthy", "database": db_status, "error": str(e)}
          )
-    finally:
-        if db: db.close()
     return JSONResponse(status_code=status_code, content={"status": "healthy", "database": db_status})
 
+@app.get("/api/ready", tags=["Health"])
+async def readiness_check():
+    """
+    Readiness probe based on connection pool saturation.
+    Only reads pool counters, so it never competes with requests for a connection.
+    """
+    pool_status = database.get_pool_status()
+    content = {"pool": pool_status, "replicas": [database.get_pool_status(replica) for replica in database.replica_engines]}
+    probe = pool_status
+    if database.sqlite_reader_engine is not None:
+        # The single SQLite writer connection is fully used by every write; judge by the readers
+        probe = content["sqlite_readers"] = database.get_pool_status(database.sqlite_reader_engine)
+    saturated = probe.get("saturation", 0.0) >= settings.DB_POOL_SATURATION_THRESHOLD
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE if saturated else status.HTTP_200_OK,
+        content={"status": "saturated" if saturated else "ready", **content},
+    )
+
 @app.get("/api/debug/ping", tags=["Debug"])
 async def debug_ping():
     return {"message": "pong"}
@@ -125,6 +201,63 @@ async def debug_config(current_user: models.User = Depends(get_current_active_us
         "ACCESS_TOKEN_EXPIRE_MINUTES": settings.ACCESS_TOKEN_EXPIRE_MINUTES,
         "GEMINI_API_KEY_SET": bool(settings.GEMINI and settings.GEMINI != "Gemini" and len(settings.GEMINI) > 10),
     }
+@app.get("/api/debug/sql-profile", tags=["Debug"])
+async def debug_sql_profile(
+    reset: bool = False,
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Per-endpoint SQL statistics since startup (or the last reset): queries and SQL time per request,
+    slow queries, and statements repeated or run N+1 style within a request.
+    Only collected with SQL_PROFILING_ENABLED=true; counters are per worker process.
+    """
+    if not sql_profiler.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="SQL profiling is disabled (SQL_PROFILING_ENABLED=false)")
+    snapshot = sql_profiler.snapshot()
+    if reset:
+        sql_profiler.reset()
+    return snapshot
+@app.get("/api/debug/loop-lag", tags=["Debug"])
+async def debug_loop_lag(
+    reset: bool = False,
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Event loop lag histogram and recent stalls (loop blocked past LOOP_BLOCK_THRESHOLD_MS),
+    each with the handler and app call site that held the loop. Per worker process.
+    """
+    snapshot = loop_monitor.snapshot()
+    if reset:
+        loop_monitor.reset()
+    return snapshot
+@app.get("/api/debug/cancellations", tags=["Debug"])
+async def debug_cancellations(
+    reset: bool = False,
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    LLM work per operation (chat, chat_ws, consult, consult_batch): completed, failed, and cancelled
+    because the client disconnected or the deadline passed, with the model time those cancelled
+    calls had used. Per worker process.
+    """
+    snapshot = cancellation_stats.snapshot()
+    if reset:
+        cancellation_stats.reset()
+    return snapshot
+@app.get("/api/debug/llm-backends", tags=["Debug"])
+async def debug_llm_backends(
+    reset: bool = False,
+    current_user: models.User = Depends(get_current_active_user),
+):
+    """
+    Replies per backend (gemini, local fallback), failovers and the last Gemini error, how long
+    Gemini is still being skipped, and the local model's queue, batch sizes and tokens/s. Per worker process.
+    """
+    snapshot = ai_services.backend_router.snapshot()
+    if reset:
+        ai_services.backend_router.reset()
+        local_llm.reset()
+    return snapshot
 print("Health check and debug endpoints configured.")
 
 print("FastAPI application configured successfully.")
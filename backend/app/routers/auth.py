@@ -26,7 +26,8 @@ async def register_user(user: schemas.UserCreate, db: DbSession):
     Đăng ký người dùng mới.
     Kiểm tra xem email đã tồn tại chưa.
     """
-    db_user = crud.get_user_by_email(db, email=user.email)
+    # Check against the primary: a lagging replica could miss a just-registered email
+    db_user = crud.get_user_by_email(database.use_primary(db), email=user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -1,14 +1,24 @@
 # --- START OF FILE backend/app/routers/chat.py ---
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional, Set, Tuple
+import asyncio
+import json
+import time
 
 # Use relative imports
 from .. import schemas # Import the __init__ from schemas package
-from ..core.security import get_current_active_user, DbSession, CurrentUser
+from ..core.cancellation import CLIENT_CLOSED_REQUEST, ClientDisconnected, DeadlineExceeded, run_cancellable
+from ..core.config import settings
+from ..core.security import get_current_active_user, get_token_expiry, get_user_from_token, DbSession, CurrentUser, FlushAutosaves
+from ..db import database
 from ..services.context_service import ContextService
+from ..services import chat_history_service
+from ..services.chat_history_service import transcript_writer
+from ..services.usage_service import usage_meter, BudgetExceeded, CHAT
 # Import specific exceptions if needed for handling
-from ..services.ai_services import AIResponseError, AIConfigError
+from ..services.ai_services import AIResponseError, AIConfigError, ChatService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -29,23 +39,36 @@ router = APIRouter(
 @router.post("/", response_model=schemas.ChatResponse)
 async def handle_chat_message(
     chat_request: schemas.ChatRequest,
+    request: Request,
     db: DbSession,
     current_user: CurrentUser,
 ):
     """
     Handle a chat message from the user. Uses a persistent chat session
     for the user, initializing it with the 5 most recent journal entries
-    if needed.
+    if needed. The model call is cancelled if the client disconnects or
+    CHAT_DEADLINE_SECONDS pass (504); the session then forgets the turn.
+    With LOCAL_LLM_ENABLED, the local model replies while Gemini is unavailable (`backend`: local).
     """
     context_service = ContextService(db) # Instantiated per request, but uses class var for state
     try:
         logger.info(f"Received chat message from user {current_user.id}")
-        ai_reply = await context_service.process_chat_message(
-            message=chat_request.message,
-            user_id=current_user.id
+        reply = await run_cancellable(
+            context_service.process_chat_message(message=chat_request.message, user_id=current_user.id),
+            "chat", request=request, deadline_seconds=settings.CHAT_DEADLINE_SECONDS,
         )
         logger.info(f"Sending reply to user {current_user.id}")
-        return schemas.ChatResponse(reply=ai_reply)
+        return schemas.ChatResponse(reply=reply.text, backend=reply.backend)
+
+    except DeadlineExceeded as e:
+        logger.warning(f"Chat turn for user {current_user.id} timed out: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="The AI reply took too long. Please try again.")
+    except ClientDisconnected:
+        # Nobody is left to read this; the status only shows up in access logs
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected")
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
 
     except ValueError as e:
         # Handle cases like "Cannot start chat without journal entries."
@@ -65,20 +88,22 @@ async def handle_chat_message(
         logger.exception(f"Unexpected error in chat endpoint for user {current_user.id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An internal error occurred: {str(e)}")
 
-@router.get("/context", response_model=List[schemas.JournalEntry])
+@router.get("/context", response_model=List[schemas.JournalEntry], dependencies=[FlushAutosaves]) # Include buffered autosaves
 async def get_chat_context_entries(
     db: DbSession,
     current_user: CurrentUser,
+    refresh: bool = Query(False, description="Rebuild the chat session even if the context is unchanged"),
 ):
     """
-    Get the most recent journal entries for the current user and prepare a new chat session.
+    Get the most recent journal entries for the current user and prepare the chat session.
     The frontend uses this to check if the user can start chatting.
+    If no entry changed since the live session was built, it is reused (conversation kept);
+    pass `refresh=true` to always start a new session (and a new conversation in the history).
     Returns 404 if no entries are found.
     """
     context_service = ContextService(db)
     try:
-        # Always prepare a new chat session to get fresh context
-        context_entries = await context_service.prepare_new_chat_session(current_user.id)
+        context_entries = await context_service.prepare_new_chat_session(current_user.id, force_refresh=refresh)
         return context_entries # Returns list of entries on success
     except ValueError as e:
         # Raised by prepare_new_chat_session if no entries found
@@ -89,4 +114,265 @@ async def get_chat_context_entries(
         logger.exception(f"Error fetching chat context display for user {current_user.id}: {e}", exc_info=True)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch chat context.")
 
+@router.get("/history", response_model=schemas.ChatHistoryPage)
+def get_chat_history(
+    db: DbSession,
+    current_user: CurrentUser,
+    session_id: Optional[str] = Query(None, max_length=32, description="Default: the current conversation"),
+    before: Optional[int] = Query(None, ge=0, description="Cursor (`next_cursor` of the previous page)"),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """
+    Messages of a persisted conversation, newest page first, each page oldest-first.
+    Keyset-paginated on (user_id, session_id, seq): every page costs the same, however long the conversation.
+    A sync handler (run in the threadpool): it waits for queued turns to be written first.
+    """
+    context_service = ContextService(db)
+    session_id = session_id or context_service.current_session_id(current_user.id)
+    if session_id is None:
+        return schemas.ChatHistoryPage(session_id=None, messages=[], next_cursor=None)
+    transcript_writer.flush() # Include the turns still queued for writing
+    rows, next_cursor = chat_history_service.get_history_page(
+        db, current_user.id, session_id, before_seq=before, limit=limit
+    )
+    return schemas.ChatHistoryPage(
+        session_id=session_id,
+        messages=[schemas.ChatHistoryMessage.model_validate(row) for row in rows],
+        next_cursor=next_cursor,
+    )
+
+@router.get("/sessions", response_model=List[schemas.ChatSessionSummary])
+def list_chat_sessions(
+    db: DbSession,
+    current_user: CurrentUser,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """The current user's most recent conversations. Sync: waits for queued turns to be written first."""
+    transcript_writer.flush()
+    return chat_history_service.get_sessions(db, current_user.id, limit=limit)
+
+# --- WebSocket chat ---
+# Separate router: the HTTP auth dependency above cannot run on a WebSocket, the socket authenticates itself
+# with its first frame (never in the URL: access logs record it) and is closed when the token expires
+ws_router = APIRouter(prefix="/api/v1/chat", tags=["Chat"])
+
+# Turns still being cancelled after their socket closed (kept referenced so they are not garbage collected)
+_orphan_turns: Set[asyncio.Task] = set()
+
+def _authenticate_token(token) -> Optional[Tuple[int, Optional[float]]]:
+    """Resolve an access token to (user id, expiry as a Unix timestamp), or None if it is not valid."""
+    if not isinstance(token, str) or not token:
+        return None
+    db = database.SessionLocal()
+    try:
+        user = get_user_from_token(db, token)
+        return (user.id, get_token_expiry(token)) if user is not None else None
+    finally:
+        db.close()
+
+async def _authenticate_socket(websocket: WebSocket) -> Optional[Tuple[int, Optional[float]]]:
+    """
+    Authenticate an accepted socket from its Authorization header (non-browser clients), else from
+    its first frame, `{"type": "auth", "token": ...}`, expected within CHAT_WS_AUTH_TIMEOUT_SECONDS.
+    """
+    authorization = websocket.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return _authenticate_token(authorization[7:])
+    try:
+        frame = json.loads(await asyncio.wait_for(websocket.receive_text(), timeout=settings.CHAT_WS_AUTH_TIMEOUT_SECONDS))
+    except (asyncio.TimeoutError, ValueError):
+        return None
+    if not isinstance(frame, dict) or frame.get("type") != "auth":
+        return None
+    return _authenticate_token(frame.get("token"))
+
+
+class ChatSocket:
+    """
+    State of one chat WebSocket: the authenticated user and when their token expires, at most
+    one turn in flight, and a send lock so streamed chunks and heartbeats never interleave mid-frame.
+    """
+
+    def __init__(self, websocket: WebSocket, user_id: int, expires_at: Optional[float] = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.expires_at = expires_at # Unix time; a later `auth` frame with a fresh token extends it
+        self.turn: Optional[asyncio.Task] = None
+        self.open = True
+        self.last_seen = time.monotonic() # Any frame from the client (heartbeat)
+        self.last_message = time.monotonic() # Last chat message (idle timeout)
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, payload: dict) -> bool:
+        """Send one JSON frame. Awaiting the send is the backpressure: a slow client slows the stream down."""
+        if not self.open:
+            return False
+        try:
+            async with self._send_lock:
+                await self.websocket.send_json(payload)
+            return True
+        except (WebSocketDisconnect, RuntimeError):
+            self.open = False
+            return False
+
+    @property
+    def busy(self) -> bool:
+        return self.turn is not None and not self.turn.done()
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def receive_timeout(self) -> float:
+        """Wait for a frame until the next heartbeat is due, or until the token expires if that comes first."""
+        if self.expires_at is None:
+            return settings.CHAT_WS_HEARTBEAT_SECONDS
+        return max(0.0, min(settings.CHAT_WS_HEARTBEAT_SECONDS, self.expires_at - time.time()))
+
+    async def _chat_service(self) -> ChatService:
+        # Fast path: the live session, no DB session, no JWT decode, no ContextService
+        chat_service = ContextService.get_live_chat_service(self.user_id)
+        if chat_service is not None:
+            return chat_service
+        db = database.SessionLocal()
+        db.info["user_id"] = self.user_id
+        try:
+            return await ContextService(db).get_ready_chat_service(self.user_id)
+        finally:
+            db.close()
+
+    async def _stream_reply(self, message: str) -> None:
+        chat_service = await self._chat_service()
+        await self.send({"type": "start"})
+        parts = []
+        async for text in chat_service.stream_message(message):
+            parts.append(text)
+            await self.send({"type": "chunk", "text": text})
+        await self.send({"type": "done", "reply": "".join(parts), "backend": chat_service.last_backend})
+
+    async def run_turn(self, message: str) -> None:
+        """
+        Stream one reply as `start`, `chunk`..., `done` frames (or one `error` frame).
+        Cancelled after CHAT_DEADLINE_SECONDS (504 `error` frame) or when the socket closes (detach_turn).
+        """
+        try:
+            usage_meter.check(self.user_id, CHAT)
+            await run_cancellable(self._stream_reply(message), "chat_ws", deadline_seconds=settings.CHAT_DEADLINE_SECONDS)
+        except BudgetExceeded as e:
+            await self.send({"type": "error", "status": status.HTTP_429_TOO_MANY_REQUESTS, "detail": str(e),
+                             "retry_after": e.retry_after})
+        except DeadlineExceeded as e:
+            logger.warning(f"Chat socket turn for user {self.user_id} timed out: {str(e)}")
+            await self.send({"type": "error", "status": status.HTTP_504_GATEWAY_TIMEOUT, "detail": "The AI reply took too long. Please try again."})
+        except ValueError as e:
+            logger.warning(f"ValueError in chat socket for user {self.user_id}: {str(e)}")
+            await self.send({"type": "error", "status": status.HTTP_400_BAD_REQUEST, "detail": str(e)})
+        except (AIConfigError, AIResponseError) as e:
+            logger.error(f"AI error in chat socket for user {self.user_id}: {type(e).__name__} - {str(e)}")
+            await self.send({"type": "error", "status": status.HTTP_503_SERVICE_UNAVAILABLE, "detail": f"AI service error: {str(e)}"})
+        except Exception as e:
+            logger.exception(f"Unexpected error in chat socket for user {self.user_id}: {e}")
+            await self.send({"type": "error", "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "detail": "An internal error occurred."})
+
+    async def handle(self, raw: str) -> None:
+        self.last_seen = time.monotonic()
+        try:
+            frame = json.loads(raw)
+            frame_type = frame.get("type", "message")
+        except (ValueError, AttributeError):
+            await self.send({"type": "error", "status": status.HTTP_400_BAD_REQUEST, "detail": "Frames must be JSON objects."})
+            return
+        if frame_type == "ping":
+            await self.send({"type": "pong"})
+        elif frame_type == "auth":
+            auth = _authenticate_token(frame.get("token"))
+            if auth is None or auth[0] != self.user_id:
+                await self.send({"type": "error", "status": status.HTTP_401_UNAUTHORIZED, "detail": "Could not validate credentials"})
+                return
+            self.expires_at = auth[1]
+            await self.send({"type": "ready", "user_id": self.user_id, "expires_at": self.expires_at})
+        elif frame_type == "pong":
+            pass
+        elif frame_type == "message":
+            try:
+                chat_request = schemas.ChatRequest(message=frame.get("message"))
+            except ValidationError:
+                await self.send({"type": "error", "status": 422, "detail": "`message` must be a non-empty string."})
+                return
+            if self.busy:
+                # One turn at a time per socket; the client should wait for `done`/`error`
+                await self.send({"type": "error", "status": status.HTTP_429_TOO_MANY_REQUESTS, "detail": "A reply is still being generated."})
+                return
+            self.last_message = time.monotonic()
+            self.turn = asyncio.create_task(self.run_turn(chat_request.message))
+        else:
+            await self.send({"type": "error", "status": status.HTTP_400_BAD_REQUEST, "detail": f"Unknown frame type: {frame_type}"})
+
+    def should_close(self) -> Optional[str]:
+        now = time.monotonic()
+        if now - self.last_seen > 2 * settings.CHAT_WS_HEARTBEAT_SECONDS:
+            return "heartbeat timeout"
+        if (settings.CHAT_WS_IDLE_TIMEOUT_SECONDS > 0 and not self.busy
+                and now - self.last_message > settings.CHAT_WS_IDLE_TIMEOUT_SECONDS):
+            return "idle timeout"
+        return None
+
+    def detach_turn(self) -> None:
+        """The socket is gone: nobody will read the reply, so stop generating it (the chat service forgets the turn)."""
+        self.open = False
+        if self.busy:
+            self.turn.cancel()
+            _orphan_turns.add(self.turn)
+            self.turn.add_done_callback(_orphan_turns.discard)
+
+
+@ws_router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Chat over one WebSocket: authenticate with a first `{"type": "auth", "token": "<access token>"}`
+    frame (or an Authorization header), then exchange JSON frames. The socket is closed (1008) when
+    the token expires; send another `auth` frame with a fresh token before then to keep it.
+
+    Client -> server: `{"type": "message", "message": "..."}`, `{"type": "ping"}`, `{"type": "pong"}`, `auth`.
+    Server -> client: `ready` (`user_id`, `expires_at`), then per turn `start`, `chunk` (`text`)..., `done` (`reply`, `backend`);
+    `error` (`status`, `detail`, same codes as the HTTP endpoint; 429 if a turn is already running
+    or the daily AI budget is used up, with `retry_after`);
+    `ping` when the socket has been quiet for CHAT_WS_HEARTBEAT_SECONDS (answer with `pong`).
+    """
+    await websocket.accept()
+    try:
+        auth = await _authenticate_socket(websocket)
+    except WebSocketDisconnect:
+        return
+    if auth is None or (auth[1] is not None and auth[1] <= time.time()):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Could not validate credentials")
+        return
+    user_id, expires_at = auth
+    socket = ChatSocket(websocket, user_id, expires_at)
+    logger.info(f"Chat socket opened for user {user_id}")
+    await socket.send({"type": "ready", "user_id": user_id, "expires_at": expires_at})
+    try:
+        while True:
+            if socket.expired:
+                logger.info(f"Closing chat socket for user {user_id}: token expired")
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token expired")
+                break
+            try:
+                raw = await asyncio.wait_for(websocket.receive_text(), timeout=socket.receive_timeout())
+            except asyncio.TimeoutError:
+                if socket.expired:
+                    continue # Closed at the top of the loop
+                reason = socket.should_close()
+                if reason is not None:
+                    logger.info(f"Closing chat socket for user {user_id}: {reason}")
+                    await websocket.close(code=status.WS_1001_GOING_AWAY, reason=reason)
+                    break
+                await socket.send({"type": "ping"})
+                continue
+            await socket.handle(raw)
+    except WebSocketDisconnect:
+        logger.info(f"Chat socket closed by user {user_id}")
+    finally:
+        socket.detach_turn()
+
 # --- END OF FILE backend/app/routers/chat.py ---
\ No newline at end of file
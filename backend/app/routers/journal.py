@@ -1,13 +1,23 @@
 # --- START OF FILE backend/app/routers/journal.py ---
+from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+import orjson
 from sqlalchemy.orm import Session
 
 # Use relative imports
 from .. import crud, schemas
 from ..db import models
-from ..core.security import get_current_active_user, DbSession, CurrentUser
+from ..core import http_cache
+from ..core.cancellation import CLIENT_CLOSED_REQUEST, ClientDisconnected, DeadlineExceeded, run_cancellable
+from ..core.config import settings
+from ..core.security import get_current_active_user, DbSession, CurrentUser, FlushAutosaves
 from ..services.context_service import ContextService
+from ..services.mood_service import mood_scorer
+from ..services import export_service
+from ..services.usage_service import BudgetExceeded
+from ..services.autosave_service import autosave_buffer, AutosaveConflict, AutosaveNotFound, AutosaveError
 
 router = APIRouter(
     prefix="/api/v1/journal",
@@ -29,36 +39,185 @@ async def create_journal_entry(
     """
     Create a new journal entry for the current user.
     """
-    return crud.create_journal(db=db, journal=journal, user_id=current_user.id)
+    db_journal = crud.create_journal(db=db, journal=journal, user_id=current_user.id)
+    mood_scorer.submit([db_journal.id])
+    return db_journal
+
+@router.post("/batch", response_model=schemas.JournalBatchResult, status_code=status.HTTP_201_CREATED)
+async def create_journal_entries_batch(
+    batch: schemas.JournalBatchCreate,
+    db: DbSession,
+    current_user: CurrentUser,
+):
+    """
+    Create several journal entries in one transaction (single INSERT ... RETURNING).
+    Results are returned in request order.
+    """
+    created = crud.create_journals(db=db, journals=batch.items, user_id=current_user.id)
+    mood_scorer.submit(entry.id for entry in created)
+    return schemas.JournalBatchResult(results=[
+        schemas.JournalBatchItemResult(index=index, id=entry.id, status="created", entry=entry)
+        for index, entry in enumerate(created)
+    ])
+
+@router.patch("/batch", response_model=schemas.JournalBatchResult, dependencies=[FlushAutosaves])
+async def update_journal_entries_batch(
+    batch: schemas.JournalBatchUpdate,
+    db: DbSession,
+    current_user: CurrentUser,
+):
+    """
+    Update several journal entries in one transaction.
+    Items whose id does not exist or belongs to another user get status `not_found`.
+    """
+    updated = crud.update_journals(db=db, items=batch.items, user_id=current_user.id)
+    mood_scorer.submit(item.id for item in batch.items if item.content is not None and item.id in updated)
+    results = []
+    for index, item in enumerate(batch.items):
+        entry = updated.get(item.id)
+        results.append(schemas.JournalBatchItemResult(
+            index=index, id=item.id, status="updated" if entry else "not_found", entry=entry
+        ))
+    return schemas.JournalBatchResult(results=results)
+
+@router.post("/batch/delete", response_model=schemas.JournalBatchResult, dependencies=[FlushAutosaves])
+async def delete_journal_entries_batch(
+    batch: schemas.JournalBatchDelete,
+    db: DbSession,
+    current_user: CurrentUser,
+):
+    """
+    Delete several journal entries with a single DELETE ... RETURNING.
+    Ids that do not exist or belong to another user get status `not_found`.
+    """
+    deleted_ids = crud.delete_journals(db=db, journal_ids=batch.ids, user_id=current_user.id)
+    return schemas.JournalBatchResult(results=[
+        schemas.JournalBatchItemResult(index=index, id=journal_id, status="deleted" if journal_id in deleted_ids else "not_found")
+        for index, journal_id in enumerate(batch.ids)
+    ])
 
-@router.get("/", response_model=List[schemas.JournalEntry])
+@router.get("/", response_model=List[schemas.JournalEntry], dependencies=[FlushAutosaves])
 async def read_journal_entries(
+    request: Request,
+    response: Response,
     db: DbSession,
     current_user: CurrentUser,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=200),
+    before: Optional[datetime] = Query(None, description="Cursor: created_at of the last entry of the previous page"),
+    before_id: Optional[int] = Query(None, description="Cursor: id of that entry, so entries sharing its created_at are not skipped"),
 ):
     """
-    Get a list of journal entries for the current user.
+    Get a list of journal entries for the current user, newest first.
+    Page with the (`before`, `before_id`) cursor, the created_at and id of the previous
+    page's last entry, rather than `skip` on large journals: it seeks instead of
+    skipping rows, and prunes time partitions (JOURNAL_PARTITIONING).
+    Supports conditional GET: the ETag is derived from the user's entry count,
+    max id, sum of entry versions and newest created_at, so a matching `If-None-Match`
+    returns 304 without loading any entry bodies. No Last-Modified: deletes have no timestamp.
     """
-    journals = crud.get_journals(db, user_id=current_user.id, skip=skip, limit=limit)
+    count, max_id, version_sum, max_created_at = crud.get_journals_version(db, user_id=current_user.id)
+    etag = http_cache.make_etag("journals", current_user.id, count, max_id, version_sum, max_created_at,
+                                skip, limit, before, before_id)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified_response(etag)
+
+    journals = crud.get_journals(db, user_id=current_user.id, skip=skip, limit=limit, before=before,
+                                 before_id=before_id)
+    http_cache.apply_cache_headers(response, etag)
     return journals
 
-@router.get("/{journal_id}", response_model=schemas.JournalEntry)
+@router.get("/summary", response_model=List[schemas.JournalEntrySummary], dependencies=[FlushAutosaves])
+async def read_journal_summaries(
+    request: Request,
+    db: DbSession,
+    current_user: CurrentUser,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=200),
+    preview_length: int = Query(160, ge=0, le=1000),
+):
+    """
+    Get a lightweight list of the current user's entries for the sidebar:
+    id, title, dates and a short preview computed in SQL.
+    Rows are serialized straight to JSON with orjson, skipping ORM objects and
+    Pydantic validation. Shares the listing's conditional GET support.
+    """
+    count, max_id, version_sum, max_created_at = crud.get_journals_version(db, user_id=current_user.id)
+    etag = http_cache.make_etag("journal-summaries", current_user.id, count, max_id, version_sum, max_created_at,
+                                skip, limit, preview_length)
+    if http_cache.is_not_modified(request, etag):
+        return http_cache.not_modified_response(etag)
+
+    rows = crud.get_journal_summaries(
+        db, user_id=current_user.id, skip=skip, limit=limit, preview_length=preview_length
+    )
+    response = Response(content=orjson.dumps(rows), media_type="application/json")
+    http_cache.apply_cache_headers(response, etag)
+    return response
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {media_type: {} for media_type, _ in export_service.FORMATS.values()}},
+               501: {"description": "Columnar export not available on this server"}},
+    dependencies=[FlushAutosaves],
+)
+def export_journal_entries(
+    current_user: CurrentUser,
+    export_format: str = Query("parquet", alias="format", pattern="^(parquet|arrow)$"),
+    include_content: bool = Query(True, description="Set to false to export metadata and derived fields only"),
+    chunk_size: int = Query(1000, ge=100, le=10000),
+):
+    """
+    Export all of the current user's entries for offline analytics, as Parquet or an Arrow IPC stream.
+    Each row carries derived fields (word/char count, UTC date parts) and the stored mood score, if any.
+    The file is streamed chunk by chunk from a server-side cursor, so large accounts export in bounded memory.
+    """
+    if not export_service.is_available():
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED,
+                            detail="Columnar export requires pyarrow on the server")
+    media_type, extension = export_service.FORMATS[export_format]
+    return StreamingResponse(
+        export_service.stream_export(current_user.id, export_format, include_content, chunk_size),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="journal-{current_user.id}.{extension}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+@router.get("/{journal_id}", response_model=schemas.JournalEntry, dependencies=[FlushAutosaves])
 async def read_journal_entry(
     journal_id: int,
+    request: Request,
+    response: Response,
     db: DbSession,
     current_user: CurrentUser,
 ):
     """
     Get a specific journal entry by ID, only if it belongs to the current user.
+    Supports conditional GET via an ETag derived from `version` (bumped by every write)
+    and `created_at` (tells apart an entry created under a reused id), and Last-Modified from `updated_at`.
     """
+    if http_cache.has_conditional_headers(request):
+        # Check the validators with a column-only query before touching the content
+        version = crud.get_journal_version(db, journal_id=journal_id, user_id=current_user.id)
+        if version is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
+        etag = http_cache.make_etag("journal", version.id, version.version, version.created_at)
+        if http_cache.is_not_modified(request, etag, version.updated_at):
+            return http_cache.not_modified_response(etag, version.updated_at)
+
     db_journal = crud.get_journal(db, journal_id=journal_id, user_id=current_user.id)
     if db_journal is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
+    http_cache.apply_cache_headers(
+        response, http_cache.make_etag("journal", db_journal.id, db_journal.version, db_journal.created_at),
+        db_journal.updated_at
+    )
     return db_journal
 
-@router.put("/{journal_id}", response_model=schemas.JournalEntry)
+@router.put("/{journal_id}", response_model=schemas.JournalEntry, dependencies=[FlushAutosaves])
 async def update_journal_entry(
     journal_id: int,
     journal_update: schemas.JournalEntryUpdate,
@@ -71,9 +230,46 @@ async def update_journal_entry(
     updated_journal = crud.update_journal(db=db, journal_id=journal_id, journal_update=journal_update, user_id=current_user.id)
     if updated_journal is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
+    if journal_update.content is not None:
+        mood_scorer.submit([journal_id])
     return updated_journal
 
-@router.delete("/{journal_id}", status_code=status.HTTP_204_NO_CONTENT)
+@router.patch(
+    "/{journal_id}/autosave",
+    response_model=schemas.JournalAutosaveResult,
+    responses={409: {"description": "Entry changed since base_version; reload it"}},
+)
+def autosave_journal_entry(
+    journal_id: int,
+    autosave: schemas.JournalAutosave,
+    current_user: CurrentUser,
+):
+    """
+    Save editor changes as text edits against `base_version` instead of resending the whole entry.
+    Returns the new version to use as the next `base_version`. Rapid autosaves are coalesced in
+    memory and written together (`pending` is true until then); reads of the entry write them first.
+    A stale `base_version` gets 409: the client should reload the entry (or save it with PUT).
+    Sync: a write-through autosave (several workers) runs its UPDATE in the threadpool.
+    """
+    try:
+        version, pending = autosave_buffer.apply(
+            journal_id, current_user.id, autosave.base_version,
+            [(edit.start, edit.delete, edit.insert) for edit in autosave.edits],
+            title=autosave.title,
+        )
+    except AutosaveNotFound:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
+    except AutosaveConflict as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Entry is at version {e.current_version}, not {autosave.base_version}",
+            headers={"X-Entry-Version": str(e.current_version)},
+        )
+    except AutosaveError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return schemas.JournalAutosaveResult(id=journal_id, version=version, pending=pending)
+
+@router.delete("/{journal_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[FlushAutosaves])
 async def delete_journal_entry(
     journal_id: int,
     db: DbSession,
@@ -88,26 +284,84 @@ async def delete_journal_entry(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
     return None
 
-@router.post("/{journal_id}/consult", response_model=schemas.AIConsultationResponse)
+@router.post(
+    "/consult/batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}},
+                     "description": "One AIConsultationBatchItem per line as each completes, then a `done` line"}},
+    dependencies=[FlushAutosaves],
+)
+async def consult_journal_entries_batch(
+    batch: schemas.AIConsultationBatchRequest,
+    db: DbSession,
+    current_user: CurrentUser,
+):
+    """
+    Consult several entries at once (e.g. a weekly review), by ids and/or a creation date range.
+    Targets and their contexts are loaded in a few set-based queries, then the model calls run
+    concurrently (CONSULT_BATCH_CONCURRENCY at a time). The response is NDJSON: one line per
+    entry as soon as its consultation is ready (`not_found` ids first), then
+    `{"type": "done", "total": n, "failed": k}`. A consultation running past CONSULT_DEADLINE_SECONDS
+    is cancelled (`timeout` line); if the client disconnects, all pending ones are.
+    """
+    if batch.ids is None and batch.start is None and batch.end is None:
+        raise HTTPException(status_code=422, detail="Provide ids, a start/end range, or both")
+    context_service = ContextService(db)
+    try:
+        targets, contexts = context_service.load_consultation_batch(
+            current_user.id, ids=batch.ids, start=batch.start, end=batch.end, limit=schemas.MAX_CONSULT_BATCH_SIZE + 1
+        )
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    if len(targets) > schemas.MAX_CONSULT_BATCH_SIZE:
+        raise HTTPException(status_code=422,
+                            detail=f"More than {schemas.MAX_CONSULT_BATCH_SIZE} entries match; narrow the range")
+    found = {target.id for target in targets}
+    missing = [journal_id for journal_id in dict.fromkeys(batch.ids or ()) if journal_id not in found]
+
+    async def lines():
+        failed = len(missing)
+        for journal_id in missing:
+            yield orjson.dumps({"type": "result", "entry_id": journal_id, "status": "not_found"}) + b"\n"
+        async for item in context_service.stream_consultations(targets, contexts):
+            failed += item["status"] != "ok"
+            yield orjson.dumps(item) + b"\n"
+        yield orjson.dumps({"type": "done", "total": len(targets) + len(missing), "failed": failed}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/{journal_id}/consult", response_model=schemas.AIConsultationResponse, dependencies=[FlushAutosaves])
 async def get_ai_journal_consultation(
     journal_id: int,
+    request: Request,
     db: DbSession,
     current_user: CurrentUser,
 ):
     """
     Get AI consultation/analysis for a specific journal entry,
-    using 5 recent entries as context.
+    using 5 recent entries as context. The model call is cancelled if the
+    client disconnects or CONSULT_DEADLINE_SECONDS pass (504).
+    With LOCAL_LLM_ENABLED, the local model answers while Gemini is unavailable (`backend`: local).
     """
     try:
         context_service = ContextService(db)
-        consultation_text = await context_service.get_ai_consultation(
-            entry_id=journal_id,
-            user_id=current_user.id
+        reply = await run_cancellable(
+            context_service.get_ai_consultation(entry_id=journal_id, user_id=current_user.id),
+            "consult", request=request, deadline_seconds=settings.CONSULT_DEADLINE_SECONDS,
         )
         return schemas.AIConsultationResponse(
             entry_id=journal_id,
-            consultation=consultation_text
+            consultation=reply.text,
+            backend=reply.backend,
         )
+    except DeadlineExceeded:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="The AI consultation took too long. Please try again.")
+    except ClientDisconnected:
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected")
+    except BudgetExceeded as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         if "not found" in str(e).lower():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Journal entry not found")
@@ -0,0 +1,84 @@
+# --- START OF FILE backend/app/routers/stats.py ---
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+
+# Use relative imports
+from .. import schemas
+from ..core.config import settings
+from ..core.security import get_current_active_user, DbSession, CurrentUser, FlushAutosaves
+from ..services import stats_service, mood_service, usage_service
+
+router = APIRouter(
+    prefix="/api/v1/stats",
+    tags=["Stats"],
+    dependencies=[Depends(get_current_active_user)],
+    responses={401: {"description": "Unauthorized"}},
+)
+
+MAX_RANGE_DAYS = 3660
+
+@router.get("/", response_model=schemas.WritingStats, dependencies=[FlushAutosaves]) # Word counts of buffered autosaves
+async def read_writing_stats(
+    db: DbSession,
+    current_user: CurrentUser,
+    start: Optional[date] = Query(None, description="First day (inclusive); defaults to 365 days before `end`"),
+    end: Optional[date] = Query(None, description="Last day (inclusive); defaults to today"),
+    tz_offset: int = Query(0, ge=-12, le=14, description="User's UTC offset in whole hours, e.g. 7 for Vietnam"),
+):
+    """
+    Writing statistics for the current user: entries and words per day, streaks,
+    and activity by weekday and hour. Served from incrementally maintained
+    aggregate rows, so the cost depends on the number of days, not entries.
+    """
+    end = end or (datetime.now(timezone.utc) + timedelta(hours=tz_offset)).date()
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must not be after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
+    return stats_service.get_stats(db, user_id=current_user.id, start=start, end=end, tz_offset_hours=tz_offset)
+@router.get("/mood", response_model=schemas.MoodTimeline)
+async def read_mood_timeline(
+    db: DbSession,
+    current_user: CurrentUser,
+    start: Optional[date] = Query(None, description="First day (inclusive, UTC); defaults to 90 days before `end`"),
+    end: Optional[date] = Query(None, description="Last day (inclusive, UTC); defaults to today"),
+):
+    """
+    Mood timeline for the current user: the locally computed sentiment of each
+    entry in the range, oldest first. Entries are scored in the background after
+    they are saved (MOOD_SCORING_ENABLED), so the newest ones may be missing briefly.
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=89)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must not be after end")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Range is limited to {MAX_RANGE_DAYS} days")
+    points = mood_service.get_mood_timeline(db, user_id=current_user.id, start=start, end=end)
+    return schemas.MoodTimeline(start=start, end=end, points=points)
+@router.get("/usage", response_model=schemas.LLMUsageReport)
+async def read_llm_usage(
+    db: DbSession,
+    current_user: CurrentUser,
+    days: int = Query(30, ge=1, le=366, description="Number of UTC days back from today"),
+):
+    """
+    AI token usage of the current user per UTC day and feature, and where today's usage stands
+    against the daily budget. Counters are written in batches (USAGE_FLUSH_SECONDS), so the
+    latest requests may only show in `today_tokens` at first.
+    """
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=days - 1)
+    rows = usage_service.get_usage(db, user_id=current_user.id, start=start, end=end)
+    budget = settings.USAGE_DAILY_TOKEN_BUDGET
+    return schemas.LLMUsageReport(
+        start=start,
+        end=end,
+        days=[schemas.LLMUsageDay.model_validate(row) for row in rows],
+        today_tokens=usage_service.usage_meter.spent_today(current_user.id, db),
+        daily_budget=budget if budget > 0 else None,
+        budget_level=usage_service.LEVEL_NAMES[usage_service.usage_meter.level(current_user.id, db)],
+    )
+# --- END OF FILE backend/app/routers/stats.py ---
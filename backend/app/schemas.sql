@@ -1,4 +1,9 @@
 -- Drop existing tables if they exist
+DROP TABLE IF EXISTS llm_usage_stats CASCADE;
+DROP TABLE IF EXISTS journal_digests CASCADE;
+DROP TABLE IF EXISTS chat_messages CASCADE;
+DROP TABLE IF EXISTS journal_mood_scores CASCADE;
+DROP TABLE IF EXISTS journal_activity_stats CASCADE;
 DROP TABLE IF EXISTS journal_entries CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
 
@@ -17,9 +22,80 @@ CREATE TABLE journal_entries (
     content TEXT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    version INTEGER NOT NULL DEFAULT 1,
     owner_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- With JOURNAL_PARTITIONING (time | owner | time_owner) the backend creates journal_entries itself as a
+-- partitioned table instead (app/db/partitioning.py): skip the table above, and drop the REFERENCES
+-- journal_entries clause of journal_mood_scores, since the primary key then includes the partition key, e.g.
+--   CREATE TABLE journal_entries (... , PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at);
+--   CREATE TABLE journal_entries_p202601 PARTITION OF journal_entries FOR VALUES FROM ('2026-01-01') TO ('2026-02-01');
+-- Convert an existing table with `python manage.py partition-journal`.
+
+-- Writing activity aggregates (per user, UTC day and hour); rebuild with `python manage.py rebuild-stats`
+CREATE TABLE journal_activity_stats (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    hour INTEGER NOT NULL,
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    word_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, hour)
+);
+
+-- Local sentiment scores per entry (filled in the background when MOOD_SCORING_ENABLED=true)
+CREATE TABLE journal_mood_scores (
+    entry_id INTEGER PRIMARY KEY REFERENCES journal_entries(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    label VARCHAR NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    negative DOUBLE PRECISION NOT NULL,
+    neutral DOUBLE PRECISION NOT NULL,
+    positive DOUBLE PRECISION NOT NULL,
+    model VARCHAR NOT NULL,
+    scored_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- Chat transcripts (one row per message; seq orders messages within a session)
+CREATE TABLE chat_messages (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    session_id VARCHAR(32) NOT NULL,
+    seq INTEGER NOT NULL,
+    role VARCHAR(16) NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+);
+
+-- Weekly/monthly summaries used as compact chat context (DIGESTS_ENABLED=true)
+CREATE TABLE journal_digests (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    period VARCHAR(8) NOT NULL,
+    period_start DATE NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    model VARCHAR,
+    revision INTEGER NOT NULL DEFAULT 1,
+    dirty_at TIMESTAMP WITH TIME ZONE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (user_id, period, period_start)
+);
+
+-- Gemini token usage per user, day and feature (flushed in batches by the usage meter)
+CREATE TABLE llm_usage_stats (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    feature VARCHAR(16) NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, day, feature)
+);
+
 -- Create indexes
 CREATE INDEX idx_journal_entries_owner_id ON journal_entries(owner_id);
+CREATE INDEX ix_journal_entries_owner_created ON journal_entries(owner_id, created_at);
 CREATE INDEX idx_users_email ON users(email);
+CREATE INDEX idx_journal_mood_scores_user_id ON journal_mood_scores(user_id);
+CREATE UNIQUE INDEX ix_chat_messages_user_session_seq ON chat_messages(user_id, session_id, seq);
+CREATE INDEX ix_journal_digests_dirty_at ON journal_digests(dirty_at);
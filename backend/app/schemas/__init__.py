@@ -9,9 +9,31 @@ from .schemas import (
     JournalEntryCreate,
     JournalEntryUpdate,
     JournalEntry,
+    TextEdit,
+    JournalAutosave,
+    JournalAutosaveResult,
+    JournalEntrySummary,
+    JournalBatchCreate,
+    JournalBatchUpdateItem,
+    JournalBatchUpdate,
+    JournalBatchDelete,
+    JournalBatchItemResult,
+    JournalBatchResult,
+    DailyActivity,
+    WritingStats,
+    MoodPoint,
+    MoodTimeline,
+    LLMUsageDay,
+    LLMUsageReport,
     AIConsultationResponse,
+    MAX_CONSULT_BATCH_SIZE,
+    AIConsultationBatchRequest,
+    AIConsultationBatchItem,
     ChatRequest,
-    ChatResponse
+    ChatResponse,
+    ChatHistoryMessage,
+    ChatHistoryPage,
+    ChatSessionSummary
 )
 
 __all__ = [
@@ -24,7 +46,29 @@ __all__ = [
     "JournalEntryCreate",
     "JournalEntryUpdate",
     "JournalEntry",
+    "TextEdit",
+    "JournalAutosave",
+    "JournalAutosaveResult",
+    "JournalEntrySummary",
+    "JournalBatchCreate",
+    "JournalBatchUpdateItem",
+    "JournalBatchUpdate",
+    "JournalBatchDelete",
+    "JournalBatchItemResult",
+    "JournalBatchResult",
+    "DailyActivity",
+    "WritingStats",
+    "MoodPoint",
+    "MoodTimeline",
+    "LLMUsageDay",
+    "LLMUsageReport",
     "AIConsultationResponse",
+    "MAX_CONSULT_BATCH_SIZE",
+    "AIConsultationBatchRequest",
+    "AIConsultationBatchItem",
     "ChatRequest",
-    "ChatResponse"
+    "ChatResponse",
+    "ChatHistoryMessage",
+    "ChatHistoryPage",
+    "ChatSessionSummary"
 ]
\ No newline at end of file
@@ -1,7 +1,7 @@
 # --- START OF FILE backend/app/schemas/schemas.py ---
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
 
 # --- Token Schemas ---
 class Token(BaseModel):
@@ -40,12 +40,133 @@ class JournalEntry(JournalEntryBase):
     owner_id: int
     created_at: datetime
     updated_at: datetime
+    version: int
     model_config = {"from_attributes": True}
 
+class TextEdit(BaseModel):
+    """Replace `delete` code units at `start` with `insert` (UTF-16 offsets, as in JavaScript strings)."""
+    start: int = Field(..., ge=0)
+    delete: int = Field(0, ge=0)
+    insert: str = ""
+
+class JournalAutosave(BaseModel):
+    """Editor changes since `base_version`, the version returned by the previous save."""
+    base_version: int = Field(..., ge=1)
+    edits: List[TextEdit] = Field(default_factory=list, max_length=500)
+    title: Optional[str] = Field(None, min_length=1, max_length=255)
+
+class JournalAutosaveResult(BaseModel):
+    id: int
+    version: int
+    pending: bool # True while the change is buffered and not yet written to the database
+
+class JournalEntrySummary(BaseModel):
+    """Lightweight listing item: no full content, only a server-computed preview."""
+    id: int
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    preview: str
+
+# --- Batch Journal Schemas ---
+MAX_BATCH_SIZE = 500
+
+class JournalBatchCreate(BaseModel):
+    items: List[JournalEntryCreate] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class JournalBatchUpdateItem(JournalEntryUpdate):
+    id: int
+
+class JournalBatchUpdate(BaseModel):
+    items: List[JournalBatchUpdateItem] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class JournalBatchDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=MAX_BATCH_SIZE)
+
+class JournalBatchItemResult(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    id: Optional[int] = None
+    status: str = Field(..., description="created | updated | deleted | not_found")
+    entry: Optional[JournalEntry] = None
+
+class JournalBatchResult(BaseModel):
+    results: List[JournalBatchItemResult]
+
+# --- Writing Stats Schemas ---
+class DailyActivity(BaseModel):
+    date: date
+    entries: int
+    words: int
+
+class WritingStats(BaseModel):
+    start: date
+    end: date
+    tz_offset_hours: int
+    total_entries: int
+    total_words: int
+    active_days: int
+    entries_per_day: float
+    avg_words_per_entry: float
+    current_streak: int
+    longest_streak: int
+    daily: List[DailyActivity]
+    by_weekday: List[int] = Field(..., description="Entries per weekday, Monday first")
+    by_hour: List[int] = Field(..., description="Entries per hour of day (0-23)")
+
+class MoodPoint(BaseModel):
+    entry_id: int
+    title: str
+    created_at: datetime
+    label: str
+    score: float = Field(..., description="Valence in [-1, 1]: P(positive) - P(negative)")
+    negative: float
+    neutral: float
+    positive: float
+
+class MoodTimeline(BaseModel):
+    start: date
+    end: date
+    points: List[MoodPoint]
+
+class LLMUsageDay(BaseModel):
+    day: date
+    feature: str = Field(..., description="chat | consult | digest")
+    requests: int
+    prompt_tokens: int
+    output_tokens: int
+
+    model_config = {"from_attributes": True}
+
+class LLMUsageReport(BaseModel):
+    start: date
+    end: date
+    days: List[LLMUsageDay]
+    today_tokens: int
+    daily_budget: Optional[int] = Field(None, description="Tokens per UTC day; null when unlimited")
+    budget_level: str = Field(..., description="ok | degraded (smaller contexts) | no_consult | exhausted")
+
 # --- AI Consultation Schemas ---
 class AIConsultationResponse(BaseModel):
     entry_id: int
     consultation: str
+    backend: str = Field("gemini", description="Model that wrote the consultation: gemini | local (fallback)")
+
+MAX_CONSULT_BATCH_SIZE = 50
+
+class AIConsultationBatchRequest(BaseModel):
+    """Entries to consult: the given `ids`, every entry created in [`start`, `end`), or both filters combined."""
+    ids: Optional[List[int]] = Field(None, min_length=1, max_length=MAX_CONSULT_BATCH_SIZE)
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+class AIConsultationBatchItem(BaseModel):
+    """One NDJSON line of a batch consultation, sent as soon as that entry's consultation completes."""
+    type: str = "result"
+    entry_id: int
+    status: str = Field(..., description="ok | not_found | error | timeout")
+    consultation: Optional[str] = None
+    backend: Optional[str] = Field(None, description="gemini | local (fallback); set when status is ok")
+    detail: Optional[str] = None
 
 # --- Chat Schemas ---
 # Defined here for consistency, can be in schemas/chat.py and imported via __init__.py
@@ -54,5 +175,27 @@ class ChatRequest(BaseModel):
 
 class ChatResponse(BaseModel):
     reply: str = Field(..., description="AI's reply to the user's message")
+    backend: str = Field("gemini", description="Model that wrote the reply: gemini | local (fallback)")
+
+class ChatHistoryMessage(BaseModel):
+    seq: int
+    role: str = Field(..., description="`user` or `model`")
+    content: str
+    created_at: Optional[datetime] = None
+
+    model_config = {"from_attributes": True}
+
+class ChatHistoryPage(BaseModel):
+    session_id: Optional[str] = None
+    messages: List[ChatHistoryMessage] = Field(..., description="Oldest first")
+    next_cursor: Optional[int] = Field(None, description="Pass as `before` to get the previous page; null on the first message")
+
+class ChatSessionSummary(BaseModel):
+    session_id: str
+    started_at: Optional[datetime] = None
+    last_message_at: Optional[datetime] = None
+    message_count: int
+
+    model_config = {"from_attributes": True}
 
 # --- END OF FILE backend/app/schemas/schemas.py ---
\ No newline at end of file
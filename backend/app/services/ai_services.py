@@ -1,11 +1,15 @@
 # --- START OF FILE backend/app/services/ai_services.py ---
 import time
 import asyncio
+import threading
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from google.generativeai.types import HarmCategory, HarmBlockThreshold, ContentDict, PartDict
-from typing import List, Optional, Dict, Union
+from typing import Any, AsyncIterator, Awaitable, Callable, List, NamedTuple, Optional, Dict, Sequence, Tuple, Union
 from ..core.config import settings
 from ..db import models # Keep this if needed by format_entries_for_context
+from .usage_service import usage_meter, CHAT, CONSULT, DIGEST
+from .local_llm_service import local_llm, LocalLLMError, Messages
 import logging
 from datetime import datetime
 # Removed Session import as it's not directly used here
@@ -25,11 +29,34 @@ class AIResponseError(AIServiceError):
     """Raised when there are issues with AI response"""
     pass
 
+class AIUnavailableError(AIResponseError):
+    """Raised when the hosted model is over quota or unreachable (worth failing over, unlike a blocked prompt)"""
+    pass
+
+# Provider errors that mean "Gemini cannot answer right now": 429 / quota, 5xx, timeouts, connection failures
+UNAVAILABLE_ERRORS = (
+    google_exceptions.TooManyRequests, google_exceptions.ServerError, google_exceptions.RetryError,
+    ConnectionError, asyncio.TimeoutError,
+)
+
+GEMINI, LOCAL = "gemini", "local" # Backends a reply can come from
+
+class AIReply(NamedTuple):
+    text: str
+    backend: str # GEMINI or LOCAL
+
 # --- AIService Class (Mostly Unchanged) ---
 class AIService:
     def __init__(self):
+        self.last_used: float = 0.0 # time.monotonic() of the last model call, for idle re-warming
         self._init_ai_service()
 
+    def mark_used(self) -> None:
+        self.last_used = time.monotonic()
+
+    def is_idle(self, seconds: float) -> bool:
+        return time.monotonic() - self.last_used > seconds
+
     def _init_ai_service(self):
         """Initialize the AI service with proper error handling"""
         api_key = settings.GEMINI
@@ -56,6 +83,19 @@ class AIService:
             logger.error(f"Failed to initialize AI service: {str(e)}", exc_info=True)
             raise AIConfigError(f"Failed to initialize AI service: {str(e)}")
 
+    async def warm_up(self) -> None:
+        """
+        Open the model's async channel (and TLS connection) ahead of the first real request.
+        Uses count_tokens, which is not billed as generation.
+        """
+        try:
+            start_time = time.time()
+            await self.model.count_tokens_async("warm-up")
+            self.mark_used()
+            logger.info(f"AI service warmed up in {time.time() - start_time:.2f} seconds")
+        except Exception as e:
+            logger.warning(f"AI service warm-up failed (first request will pay the setup cost): {e}")
+
     def format_entries_for_context(self, entries: List[models.JournalEntry]) -> tuple[str, bool]:
         """
         Format journal entries into a string for AI context.
@@ -79,15 +119,46 @@ class AIService:
 
         return context_str, True
 
+    def format_digests_for_context(self, digests: Sequence[models.JournalDigest]) -> str:
+        """Format week/month digests (oldest first) into a context section; empty if there are none."""
+        if not digests:
+            return ""
+        context_str = "Earlier Journal Summaries:\n"
+        context_str += "=============================\n"
+        for digest in digests:
+            label = "Month" if digest.period == "month" else "Week"
+            period = digest.period_start.strftime('%Y-%m') if digest.period == "month" else f"of {digest.period_start.isoformat()}"
+            context_str += f"\n--- {label} {period} ({digest.entry_count} entries) ---\n{digest.summary}\n"
+        return context_str + "-----------------------------\n"
+
+    def analysis_prompt(self, main_content: str, context_entries: List[models.JournalEntry],
+                        prompt_instruction: str) -> str:
+        """The single-analysis prompt: context entries, instruction, then the content to analyze."""
+        context_str, has_entries = self.format_entries_for_context(context_entries)
+        return f"""{context_str}
+=============================
+
+{prompt_instruction}
+
+--- Main Content Start ---
+{main_content}
+--- Main Content End ---
+
+Please provide your analysis based *only* on the main content and the context provided:
+"""
+
     # --- generate_ai_response for single analysis (Unchanged) ---
     async def generate_ai_response(
         self,
         main_content: str,
         context_entries: List[models.JournalEntry],
-        prompt_instruction: str = "Analyze the following content based on the provided context:"
+        prompt_instruction: str = "Analyze the following content based on the provided context:",
+        user_id: Optional[int] = None,
+        feature: str = CONSULT,
     ) -> str:
         """
         Generate an AI response for a single journal entry analysis (existing functionality).
+        The tokens used are metered for `user_id` under `feature`.
         """
         try:
             start_time = time.time()
@@ -95,18 +166,8 @@ class AIService:
                 f"Generating single AI analysis response for content length: {len(main_content)}, "
                 f"with {len(context_entries)} context entries"
             )
-            context_str, has_entries = self.format_entries_for_context(context_entries)
-            full_prompt = f"""{context_str}
-=============================
-
-{prompt_instruction}
-
---- Main Content Start ---
-{main_content}
---- Main Content End ---
-
-Please provide your analysis based *only* on the main content and the context provided:
-"""
+            full_prompt = self.analysis_prompt(main_content, context_entries, prompt_instruction)
+            self.mark_used()
             response = await self.model.generate_content_async(
                 full_prompt,
                 generation_config=genai.types.GenerationConfig(
@@ -115,6 +176,7 @@ Please provide your analysis based *only* on the main content and the context pr
                     temperature=0.7
                 )
             )
+            usage_meter.record(user_id, feature, response.usage_metadata) # Billed even if blocked below
 
             # Check for blocked response *before* accessing text
             if response.prompt_feedback and response.prompt_feedback.block_reason:
@@ -145,22 +207,160 @@ Please provide your analysis based *only* on the main content and the context pr
             if isinstance(e, AIResponseError): # Re-raise specific AI errors
                  raise
             elif "quota" in str(e).lower():
-                raise AIResponseError("AI service quota exceeded. Please try again later.")
+                raise AIUnavailableError("AI service quota exceeded. Please try again later.")
             elif "API key" in str(e):
                 raise AIResponseError("AI service configuration error. Please contact support.")
+            elif isinstance(e, UNAVAILABLE_ERRORS):
+                raise AIUnavailableError(f"AI service unavailable: {str(e)}")
             else:
                 raise AIResponseError(f"Failed to generate AI analysis: {str(e)}")
 
+    def summarize(self, text: str, instruction: str, max_output_tokens: int = 400, timeout: float = 60.0,
+                  user_id: Optional[int] = None) -> str:
+        """
+        Blocking one-shot generation for background jobs (journal digests), which run on
+        worker threads rather than on the event loop. `timeout` bounds the request in seconds;
+        the tokens are metered for `user_id`.
+        """
+        self.mark_used()
+        response = self.model.generate_content(
+            f"{instruction}\n\n{text}",
+            generation_config=genai.types.GenerationConfig(
+                candidate_count=1,
+                max_output_tokens=max_output_tokens,
+                temperature=0.3
+            ),
+            request_options={"timeout": timeout, "retry": None}, # Callers retry on their own schedule
+        )
+        usage_meter.record(user_id, DIGEST, response.usage_metadata)
+        if response.prompt_feedback and response.prompt_feedback.block_reason:
+            raise AIResponseError(f"Request blocked by safety settings: {response.prompt_feedback.block_reason.name}")
+        if not response.candidates or not response.candidates[0].content.parts:
+            raise AIResponseError("AI model returned an empty summary.")
+        return response.text.strip()
+
+
+# --- Shared AIService handle ---
+# genai.configure is process-global and the GenerativeModel keeps its own client channels,
+# so one instance is shared by consultations and every user's ChatService.
+_shared_ai_service: Optional[AIService] = None
+_shared_ai_service_lock = threading.Lock()
+
+def get_ai_service() -> AIService:
+    """Return the process-wide AIService, creating it on first use (thread-safe)."""
+    global _shared_ai_service
+    if _shared_ai_service is None:
+        with _shared_ai_service_lock:
+            if _shared_ai_service is None:
+                _shared_ai_service = AIService() # Raises AIConfigError; retried on the next call
+    return _shared_ai_service
+
+
+# --- Backend routing (Gemini, local fallback) ---
+class BackendRouter:
+    """
+    Picks the model for each reply: Gemini, or with LOCAL_LLM_ENABLED the local CPU model
+    (services/local_llm_service.py) once Gemini fails with AIUnavailableError. After such a
+    failure Gemini is skipped for LOCAL_LLM_FAILOVER_SECONDS, so requests during an outage do
+    not each wait for a failing call first. Replies per backend are counted for
+    GET /api/debug/llm-backends (per worker process).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosted_down_until = 0.0 # time.monotonic() until which Gemini is skipped
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.since = time.time()
+            self.replies = {GEMINI: 0, LOCAL: 0}
+            self.failovers = 0
+            self.local_failures = 0
+            self.last_error: Optional[str] = None
+
+    def use_hosted(self) -> bool:
+        return not settings.LOCAL_LLM_ENABLED or time.monotonic() >= self._hosted_down_until
+
+    def hosted_failed(self, error: Exception) -> None:
+        with self._lock:
+            self._hosted_down_until = time.monotonic() + settings.LOCAL_LLM_FAILOVER_SECONDS
+            self.failovers += 1
+            self.last_error = str(error)
+        logger.warning(f"Gemini unavailable, using the local model for the next "
+                       f"{settings.LOCAL_LLM_FAILOVER_SECONDS:.0f}s: {error}")
+
+    def served(self, backend: str) -> None:
+        with self._lock:
+            self.replies[backend] += 1
+
+    async def generate_local(self, messages: Messages, hosted_error: Optional[Exception] = None) -> str:
+        """Reply with the local model. If it fails too, raises the hosted error (or an AIUnavailableError)."""
+        try:
+            return await local_llm.generate(messages)
+        except LocalLLMError as e:
+            with self._lock:
+                self.local_failures += 1
+            logger.error(f"Local fallback model failed: {e}")
+            raise (hosted_error or AIUnavailableError(f"AI service unavailable: {e}")) from e
+
+    async def run(self, hosted: Callable[[], Awaitable[str]], local_messages: Callable[[], Messages]) -> AIReply:
+        """Await `hosted()`, or generate from `local_messages()` locally when Gemini is unavailable."""
+        hosted_error = None
+        if self.use_hosted():
+            try:
+                reply = AIReply(await hosted(), GEMINI)
+                self.served(GEMINI)
+                return reply
+            except AIUnavailableError as e:
+                if not settings.LOCAL_LLM_ENABLED:
+                    raise
+                self.hosted_failed(e)
+                hosted_error = e
+        reply = AIReply(await self.generate_local(local_messages(), hosted_error), LOCAL)
+        self.served(LOCAL)
+        return reply
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {
+                "since": self.since,
+                "replies": dict(self.replies),
+                "failovers": self.failovers,
+                "local_failures": self.local_failures,
+                "last_error": self.last_error,
+                "hosted_skipped_for": max(0.0, self._hosted_down_until - time.monotonic()) if settings.LOCAL_LLM_ENABLED else 0.0,
+            }
+        snapshot["local"] = local_llm.snapshot() if settings.LOCAL_LLM_ENABLED else None
+        return snapshot
+
+
+# Process-wide router, exported at GET /api/debug/llm-backends
+backend_router = BackendRouter()
+
 
 # --- ChatService Class ---
 class ChatService:
     """Service for handling continuous chat conversations with AI"""
-    def __init__(self):
-        # Get the already initialized AI service (model, config)
-        self.ai_service = AIService() # Instantiate AIService to get configured model
+    def __init__(self, ai_service: Optional[AIService] = None):
+        # Reuse the shared, already configured model: building a ChatService is just a few attributes
+        self.ai_service = ai_service or get_ai_service()
         self.chat_history: List[ContentDict] = []
         self.is_initialized = False
+        # Fingerprint (ids + updated_at) of the journal entries the session was built from,
+        # and those entries serialized, so an unchanged context can be reused without reloading it
+        self.context_fingerprint: Optional[str] = None
+        self.context_entries: List = []
+        self.user_id: Optional[int] = None # Whose tokens this session spends (usage metering)
+        self.last_backend = GEMINI # Which model produced the latest reply (GEMINI or LOCAL)
+        # Persisted conversation this session continues (see services/chat_history_service.py):
+        # the next seq to assign, and a callback(session_id, seq, message, reply) run after each completed turn
+        self.session_id: Optional[str] = None
+        self.next_seq = 0
+        self.on_turn: Optional[Callable[[str, int, str, str], None]] = None
         self._chat_session: Optional[genai.ChatSession] = None # Store the actual chat session
+        # One turn at a time: concurrent sends (two tabs, HTTP and WebSocket) would interleave the history
+        self._turn_lock = asyncio.Lock()
         self.system_instruction = """Bạn là một trợ lý AI tâm lý, thấu hiểu và đồng cảm.
 Nhiệm vụ của bạn là trò chuyện với người dùng về những bài viết nhật ký gần đây của họ.
 Sử dụng ngữ cảnh được cung cấp từ nhật ký để hiểu rõ hơn về tâm trạng và suy nghĩ của người dùng.
@@ -168,9 +368,14 @@ Hãy trả lời một cách nhẹ nhàng thoải mái, sử dụng những bi
 Nếu người dùng hỏi về những điều không liên quan đến nhật ký hoặc cảm xúc, hãy trả lời một cách tự nhiên nhưng cố gắng hướng cuộc trò chuyện quay lại chủ đề chính nếu phù hợp.
 Luôn giữ thái độ tích cực và hỗ trợ."""
 
-    def _format_history_for_api(self, entries: List[models.JournalEntry]) -> List[ContentDict]:
-        """Formats entries and initial prompt into the history structure for genai.ChatSession."""
+    def _format_history_for_api(self, entries: List[models.JournalEntry],
+                                digests: Sequence[models.JournalDigest] = ()) -> List[ContentDict]:
+        """Formats digests, entries and initial prompt into the history structure for genai.ChatSession."""
         context_str, has_entries = self.ai_service.format_entries_for_context(entries)
+        if digests:
+            digest_str = self.ai_service.format_digests_for_context(digests)
+            context_str = digest_str + ("\n" + context_str if has_entries else "")
+            has_entries = True
         # Print context to terminal
         print("\n=== Chat Context ===")
         print(context_str)
@@ -199,15 +404,23 @@ Bây giờ, hãy bắt đầu trò chuyện. Tôi sẽ là người bắt đầu
         ]
         return history
 
-    async def start_chat(self, context_entries: List[models.JournalEntry]):
-        """Initialize the genai.ChatSession with context."""
+    async def start_chat(self, context_entries: List[models.JournalEntry],
+                         prior_messages: Optional[Sequence[Tuple[str, str]]] = None,
+                         digests: Sequence[models.JournalDigest] = ()):
+        """
+        Initialize the genai.ChatSession with context (older history as `digests`, see
+        services/digest_service.py), followed by `prior_messages` ((role, text) pairs,
+        the tail of a resumed conversation) if any.
+        """
         if self.is_initialized:
             logger.warning("ChatService.start_chat called but already initialized.")
             return
 
-        logger.info(f"Initializing ChatService session with {len(context_entries)} context entries.")
+        logger.info(f"Initializing ChatService session with {len(context_entries)} context entries,"
+                    f" {len(digests)} digests and {len(prior_messages or [])} resumed messages.")
         try:
-            initial_history = self._format_history_for_api(context_entries)
+            initial_history = self._format_history_for_api(context_entries, digests)
+            initial_history += [{'role': role, 'parts': [PartDict(text=text)]} for role, text in prior_messages or []]
             self.chat_history = initial_history.copy() # Store local copy
 
             # Start the actual chat session with the correctly formatted history
@@ -229,17 +442,58 @@ Bây giờ, hãy bắt đầu trò chuyện. Tôi sẽ là người bắt đầu
             else:
                  raise AIResponseError(f"Failed to initialize chat session: {str(e)}")
 
-    async def send_message(self, message: str) -> str:
-        """Send a message to the ongoing chat session and get the AI response."""
-        if not self.is_initialized or not self._chat_session:
-            logger.error("ChatService.send_message called but session not initialized.")
-            # ContextService should ideally reset the service state if this happens unexpectedly
-            raise AIResponseError("Chat session is not active. Please try again.")
+    def _rebuild_session(self) -> None:
+        """
+        Restart the model session from the local history, which only holds completed turns:
+        forgets an unfinished turn, and picks up turns the local model answered.
+        """
+        if self._chat_session is not None:
+            self._chat_session = self.ai_service.model.start_chat(history=self.chat_history)
+
+    def _local_messages(self, message: str) -> Messages:
+        """The conversation so far plus `message`, as chat-template messages for the local model."""
+        messages = [
+            {"role": "assistant" if content["role"] == "model" else "user",
+             "content": "".join(part["text"] for part in content["parts"])}
+            for content in self.chat_history
+        ]
+        return messages + [{"role": "user", "content": message}]
+
+    def _complete_turn(self, message: str, reply: str, backend: str) -> None:
+        self.chat_history.append({'role': 'user', 'parts': [PartDict(text=message)]})
+        self.chat_history.append({'role': 'model', 'parts': [PartDict(text=reply)]})
+        if backend == LOCAL:
+            self._rebuild_session() # The Gemini session never saw this turn
+        self.last_backend = backend
+        self._record_turn(message, reply)
 
+    async def send_message(self, message: str) -> str:
+        """
+        Send a message to the ongoing chat session and get the AI response (from the local
+        model when Gemini is unavailable; see last_backend). Waits for a turn already in flight;
+        if cancelled (client gone, deadline), the turn is forgotten.
+        """
+        async with self._turn_lock:
+            if not self.is_initialized or not self._chat_session:
+                logger.error("ChatService.send_message called but session not initialized.")
+                # ContextService should ideally reset the service state if this happens unexpectedly
+                raise AIResponseError("Chat session is not active. Please try again.")
+            try:
+                reply = await backend_router.run(lambda: self._send_message(message),
+                                                 lambda: self._local_messages(message))
+            except asyncio.CancelledError:
+                self._rebuild_session()
+                raise
+            self._complete_turn(message, reply.text, reply.backend)
+            return reply.text
+
+    async def _send_message(self, message: str) -> str:
+        """One Gemini turn; the caller records it in the local history."""
         logger.debug(f"Sending message to chat session: '{message[:50]}...'")
         try:
             start_time = time.time()
             # Use the existing ChatSession object to send the message
+            self.ai_service.mark_used()
             response = await self._chat_session.send_message_async(
                 message,
                  generation_config=genai.types.GenerationConfig(
@@ -248,6 +502,7 @@ Bây giờ, hãy bắt đầu trò chuyện. Tôi sẽ là người bắt đầu
                     temperature=1.5 # Adjust temperature for conversational tone
                 )
             )
+            usage_meter.record(self.user_id, CHAT, response.usage_metadata)
 
             # IMPORTANT: Check for blocked responses *before* accessing response.text
             # Check prompt feedback first
@@ -271,11 +526,6 @@ Bây giờ, hãy bắt đầu trò chuyện. Tôi sẽ là người bắt đầu
             # If checks pass, get the text
             response_text = response.text # .text should combine parts
 
-            # Update local history *after* successful response
-            # Note: _chat_session.history updates internally. This is a backup/local view.
-            self.chat_history.append({'role': 'user', 'parts': [PartDict(text=message)]})
-            self.chat_history.append({'role': 'model', 'parts': [PartDict(text=response_text)]})
-
             elapsed_time = time.time() - start_time
             logger.info(f"Successfully received chat response in {elapsed_time:.2f} seconds")
             return response_text
@@ -286,33 +536,134 @@ Bây giờ, hãy bắt đầu trò chuyện. Tôi sẽ là người bắt đầu
             if isinstance(e, AIResponseError):
                  raise
             elif "quota" in str(e).lower():
-                raise AIResponseError("AI service quota exceeded. Please try again later.")
+                raise AIUnavailableError("AI service quota exceeded. Please try again later.")
             elif "API key" in str(e):
                 raise AIConfigError("AI service configuration error.") # Config error more likely here
+            elif isinstance(e, UNAVAILABLE_ERRORS):
+                raise AIUnavailableError(f"AI service unavailable: {str(e)}")
             else:
                 # General failure during send/receive
                 raise AIResponseError(f"Failed to process chat message: {str(e)}")
 
+    async def stream_message(self, message: str) -> AsyncIterator[str]:
+        """
+        Send a message to the ongoing chat session and yield the AI response text as it is generated.
+        If Gemini is unavailable before anything was yielded, the local model's whole reply is yielded
+        as one chunk instead (see last_backend).
+        The session (and local history) only records the turn once the stream has completed;
+        if the consumer stops early or is cancelled, the turn is forgotten and the session stays usable.
+        """
+        async with self._turn_lock:
+            if not self.is_initialized or not self._chat_session:
+                logger.error("ChatService.stream_message called but session not initialized.")
+                raise AIResponseError("Chat session is not active. Please try again.")
+
+            start_time = time.time()
+            parts: List[str] = []
+            backend = LOCAL
+            completed = False
+            try:
+                hosted_error = None
+                if backend_router.use_hosted():
+                    hosted = self._stream_hosted(message)
+                    try:
+                        async for text in hosted:
+                            parts.append(text)
+                            yield text
+                        backend = GEMINI
+                    except AIUnavailableError as e:
+                        if parts or not settings.LOCAL_LLM_ENABLED:
+                            raise # Part of the reply is already out: too late to switch models
+                        backend_router.hosted_failed(e)
+                        hosted_error = e
+                    finally:
+                        await hosted.aclose()
+                if backend == LOCAL:
+                    text = await backend_router.generate_local(self._local_messages(message), hosted_error)
+                    parts.append(text)
+                    yield text
+                completed = True
+            finally:
+                if not completed:
+                    self._rebuild_session() # Consumer went away or was cancelled: nobody reads the rest
+
+            backend_router.served(backend)
+            self._complete_turn(message, "".join(parts), backend)
+            logger.info(f"Successfully streamed chat response ({backend}) in {time.time() - start_time:.2f} seconds")
+
+    async def _stream_hosted(self, message: str) -> AsyncIterator[str]:
+        """Stream one Gemini turn; tokens are metered even if the stream is cut off."""
+        response = None
+        try:
+            self.ai_service.mark_used()
+            response = await self._chat_session.send_message_async(
+                message,
+                stream=True,
+                generation_config=genai.types.GenerationConfig(max_output_tokens=1000, temperature=1.5),
+            )
+            async for chunk in response:
+                if chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+                    reason = chunk.prompt_feedback.block_reason.name
+                    logger.warning(f"Chat prompt blocked due to: {reason}. Message: '{message[:50]}...'")
+                    raise AIResponseError(f"Your message was blocked by safety settings: {reason}")
+                if not chunk.candidates or not chunk.candidates[0].content.parts:
+                    finish_reason = chunk.candidates[0].finish_reason.name if chunk.candidates else 'UNKNOWN'
+                    if finish_reason == 'SAFETY':
+                        logger.warning("Chat response blocked by safety settings.")
+                        raise AIResponseError("The AI's response was blocked by safety settings.")
+                    continue
+                yield chunk.text
+        except AIResponseError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming chat message: {str(e)}", exc_info=True)
+            if "quota" in str(e).lower():
+                raise AIUnavailableError("AI service quota exceeded. Please try again later.")
+            elif "API key" in str(e):
+                raise AIConfigError("AI service configuration error.")
+            elif isinstance(e, UNAVAILABLE_ERRORS):
+                raise AIUnavailableError(f"AI service unavailable: {str(e)}")
+            raise AIResponseError(f"Failed to process chat message: {str(e)}")
+        finally:
+            if response is not None:
+                # Usage so far (streamed chunks carry running totals): a cut-off turn is billed too
+                usage_meter.record(self.user_id, CHAT, response.usage_metadata)
+
+    def _record_turn(self, message: str, reply: str) -> None:
+        seq = self.next_seq
+        self.next_seq += 2
+        if self.on_turn is not None and self.session_id is not None:
+            try:
+                self.on_turn(self.session_id, seq, message, reply)
+            except Exception as e: # Never fail a reply because it could not be recorded
+                logger.error(f"Failed to record chat turn {self.session_id}#{seq}: {e}", exc_info=True)
+
     def get_current_history(self) -> List[ContentDict]:
          """Returns the current chat history maintained locally."""
          # Consider returning self._chat_session.history if available and reliable
          return self.chat_history
 
 
-# --- Global instance for single analysis (Backward Compatibility) ---
-# It's better practice to inject dependencies, but keeping this for now
+# --- Single analysis entry point (Backward Compatibility) ---
 try:
-    ai_service = AIService()
-    # Export the generate_ai_response function linked to this instance
-    async def generate_ai_response(*args, **kwargs):
-        return await ai_service.generate_ai_response(*args, **kwargs)
+    get_ai_service() # Configure eagerly so a missing key is reported at startup
 except AIConfigError as e:
      logger.critical(f"CRITICAL: Failed to initialize global AIService: {e}. Single analysis will fail.")
-     # Define a dummy function to avoid NameError later, but it will raise
-     async def generate_ai_response(*args, **kwargs):
-          raise AIConfigError("Global AIService failed to initialize.")
+
+async def generate_ai_response(*args, **kwargs):
+    return await get_ai_service().generate_ai_response(*args, **kwargs)
+
+async def generate_reply(main_content: str, context_entries: List[models.JournalEntry],
+                         prompt_instruction: str, user_id: Optional[int] = None, feature: str = CONSULT) -> AIReply:
+    """generate_ai_response, failing over to the local model when Gemini is unavailable. Returns the text and its backend."""
+    ai_service = get_ai_service()
+    return await backend_router.run(
+        lambda: ai_service.generate_ai_response(main_content=main_content, context_entries=context_entries,
+                                                prompt_instruction=prompt_instruction, user_id=user_id, feature=feature),
+        lambda: [{"role": "user", "content": ai_service.analysis_prompt(main_content, context_entries, prompt_instruction)}],
+    )
 
 
-# ChatService is NOT a singleton; it's created per user session by ContextService
+# ChatService is NOT a singleton; it's created per user session by ContextService (cheaply, on the shared AIService)
 
 # --- END OF FILE backend/app/services/ai_services.py ---
\ No newline at end of file
@@ -0,0 +1,299 @@
+# --- START OF FILE backend/app/services/autosave_service.py ---
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import select, update
+
+from ..core.config import settings
+from ..db import database, models
+from . import digest_service, stats_service
+from .mood_service import mood_scorer
+
+logger = logging.getLogger(__name__)
+
+# Clean drafts (everything written) are dropped after this long without an autosave
+IDLE_EVICT_SECONDS = 300
+
+
+class AutosaveError(Exception):
+    """The edits cannot be applied to the entry."""
+
+class AutosaveNotFound(AutosaveError):
+    """The entry does not exist or belongs to another user."""
+
+class AutosaveConflict(AutosaveError):
+    """The client edited an older version than the current one."""
+    def __init__(self, current_version: int):
+        super().__init__(f"Entry is at version {current_version}")
+        self.current_version = current_version
+
+
+def apply_text_edits(text: str, edits: Sequence[Tuple[int, int, str]]) -> str:
+    """
+    Apply (start, delete, insert) splices in order, each against the result of the previous one.
+    Positions count UTF-16 code units, like JavaScript string indices, so the editor can send
+    the offsets it sees; a splice may not cut a surrogate pair.
+    """
+    if not edits:
+        return text
+    if text.isascii() and all(insert.isascii() for _, _, insert in edits):
+        for start, delete, insert in edits: # Code units == code points, splice the str directly
+            if start + delete > len(text):
+                raise AutosaveError(f"Edit {start}+{delete} is outside the text ({len(text)} characters)")
+            text = text[:start] + insert + text[start + delete:]
+        return text
+
+    units = text.encode("utf-16-le")
+    for start, delete, insert in edits:
+        if (start + delete) * 2 > len(units):
+            raise AutosaveError(f"Edit {start}+{delete} is outside the text ({len(units) // 2} code units)")
+        units = units[:start * 2] + insert.encode("utf-16-le", "surrogatepass") + units[(start + delete) * 2:]
+    try:
+        return units.decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise AutosaveError("Edit splits a surrogate pair")
+
+
+@dataclass
+class _Draft:
+    """Latest autosaved state of one entry, and the state last written to the database."""
+    user_id: int
+    created_at: Optional[datetime]
+    title: str
+    content: str
+    version: int
+    saved_title: str
+    saved_content: str
+    saved_version: int
+    last_used: float
+    dirty_since: Optional[float] = None # monotonic time of the first unwritten autosave
+    edits: int = 0 # Autosaves since the last write
+    conflicted: bool = False # Its write lost to a concurrent one; reported to the next autosave based on it
+    write_lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class AutosaveBuffer:
+    """
+    Coalesces editor autosaves in memory.
+    Each autosave is applied to a cached draft and answered right away with the new version; the
+    draft is written with a single UPDATE once it has been dirty for AUTOSAVE_COALESCE_MS or has
+    AUTOSAVE_MAX_PENDING_EDITS unwritten autosaves. The UPDATE only matches the version it was
+    based on, so a concurrent write from another path or process is detected instead of overwritten.
+    Handlers that read or replace entries call flush_user() first.
+    """
+
+    def __init__(self, coalesce_ms: int = settings.AUTOSAVE_COALESCE_MS,
+                 max_pending_edits: int = settings.AUTOSAVE_MAX_PENDING_EDITS):
+        self.coalesce_seconds = max(0, coalesce_ms) / 1000
+        self.max_pending_edits = max(1, max_pending_edits)
+        self._drafts: Dict[int, _Draft] = {}
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.autosaves = 0
+        self.writes = 0
+        self.conflicts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running or self.coalesce_seconds == 0: # Write-through needs no worker
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="autosave-flusher", daemon=True)
+            self._thread.start()
+        logger.info("Autosave flusher started.")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write every pending draft, then stop the worker."""
+        if self.running:
+            self._stopping.set()
+            self._thread.join(timeout)
+            logger.info("Autosave flusher stopped.")
+        self.flush_all()
+
+    def apply(self, journal_id: int, user_id: int, base_version: int, edits: Sequence[Tuple[int, int, str]],
+              title: Optional[str] = None) -> Tuple[int, bool]:
+        """
+        Apply one autosave. Returns (new version, whether it is still waiting to be written).
+        Raises AutosaveNotFound, AutosaveConflict or AutosaveError.
+        """
+        if not self.running:
+            self.start() # Lazily, e.g. when the app runs without its lifespan (tests, scripts)
+        with self._lock:
+            draft, lost = self._cached_draft(journal_id, base_version)
+        if lost:
+            current = self._load(journal_id)
+            raise AutosaveConflict(current.version if current else base_version)
+        if draft is None:
+            # Query outside the lock: the flusher and flush_user callers must not wait on it
+            loaded = self._load(journal_id)
+            if loaded is None:
+                raise AutosaveNotFound(f"Journal entry {journal_id} not found")
+        with self._lock:
+            if draft is None:
+                cached = self._drafts.get(journal_id) # Another autosave may have cached it meanwhile
+                if cached is not None and cached.conflicted:
+                    raise AutosaveConflict(loaded.version)
+                if cached is not None and cached.dirty_since is not None:
+                    draft = cached # Holds unwritten autosaves: newer than what we read
+                else:
+                    draft = self._drafts[journal_id] = loaded
+            if draft.user_id != user_id:
+                raise AutosaveNotFound(f"Journal entry {journal_id} not found")
+            if draft.version != base_version:
+                raise AutosaveConflict(draft.version)
+            content = apply_text_edits(draft.content, edits)
+            if not content.strip():
+                raise AutosaveError("Content cannot be empty")
+            draft.content = content
+            if title is not None:
+                draft.title = title
+            draft.version += 1
+            draft.edits += 1
+            draft.last_used = time.monotonic()
+            if draft.dirty_since is None:
+                draft.dirty_since = draft.last_used
+            self.autosaves += 1
+            version = draft.version
+            due = self.coalesce_seconds == 0 or draft.edits >= self.max_pending_edits
+
+        if due and not self._write(journal_id, draft) and draft.conflicted:
+            with self._lock: # Lost before it was acknowledged: report it right away
+                if self._drafts.get(journal_id) is draft:
+                    del self._drafts[journal_id]
+            current = self._load(journal_id)
+            raise AutosaveConflict(current.version if current else draft.saved_version)
+        return version, draft.dirty_since is not None
+
+    def _cached_draft(self, journal_id: int, base_version: int) -> Tuple[Optional[_Draft], bool]:
+        """
+        Under the lock: the cached draft an autosave based on `base_version` builds on (None: load the
+        entry), and whether the client must reload because that draft lost its write.
+        """
+        draft = self._drafts.get(journal_id)
+        if draft is not None and draft.conflicted:
+            # Versions it handed out may since have been reused by the other writer, so the
+            # client that last autosaved it must reload even if its base_version looks current
+            del self._drafts[journal_id]
+            return None, draft.version == base_version
+        if draft is not None and draft.dirty_since is None and draft.version != base_version:
+            return None, False # Clean copy may be stale: the entry can have been written elsewhere since
+        return draft, False
+
+    def flush_user(self, user_id: int) -> None:
+        """Write the user's pending drafts and forget them, so the database is the only copy again."""
+        with self._lock:
+            drafts = [(journal_id, draft) for journal_id, draft in self._drafts.items() if draft.user_id == user_id]
+        for journal_id, draft in drafts:
+            self._write(journal_id, draft)
+            self._evict(journal_id, draft)
+
+    def flush_all(self) -> None:
+        with self._lock:
+            drafts = list(self._drafts.items())
+        for journal_id, draft in drafts:
+            self._write(journal_id, draft)
+            self._evict(journal_id, draft)
+
+    def _evict(self, journal_id: int, draft: _Draft) -> None:
+        with self._lock:
+            if self._drafts.get(journal_id) is draft and draft.dirty_since is None and not draft.conflicted:
+                del self._drafts[journal_id]
+
+    def _load(self, journal_id: int) -> Optional[_Draft]:
+        entry = models.JournalEntry
+        db = database.use_primary(database.SessionLocal())
+        try:
+            row = db.execute(
+                select(entry.owner_id, entry.created_at, entry.title, entry.content, entry.version)
+                .where(entry.id == journal_id)
+            ).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        return _Draft(
+            user_id=row.owner_id, created_at=row.created_at,
+            title=row.title, content=row.content, version=row.version,
+            saved_title=row.title, saved_content=row.content, saved_version=row.version,
+            last_used=time.monotonic(),
+        )
+
+    def _write(self, journal_id: int, draft: _Draft) -> bool:
+        """Write a draft if it is dirty. Returns False if it could not be written."""
+        with draft.write_lock: # One write per draft at a time: each is based on the previous one's version
+            with self._lock:
+                if draft.dirty_since is None:
+                    return True
+                title, content, version = draft.title, draft.content, draft.version
+                saved_content, saved_version = draft.saved_content, draft.saved_version
+
+            entry = models.JournalEntry
+            db = database.use_primary(database.SessionLocal())
+            try:
+                result = db.execute(
+                    update(entry)
+                    .where(entry.id == journal_id, entry.version == saved_version)
+                    .values(title=title, content=content, version=version)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount != 1:
+                    db.rollback()
+                    with self._lock:
+                        draft.conflicted, draft.dirty_since = True, None
+                        self.conflicts += 1
+                    logger.warning(f"Autosave of entry {journal_id} dropped: it changed after version {saved_version}")
+                    return False
+                word_delta = stats_service.count_words(content) - stats_service.count_words(saved_content)
+                if word_delta:
+                    stats_service.apply_deltas(db, draft.user_id, stats_service.ActivityDeltas().add(
+                        draft.created_at, 0, word_delta
+                    ))
+                digest_service.mark_dirty(db, draft.user_id, [draft.created_at])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to write autosave of entry {journal_id}: {e}", exc_info=True)
+                return False # Still dirty, retried on the next flush
+            finally:
+                db.close()
+
+            with self._lock:
+                draft.saved_title, draft.saved_content, draft.saved_version = title, content, version
+                if draft.version == version:
+                    draft.dirty_since, draft.edits = None, 0
+                else: # Autosaves arrived during the write
+                    draft.dirty_since, draft.edits = time.monotonic(), draft.version - version
+                self.writes += 1
+        if content != saved_content:
+            mood_scorer.submit([journal_id])
+        return True
+
+    def _run(self) -> None:
+        tick = min(max(self.coalesce_seconds / 4, 0.05), 1.0)
+        while not self._stopping.wait(tick):
+            now = time.monotonic()
+            with self._lock:
+                due = [(journal_id, draft) for journal_id, draft in self._drafts.items()
+                       if draft.dirty_since is not None and now - draft.dirty_since >= self.coalesce_seconds]
+                idle = [(journal_id, draft) for journal_id, draft in self._drafts.items()
+                        if draft.dirty_since is None and now - draft.last_used >= IDLE_EVICT_SECONDS]
+            for journal_id, draft in due:
+                self._write(journal_id, draft)
+            with self._lock:
+                for journal_id, draft in idle:
+                    if self._drafts.get(journal_id) is draft:
+                        del self._drafts[journal_id]
+
+
+# Process-wide buffer, started from the app lifespan (or lazily on the first autosave)
+autosave_buffer = AutosaveBuffer()
+# --- END OF FILE backend/app/services/autosave_service.py ---
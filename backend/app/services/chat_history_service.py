@@ -0,0 +1,212 @@
+# --- START OF FILE backend/app/services/chat_history_service.py ---
+import logging
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import database, models
+
+logger = logging.getLogger(__name__)
+
+_FLUSH_NOW = {} # Queue marker: a reader is waiting, write the batch gathered so far without waiting for the window
+
+
+class ChatTranscriptWriter:
+    """
+    Persists chat messages off the request path.
+    ChatService reports each completed turn; a daemon thread gathers messages into batches
+    (up to CHAT_HISTORY_BATCH_SIZE, waiting at most CHAT_HISTORY_FLUSH_MS) and writes each
+    batch with one executemany INSERT. Readers call flush() first to see their own turns;
+    it blocks, so async code runs it in the threadpool.
+    """
+
+    def __init__(self, batch_size: int = settings.CHAT_HISTORY_BATCH_SIZE,
+                 flush_ms: int = settings.CHAT_HISTORY_FLUSH_MS):
+        self.batch_size = max(1, batch_size)
+        self.flush_wait = flush_ms / 1000
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        self._pending = 0 # Submitted but not yet written (or dropped)
+        self._idle = threading.Condition()
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="chat-transcript-writer", daemon=True)
+            self._thread.start()
+        logger.info("Chat transcript writer started.")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write what is still queued, then stop the worker."""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._queue.put(None) # Wake the worker up
+        self._thread.join(timeout)
+        logger.info("Chat transcript writer stopped.")
+
+    def record_turn(self, user_id: int, session_id: str, seq: int, message: str, reply: str) -> None:
+        """Queue one completed turn: the user message at `seq` and the model reply at `seq + 1`."""
+        self.submit([
+            {"user_id": user_id, "session_id": session_id, "seq": seq, "role": "user", "content": message},
+            {"user_id": user_id, "session_id": session_id, "seq": seq + 1, "role": "model", "content": reply},
+        ])
+
+    def submit(self, rows: List[Dict]) -> None:
+        if not self.running:
+            self.start() # Lazily, e.g. when the app runs without its lifespan (tests, scripts)
+        with self._idle:
+            self._pending += len(rows)
+        for row in rows:
+            self._queue.put(row)
+
+    def flush(self, timeout: float = 2.0) -> bool:
+        """Wait until everything submitted so far is written. Returns False on timeout. Blocking."""
+        with self._idle:
+            if self._pending == 0:
+                return True
+        self._queue.put(_FLUSH_NOW)
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def _next_batch(self) -> List[Dict]:
+        first = self._queue.get()
+        if first is None or first is _FLUSH_NOW:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                row = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if row is None:
+                self._queue.put(None) # Let the run loop see the stop request after this batch
+                break
+            if row is _FLUSH_NOW:
+                break
+            batch.append(row)
+        return batch
+
+    def _write(self, batch: List[Dict]) -> None:
+        db = database.use_primary(database.SessionLocal())
+        try:
+            db.execute(insert(models.ChatMessage), batch)
+            db.commit()
+            self.written += len(batch)
+        except IntegrityError:
+            # A (user, session, seq) already exists, e.g. two processes serving the same conversation:
+            # keep every row that still fits instead of dropping the whole batch
+            db.rollback()
+            for row in batch:
+                try:
+                    db.execute(insert(models.ChatMessage), [row])
+                    db.commit()
+                    self.written += 1
+                except IntegrityError:
+                    db.rollback()
+                    self.failed += 1
+                    logger.warning(f"Dropped duplicate chat message {row['session_id']}#{row['seq']} of user {row['user_id']}")
+        except Exception as e:
+            db.rollback()
+            self.failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} chat messages: {e}", exc_info=True)
+        finally:
+            db.close()
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+                with self._idle:
+                    self._pending -= len(batch)
+                    self._idle.notify_all()
+            elif self._stopping.is_set() and self._queue.empty():
+                break
+
+
+def get_latest_session_id(db: Session, user_id: int) -> Optional[str]:
+    return db.scalar(
+        select(models.ChatMessage.session_id)
+        .where(models.ChatMessage.user_id == user_id)
+        .order_by(models.ChatMessage.id.desc())
+        .limit(1)
+    )
+
+def get_tail(db: Session, user_id: int, session_id: str, limit: int) -> Tuple[List[Tuple[str, str]], int]:
+    """
+    Last `limit` messages of a session as (role, content), oldest first, starting on a user turn,
+    and the next free seq. Only this tail is loaded to resume a conversation.
+    """
+    message = models.ChatMessage
+    rows = db.execute(
+        select(message.seq, message.role, message.content)
+        .where(message.user_id == user_id, message.session_id == session_id)
+        .order_by(message.seq.desc())
+        .limit(limit)
+    ).all()
+    next_seq = rows[0].seq + 1 if rows else 0
+    rows.reverse()
+    while rows and rows[0].role != "user": # The model expects user/model pairs
+        rows.pop(0)
+    return [(row.role, row.content) for row in rows], next_seq
+
+def get_history_page(db: Session, user_id: int, session_id: str, before_seq: Optional[int] = None,
+                     limit: int = 50) -> Tuple[List, Optional[int]]:
+    """
+    One page of a session's messages, oldest first, ending just before `before_seq` (keyset pagination
+    on the (user_id, session_id, seq) index). Returns (rows, cursor for the previous page or None).
+    """
+    message = models.ChatMessage
+    query = (
+        select(message.seq, message.role, message.content, message.created_at)
+        .where(message.user_id == user_id, message.session_id == session_id)
+    )
+    if before_seq is not None:
+        query = query.where(message.seq < before_seq)
+    rows = db.execute(query.order_by(message.seq.desc()).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, (rows[0].seq if has_more and rows else None)
+
+def get_sessions(db: Session, user_id: int, limit: int = 20) -> List:
+    """The user's most recent conversations with their message counts."""
+    message = models.ChatMessage
+    return db.execute(
+        select(
+            message.session_id,
+            func.min(message.created_at).label("started_at"),
+            func.max(message.created_at).label("last_message_at"),
+            func.count().label("message_count"),
+        )
+        .where(message.user_id == user_id)
+        .group_by(message.session_id)
+        .order_by(func.max(message.id).desc())
+        .limit(limit)
+    ).all()
+
+
+# Process-wide writer, started from the app lifespan (or lazily on the first turn)
+transcript_writer = ChatTranscriptWriter()
+# --- END OF FILE backend/app/services/chat_history_service.py ---
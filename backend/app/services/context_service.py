@@ -1,38 +1,141 @@
 # --- START OF FILE backend/app/services/context_service.py ---
 
-from typing import List, Optional, Dict
+import asyncio
+import functools
+import hashlib
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Dict, Set, Tuple
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from ..db import models
+from ..db.database import SessionLocal, use_primary
 from ..crud import crud
+from ..schemas import schemas
+from ..core.cancellation import DeadlineExceeded, run_cancellable
+from ..core.config import settings
 # Import ChatService specifically from ai_services
-from .ai_services import ChatService, generate_ai_response, AIServiceError, AIConfigError, AIResponseError
+from .ai_services import ChatService, generate_reply, AIReply, AIServiceError, AIConfigError, AIResponseError
+from . import chat_history_service, digest_service
+from .usage_service import usage_meter, CHAT, CONSULT, DEGRADED
+from .chat_history_service import transcript_writer
 import logging
 
 logger = logging.getLogger(__name__)
 
 class ContextService:
+    _warmup_tasks: Set[asyncio.Task] = set() # Keep references so background warm-ups are not garbage collected
+
     def __init__(self, db: Session):
         self.db = db
         # Store chat services per user ID. Class variable for simplicity (consider better state management in production).
         if not hasattr(ContextService, '_chat_services'):
             ContextService._chat_services: Dict[int, ChatService] = {}
         self.context_limit = 10
+        # With digests, older history is summarized: the chat only needs the latest few full entries
+        self.chat_context_limit = settings.DIGEST_RECENT_ENTRIES if settings.DIGESTS_ENABLED else self.context_limit
+        self.use_digests = settings.DIGESTS_ENABLED
 
     def _get_chat_service(self, user_id: int) -> ChatService:
         """Get or create a chat service instance for a user. Does NOT initialize the session."""
         if user_id not in ContextService._chat_services:
             logger.info(f"Creating NEW ChatService instance for user {user_id}")
-            ContextService._chat_services[user_id] = ChatService()
+            chat_service = ChatService()
+            chat_service.user_id = user_id # Meter its tokens
+            chat_service.on_turn = functools.partial(transcript_writer.record_turn, user_id) # Persist every turn
+            ContextService._chat_services[user_id] = chat_service
         # else:
             # logger.debug(f"Reusing existing ChatService instance for user {user_id} (check initialization status)")
         return ContextService._chat_services[user_id]
 
+    @staticmethod
+    def get_live_chat_service(user_id: int) -> Optional[ChatService]:
+        """The user's chat service if it is already initialized (no DB access), else None."""
+        chat_service = getattr(ContextService, "_chat_services", {}).get(user_id)
+        return chat_service if chat_service is not None and chat_service.is_initialized else None
+
     def _reset_chat_service(self, user_id: int):
         """Explicitly remove a user's chat service instance."""
         if user_id in ContextService._chat_services:
             logger.warning(f"Resetting (deleting) chat service instance for user {user_id}.")
             del ContextService._chat_services[user_id]
 
+    def _schedule_warm_up(self, chat_service: ChatService):
+        """Re-open the shared model channel in the background if it has been idle, before the first turn."""
+        if settings.AI_WARMUP_IDLE_SECONDS <= 0 or not chat_service.ai_service.is_idle(settings.AI_WARMUP_IDLE_SECONDS):
+            return
+        chat_service.ai_service.mark_used() # Avoid stacking warm-ups from concurrent page loads
+        task = asyncio.create_task(chat_service.ai_service.warm_up())
+        ContextService._warmup_tasks.add(task)
+        task.add_done_callback(ContextService._warmup_tasks.discard)
+
+    @staticmethod
+    def _context_fingerprint(versions, digests=()) -> str:
+        """Fingerprint of the context: ordered (id, version) pairs of the entries used, and the digests' versions."""
+        raw = ";".join(f"{entry_id}@{version}" for entry_id, version in versions)
+        if digests:
+            raw += "|" + ";".join(f"{d.period}:{d.period_start}@{d.updated_at}" for d in digests)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _apply_budget(self, user_id: int, feature: Optional[str] = None) -> int:
+        """
+        Check the user's daily token budget (see services/usage_service.py): raises BudgetExceeded
+        if `feature` is refused; once degraded, the contexts this instance builds shrink.
+        """
+        level = usage_meter.check(user_id, feature, self.db) if feature else usage_meter.level(user_id, self.db)
+        if level >= DEGRADED:
+            self.context_limit = min(self.context_limit, settings.USAGE_DEGRADED_CONTEXT_ENTRIES)
+            self.chat_context_limit = min(self.chat_context_limit, settings.USAGE_DEGRADED_CONTEXT_ENTRIES)
+            self.use_digests = False
+        return level
+
+    def _release_connection(self) -> None:
+        """
+        Hand the session's connection back to the pool before awaiting the model. Tuned SQLite pools
+        have no overflow (one writer, SQLITE_READER_POOL_SIZE readers), so a transaction left open
+        across an await makes the next request block the event loop waiting for its connection.
+        The rows already loaded stay readable (detached); a later query starts a new transaction.
+        """
+        self.db.close()
+
+    def current_session_id(self, user_id: int) -> Optional[str]:
+        """The conversation the user is in: the live session's, else the latest persisted one. Blocking (flushes transcripts)."""
+        live = ContextService.get_live_chat_service(user_id)
+        if live is not None and live.session_id is not None:
+            return live.session_id
+        transcript_writer.flush()
+        return chat_history_service.get_latest_session_id(self.db, user_id)
+
+    async def _start_chat_with_context(self, chat_service: ChatService, context_entries: List[models.JournalEntry],
+                                       user_id: int, new_session: bool = False,
+                                       digests: List[models.JournalDigest] = ()):
+        """
+        Start the chat session and remember which context it was built from.
+        Unless `new_session`, the user's latest conversation is continued: only its last
+        CHAT_RESUME_TAIL_MESSAGES messages are loaded back into the model history.
+        """
+        prior_messages = []
+        session_id = None
+        next_seq = 0
+        self._release_connection()
+        if not new_session:
+            await run_in_threadpool(transcript_writer.flush) # Our own last turns may still be queued
+            # and just written: read them from the primary (not a lagging replica) on a session of their own,
+            # closed before the model call so the primary's connection is not held across it
+            with use_primary(SessionLocal()) as primary:
+                session_id = chat_history_service.get_latest_session_id(primary, user_id)
+                if session_id is not None:
+                    prior_messages, next_seq = chat_history_service.get_tail(
+                        primary, user_id, session_id, settings.CHAT_RESUME_TAIL_MESSAGES
+                    )
+        chat_service.session_id = session_id or uuid.uuid4().hex
+        chat_service.next_seq = next_seq
+        await chat_service.start_chat(context_entries, prior_messages, digests)
+        chat_service.context_fingerprint = self._context_fingerprint(
+            [(entry.id, entry.version) for entry in context_entries], digests
+        )
+        chat_service.context_entries = [schemas.JournalEntry.model_validate(entry) for entry in context_entries]
+
     def _get_context_entries(self, user_id: int, exclude_id: Optional[int] = None) -> List[models.JournalEntry]:
         """Fetches the 5 most recent journal entries for chat context."""
         try:
@@ -40,12 +143,22 @@ class ContextService:
                 db=self.db,
                 user_id=user_id,
                 skip=0,
-                limit=self.context_limit
+                limit=self.chat_context_limit
             )
         except Exception as e:
             logger.error(f"Error fetching context entries for user {user_id}: {str(e)}", exc_info=True)
             return []
 
+    def _get_context_digests(self, user_id: int) -> List[models.JournalDigest]:
+        """Week/month digests of the user's older history for chat context (none unless DIGESTS_ENABLED)."""
+        if not self.use_digests:
+            return []
+        try:
+            return digest_service.get_context_digests(self.db, user_id)
+        except Exception as e:
+            logger.error(f"Error fetching context digests for user {user_id}: {str(e)}", exc_info=True)
+            return []
+
     def _get_consultation_context(self, user_id: int, target_entry_id: int) -> List[models.JournalEntry]:
         """Fetches the 5 journal entries immediately before the target entry for AI consultation."""
         try:
@@ -63,12 +176,26 @@ class ContextService:
             logger.error(f"Error fetching consultation context for user {user_id}: {str(e)}", exc_info=True)
             return []
 
-    async def prepare_new_chat_session(self, user_id: int) -> List[models.JournalEntry]:
+    async def prepare_new_chat_session(self, user_id: int, force_refresh: bool = False) -> List[schemas.JournalEntry]:
         """
-        Resets the user's chat service and initializes a new session with the latest context.
+        Initializes the user's chat session with the latest context.
         Called when the user enters the chat page (via /context endpoint).
+        If the live session was built from the same entries (same ids and versions),
+        it is reused as-is, keeping the conversation; `force_refresh=True` always rebuilds.
         Returns the context entries used or empty list if no entries found.
         """
+        self._apply_budget(user_id) # A degraded budget shrinks the context, so the fingerprint below changes
+        existing = ContextService._chat_services.get(user_id)
+        if not force_refresh and existing is not None and existing.is_initialized:
+            try:
+                versions = crud.get_recent_entry_versions(self.db, user_id=user_id, limit=self.chat_context_limit)
+                digests = self._get_context_digests(user_id)
+                if self._context_fingerprint(versions, digests) == existing.context_fingerprint:
+                    logger.info(f"Context unchanged for user {user_id}; reusing live chat session.")
+                    return existing.context_entries
+            except Exception as e:
+                logger.warning(f"Could not fingerprint chat context for user {user_id}, rebuilding: {e}")
+
         logger.info(f"Preparing NEW chat session for user {user_id}.")
 
         try:
@@ -77,15 +204,18 @@ class ContextService:
 
             # 2. Fetch latest context
             context_entries = self._get_context_entries(user_id)
+            digests = self._get_context_digests(user_id)
 
             # 3. Get a fresh ChatService instance
             chat_service = self._get_chat_service(user_id)
 
-            # 4. Initialize the new session on the fresh instance
+            # 4. Initialize the new session on the fresh instance (continuing the conversation unless forced)
             try:
-                await chat_service.start_chat(context_entries)
+                await self._start_chat_with_context(chat_service, context_entries, user_id, new_session=force_refresh,
+                                                    digests=digests)
+                self._schedule_warm_up(chat_service)
                 logger.info(f"Successfully initialized new chat session for user {user_id} with {len(context_entries)} entries.")
-                return context_entries # Return the entries used for context
+                return chat_service.context_entries # Return the entries used for context
             except (ValueError, AIConfigError, AIResponseError) as e:
                 logger.error(f"Failed to initialize new chat session for user {user_id}: {e}", exc_info=True)
                 # Ensure the failed service instance is cleaned up
@@ -100,11 +230,11 @@ class ContextService:
             logger.error(f"Critical error in prepare_new_chat_session for user {user_id}: {e}", exc_info=True)
             raise Exception(f"Failed to prepare chat session: {str(e)}")
 
-    async def process_chat_message(self, message: str, user_id: int) -> str:
+    async def get_ready_chat_service(self, user_id: int) -> ChatService:
         """
-        Process a chat message using the user's CURRENT chat session.
+        Return the user's CURRENT chat service, initialized.
         Assumes the session was prepared by `prepare_new_chat_session` via the /context endpoint.
-        Includes a fallback initialization check just in case.
+        Includes a fallback initialization check just in case (the only path that touches the DB).
         """
         chat_service = self._get_chat_service(user_id)
 
@@ -115,18 +245,31 @@ class ContextService:
             logger.warning(f"Chat session for user {user_id} was NOT initialized when process_chat_message was called. Attempting fallback initialization.")
             try:
                 # Attempt to initialize here (less ideal as it might use slightly stale context if called directly)
+                self._apply_budget(user_id)
                 context_entries = self._get_context_entries(user_id)
-                await chat_service.start_chat(context_entries)
+                await self._start_chat_with_context(chat_service, context_entries, user_id,
+                                                    digests=self._get_context_digests(user_id))
                 logger.info(f"Fallback chat session initialization successful for user {user_id}.")
             except (ValueError, AIConfigError, AIResponseError) as e:
                 logger.error(f"Fallback chat initialization FAILED for user {user_id}: {e}")
                 self._reset_chat_service(user_id) # Clean up failed instance
                 raise AIResponseError(f"Failed to initialize chat during fallback: {e}") # Let router return 503
+        return chat_service
+
+    async def process_chat_message(self, message: str, user_id: int) -> AIReply:
+        """
+        Process a chat message using the user's CURRENT chat session (see get_ready_chat_service).
+        Returns the reply and the backend that produced it.
+        Raises BudgetExceeded once the user's daily token budget is used up.
+        """
+        self._apply_budget(user_id, CHAT)
+        self._release_connection()
+        chat_service = await self.get_ready_chat_service(user_id)
 
         # --- Send Message to Initialized Session ---
         try:
             response = await chat_service.send_message(message)
-            return response
+            return AIReply(response, chat_service.last_backend)
         except (AIResponseError, AIConfigError) as e: # Catch specific errors from send_message
             logger.error(f"Chat send/receive error for user {user_id}: {type(e).__name__} - {str(e)}")
             # Don't necessarily reset the service here unless the error indicates a fatal session issue
@@ -139,11 +282,27 @@ class ContextService:
              raise Exception("An unexpected error occurred while processing your message.")
 
 
-    async def get_ai_consultation(self, entry_id: int, user_id: int) -> str:
+    @staticmethod
+    def _consultation_prompt(target_entry: models.JournalEntry) -> str:
+        return (
+            f"Bạn là một chuyên gia tham vấn tâm lý đầy thấu cảm và ấm áp. Hãy lắng nghe và tham vấn cho người viết dựa trên đoạn nhật ký này.\n\n"
+            f"Đừng phân tích hay đánh giá. Thay vào đó, hãy:\n"
+            f"1. Thấu hiểu và phản ánh cảm xúc của họ\n"
+            f"2. Đồng cảm với trải nghiệm của họ\n"
+            f"3. Đưa ra những gợi ý nhẹ nhàng nếu phù hợp\n\n"
+            f"4. Hãy viết chat với phong thái nhẹ nhàng như một người bạn, thêm các biểu tượng cảm xúc đáng yêu thoải mái vào\n"
+            f"5. Nói chuyện tự nhiên vào, không chào hỏi, mình đã đọc được blah blah\n"
+            f"Dưới đây là đoạn nhật ký cần tham vấn (ID: {target_entry.id}, Tiêu đề: '{target_entry.title}').\n"
+            f"Bạn có thể tham khảo các entries gần đây để hiểu rõ hơn về bối cảnh của họ:"
+        )
+
+    async def get_ai_consultation(self, entry_id: int, user_id: int) -> AIReply:
         """
-        Get AI consultation for a specific journal entry.
-        Uses the separate `generate_ai_response` function, not the user's chat session.
+        Get AI consultation for a specific journal entry, and the backend that produced it.
+        Uses the separate `generate_reply` function, not the user's chat session.
+        Raises BudgetExceeded when the user's daily token budget no longer allows consults.
         """
+        self._apply_budget(user_id, CONSULT)
         logger.debug(f"Starting single AI consultation for entry {entry_id}, user {user_id}")
         try:
             target_entry = crud.get_journal(self.db, entry_id, user_id)
@@ -152,22 +311,14 @@ class ContextService:
 
             # Get the 5 entries before the target entry
             context_entries = self._get_consultation_context(user_id, entry_id)
+            self._release_connection()
 
-            # Use the global 'generate_ai_response' for single analysis
-            response = await generate_ai_response(
+            # Use the global 'generate_reply' for single analysis
+            response = await generate_reply(
                 main_content=target_entry.content,
                 context_entries=context_entries,
-                prompt_instruction=(
-                    f"Bạn là một chuyên gia tham vấn tâm lý đầy thấu cảm và ấm áp. Hãy lắng nghe và tham vấn cho người viết dựa trên đoạn nhật ký này.\n\n"
-                    f"Đừng phân tích hay đánh giá. Thay vào đó, hãy:\n"
-                    f"1. Thấu hiểu và phản ánh cảm xúc của họ\n"
-                    f"2. Đồng cảm với trải nghiệm của họ\n"
-                    f"3. Đưa ra những gợi ý nhẹ nhàng nếu phù hợp\n\n"
-                    f"4. Hãy viết chat với phong thái nhẹ nhàng như một người bạn, thêm các biểu tượng cảm xúc đáng yêu thoải mái vào\n"
-                    f"5. Nói chuyện tự nhiên vào, không chào hỏi, mình đã đọc được blah blah\n"
-                    f"Dưới đây là đoạn nhật ký cần tham vấn (ID: {target_entry.id}, Tiêu đề: '{target_entry.title}').\n"
-                    f"Bạn có thể tham khảo các entries gần đây để hiểu rõ hơn về bối cảnh của họ:"
-                )
+                prompt_instruction=self._consultation_prompt(target_entry),
+                user_id=user_id,
             )
             logger.debug(f"Finished single AI consultation for entry {entry_id}, user {user_id}")
             return response
@@ -182,6 +333,63 @@ class ContextService:
             logger.error(f"Unexpected error getting AI consultation for entry {entry_id}, user {user_id}: {str(e)}", exc_info=True)
             raise Exception("An unexpected error occurred while getting the AI consultation.")
 
+    def load_consultation_batch(self, user_id: int, ids: Optional[List[int]] = None,
+                                start: Optional[datetime] = None, end: Optional[datetime] = None,
+                                limit: int = schemas.MAX_CONSULT_BATCH_SIZE,
+                                ) -> Tuple[List[models.JournalEntry], Dict[int, List[models.JournalEntry]]]:
+        """
+        Load the targets of a batch consultation and each one's context (the entries before it)
+        in three queries, however many targets there are. Everything the model calls need is
+        loaded here, so stream_consultations does not touch the database.
+        Raises BudgetExceeded when the user's daily token budget no longer allows consults.
+        """
+        self._apply_budget(user_id, CONSULT)
+        targets = crud.get_consultation_targets(self.db, user_id, ids=ids, start=start, end=end, limit=limit)
+        contexts = crud.get_recent_entries_before_many(self.db, user_id, targets, limit=self.context_limit)
+        self._release_connection() # The response streams for as long as the model calls take
+        return targets, contexts
+
+    async def stream_consultations(self, targets: List[models.JournalEntry],
+                                   contexts: Dict[int, List[models.JournalEntry]]) -> AsyncIterator[Dict]:
+        """
+        Consult every target concurrently, at most CONSULT_BATCH_CONCURRENCY model calls at a time,
+        and yield each result as soon as it completes (not in request order). A failed entry yields
+        an "error" item (a "timeout" one past CONSULT_DEADLINE_SECONDS) and does not stop the others.
+        If the consumer stops early (client gone), the calls still pending are cancelled.
+        """
+        semaphore = asyncio.Semaphore(max(1, settings.CONSULT_BATCH_CONCURRENCY))
+
+        async def consult(target: models.JournalEntry) -> Dict:
+            async with semaphore:
+                try:
+                    reply = await run_cancellable(generate_reply(
+                        main_content=target.content,
+                        context_entries=contexts.get(target.id, []),
+                        prompt_instruction=self._consultation_prompt(target),
+                        user_id=target.owner_id,
+                    ), "consult_batch", deadline_seconds=settings.CONSULT_DEADLINE_SECONDS)
+                    return {"type": "result", "entry_id": target.id, "status": "ok",
+                            "consultation": reply.text, "backend": reply.backend}
+                except DeadlineExceeded as e:
+                    logger.warning(f"Batch consultation of entry {target.id} timed out: {str(e)}")
+                    return {"type": "result", "entry_id": target.id, "status": "timeout",
+                            "detail": "The AI consultation took too long."}
+                except AIServiceError as e:
+                    logger.error(f"AI service error during batch consultation of entry {target.id}: {str(e)}")
+                    return {"type": "result", "entry_id": target.id, "status": "error", "detail": str(e)}
+                except Exception as e:
+                    logger.error(f"Unexpected error in batch consultation of entry {target.id}: {str(e)}", exc_info=True)
+                    return {"type": "result", "entry_id": target.id, "status": "error",
+                            "detail": "An unexpected error occurred while getting the AI consultation."}
+
+        tasks = [asyncio.create_task(consult(target)) for target in targets]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
     def get_chat_context_for_display(self, user_id: int) -> List[models.JournalEntry]:
         """
         DEPRECATED for triggering init. Use prepare_new_chat_session.
@@ -0,0 +1,329 @@
+# --- START OF FILE backend/app/services/digest_service.py ---
+"""
+Hierarchical journal digests: compact summaries that let the chat see months of history.
+
+A week digest (Monday to Sunday, UTC) summarizes the entries created in that week; a month
+digest summarizes the week digests of the weeks that start in that month, so the two levels
+partition history without overlap. Entry writes only mark their week stale (mark_dirty, in the
+writer's transaction); DigestScheduler re-summarizes a stale week once it has been left alone for
+DIGEST_SETTLE_SECONDS, then the month it belongs to. Nothing else is ever re-summarized.
+Every worker process runs a scheduler; each stale digest is claimed (leased) by one of them
+before its summary is requested, so a period is summarized (and billed) once.
+
+Summaries come from the Gemini model; without a configured API key an extractive digest (titles
+and opening lines) is stored instead, so the rest of the pipeline still works.
+"""
+import logging
+import threading
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import database, models
+from .ai_services import AIConfigError, get_ai_service
+
+logger = logging.getLogger(__name__)
+
+WEEK, MONTH = "week", "month"
+_ENTRY_CHARS = 2000 # Of each entry given to the weekly summarizer
+
+WEEK_INSTRUCTION = (
+    "Tóm tắt các bài nhật ký dưới đây (của một tuần) thành một đoạn ngắn, tối đa khoảng 120 từ, "
+    "bằng ngôn ngữ của người viết. Giữ lại các sự kiện chính, cảm xúc nổi bật và những người, việc "
+    "được nhắc đến nhiều lần. Chỉ tóm tắt, không thêm lời khuyên hay nhận xét."
+)
+MONTH_INSTRUCTION = (
+    "Gộp các bản tóm tắt tuần dưới đây thành bản tóm tắt của cả tháng, tối đa khoảng 150 từ, "
+    "bằng ngôn ngữ của người viết. Nêu các sự kiện quan trọng, xu hướng cảm xúc trong tháng và "
+    "những chủ đề lặp lại. Chỉ tóm tắt, không thêm lời khuyên hay nhận xét."
+)
+
+
+def _utc_date(value: datetime) -> date:
+    # SQLite hands back naive UTC datetimes; PostgreSQL returns aware ones
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return value.date()
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+def _next_month(day: date) -> date:
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+def _midnight(day: date) -> datetime:
+    return datetime.combine(day, dt_time.min, tzinfo=timezone.utc)
+
+
+# --- Staleness ---
+
+def mark_dirty(db: Session, user_id: int, timestamps: Iterable[Optional[datetime]]) -> None:
+    """
+    Mark stale the week digests of entries created at `timestamps` (created, edited or deleted),
+    inside the caller's transaction. No-op unless DIGESTS_ENABLED.
+    """
+    if not settings.DIGESTS_ENABLED:
+        return
+    _mark(db, user_id, WEEK, {week_start(_utc_date(ts)) for ts in timestamps if ts is not None})
+
+def _mark(db: Session, user_id: int, period: str, starts: Set[date]) -> None:
+    """Upsert the digests as stale: bump `revision`, and set `dirty_at` unless already stale."""
+    if not starts:
+        return
+    table = models.JournalDigest.__table__
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"user_id": user_id, "period": period, "period_start": start, "summary": "", "entry_count": 0,
+         "revision": 1, "dirty_at": now}
+        for start in sorted(starts)
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.period, table.c.period_start],
+            set_={
+                "revision": table.c.revision + 1,
+                # Keep the time it first went stale: steady editing must not postpone the rebuild forever
+                "dirty_at": func.coalesce(table.c.dirty_at, stmt.excluded.dirty_at),
+            },
+        )
+        db.execute(stmt)
+    else:
+        for row in rows:
+            existing = db.get(models.JournalDigest, (user_id, period, row["period_start"]))
+            if existing is None:
+                db.add(models.JournalDigest(**row))
+            else:
+                existing.revision += 1
+                existing.dirty_at = existing.dirty_at or now
+        db.flush()
+
+def backfill(db: Session, user_id: Optional[int] = None, chunk_size: int = 1000) -> int:
+    """Mark stale every week that has entries (for one user or everyone), e.g. after enabling digests. Commits."""
+    entry = models.JournalEntry
+    query = select(entry.owner_id, entry.created_at).order_by(entry.owner_id)
+    if user_id is not None:
+        query = query.where(entry.owner_id == user_id)
+    weeks = {}
+    for owner_id, created_at in db.execute(query.execution_options(yield_per=chunk_size)):
+        if created_at is not None:
+            weeks.setdefault(owner_id, set()).add(week_start(_utc_date(created_at)))
+    for owner_id, starts in weeks.items():
+        _mark(db, owner_id, WEEK, starts)
+    db.commit()
+    return sum(len(starts) for starts in weeks.values())
+
+
+# --- Summaries ---
+
+class DigestSummarizer:
+    """Turns (heading, text) sources into one summary of at most DIGEST_MAX_CHARS characters."""
+
+    def __init__(self, max_chars: int = settings.DIGEST_MAX_CHARS):
+        self.max_chars = max_chars
+
+    def summarize(self, period: str, sources: List[Tuple[str, str]], user_id: Optional[int] = None) -> Tuple[str, str]:
+        """Returns (summary, model name); tokens are metered for `user_id`. Raises on model errors so the caller can retry later."""
+        try:
+            ai_service = get_ai_service()
+        except AIConfigError:
+            return self._extractive(sources), "extractive"
+        text = "\n\n".join(f"### {heading}\n{body}" for heading, body in sources)
+        summary = ai_service.summarize(text, WEEK_INSTRUCTION if period == WEEK else MONTH_INSTRUCTION, user_id=user_id)
+        return summary[:self.max_chars], ai_service.model.model_name
+
+    def _extractive(self, sources: List[Tuple[str, str]]) -> str:
+        per_source = max(80, self.max_chars // max(1, len(sources)) - 20)
+        lines = [f"- {heading}: {' '.join(body.split())[:per_source]}" for heading, body in sources]
+        return "\n".join(lines)[:self.max_chars]
+
+
+class DigestScheduler:
+    """
+    Daemon thread that rebuilds stale digests every DIGEST_INTERVAL_SECONDS, at most
+    DIGEST_BATCH_SIZE weeks and months per round. A digest is claimed first by moving its
+    `dirty_at` DIGEST_LEASE_SECONDS into the future (compare-and-set on the value read, so only
+    one worker wins); the other workers' rounds skip it until the lease runs out. Model calls
+    happen outside any transaction; a digest is only marked clean if its revision did not
+    change meanwhile.
+    """
+
+    def __init__(self, summarizer: Optional[DigestSummarizer] = None,
+                 interval_seconds: float = settings.DIGEST_INTERVAL_SECONDS,
+                 settle_seconds: float = settings.DIGEST_SETTLE_SECONDS,
+                 batch_size: int = settings.DIGEST_BATCH_SIZE,
+                 lease_seconds: float = settings.DIGEST_LEASE_SECONDS):
+        self.summarizer = summarizer or DigestSummarizer()
+        self.interval = interval_seconds
+        self.settle = settle_seconds
+        self.batch_size = max(1, batch_size)
+        self.lease = lease_seconds
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.rebuilt = 0
+        self.failed = 0
+        self.contended = 0 # Claimed by another worker first
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="digest-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Digest scheduler started.")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self.running:
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        logger.info("Digest scheduler stopped.")
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Digest scheduler round failed: {e}", exc_info=True)
+
+    def run_once(self, settle_seconds: Optional[float] = None) -> int:
+        """
+        One round: rebuild the stale weeks that have settled, then the stale months (marked by
+        those weeks). Returns the number of digests rebuilt.
+        """
+        settle = self.settle if settle_seconds is None else settle_seconds
+        now = datetime.now(timezone.utc)
+        digest = models.JournalDigest
+        rebuilt = 0
+        db = database.SessionLocal() # Not pinned: reads may use a replica, revisions catch stale ones
+        try:
+            for period, cutoff in ((WEEK, now - timedelta(seconds=settle)), (MONTH, now)):
+                stale = db.execute(
+                    select(digest.user_id, digest.period_start, digest.revision, digest.dirty_at)
+                    .where(digest.period == period, digest.dirty_at <= cutoff)
+                    .order_by(digest.dirty_at)
+                    .limit(self.batch_size)
+                ).all()
+                db.commit() # Release the connection before the model calls
+                for user_id, start, revision, seen in stale:
+                    if self._stopping.is_set():
+                        return rebuilt
+                    key = (digest.user_id == user_id, digest.period == period, digest.period_start == start)
+                    lease = self._claim(db, key, revision, seen)
+                    if lease is None:
+                        self.contended += 1
+                        continue
+                    try:
+                        rebuilt += self._rebuild(db, period, user_id, start, revision, seen, lease)
+                    except Exception as e:
+                        db.rollback()
+                        self.failed += 1
+                        logger.warning(f"Could not rebuild {period} digest {start} of user {user_id}: {e}")
+                        # Back off: try this period again after another settle period
+                        db.execute(update(digest).where(*key, digest.dirty_at == lease).values(
+                            dirty_at=datetime.now(timezone.utc) + timedelta(seconds=settle)))
+                        db.commit()
+        finally:
+            db.close()
+        self.rebuilt += rebuilt
+        return rebuilt
+
+    def _claim(self, db: Session, key: tuple, revision: int, seen: datetime) -> Optional[datetime]:
+        """
+        Lease a stale digest to this worker: move its `dirty_at` from the value read (`seen`) to the
+        end of the lease. Returns the lease, or None if another worker claimed it (or it changed) first.
+        """
+        digest = models.JournalDigest
+        lease = datetime.now(timezone.utc) + timedelta(seconds=self.lease)
+        claimed = db.execute(update(digest).where(
+            *key, digest.revision == revision, digest.dirty_at == seen
+        ).values(dirty_at=lease)).rowcount
+        db.commit()
+        return lease if claimed else None
+
+    def _sources(self, db: Session, period: str, user_id: int, start: date) -> List[Tuple[str, str]]:
+        if period == WEEK:
+            entry = models.JournalEntry
+            rows = db.execute(
+                select(entry.title, entry.created_at, entry.content)
+                .where(entry.owner_id == user_id,
+                       entry.created_at >= _midnight(start),
+                       entry.created_at < _midnight(start + timedelta(days=7)))
+                .order_by(entry.created_at)
+            ).all()
+            return [(f"{_utc_date(created_at):%Y-%m-%d} - {title}", content[:_ENTRY_CHARS])
+                    for title, created_at, content in rows]
+        digest = models.JournalDigest
+        rows = db.execute(
+            select(digest.period_start, digest.entry_count, digest.summary)
+            .where(digest.user_id == user_id, digest.period == WEEK, digest.summary != "",
+                   digest.period_start >= start, digest.period_start < _next_month(start))
+            .order_by(digest.period_start)
+        ).all()
+        return [(f"Tuần từ {week:%Y-%m-%d} ({count} bài)", summary) for week, count, summary in rows]
+
+    def _rebuild(self, db: Session, period: str, user_id: int, start: date, revision: int,
+                 seen: datetime, lease: datetime) -> int:
+        digest = models.JournalDigest
+        sources = self._sources(db, period, user_id, start)
+        db.commit()
+        key = (digest.user_id == user_id, digest.period == period, digest.period_start == start)
+        if sources:
+            summary, model = self.summarizer.summarize(period, sources, user_id=user_id)
+            written = db.execute(update(digest).where(*key, digest.revision == revision).values(
+                summary=summary, entry_count=len(sources), model=model, dirty_at=None
+            )).rowcount
+        else: # Every entry of the period is gone
+            written = db.execute(delete(digest).where(*key, digest.revision == revision)).rowcount
+        if not written:
+            db.rollback()
+            # Changed while we were summarizing: still stale, give up the lease so a later round redoes it
+            db.execute(update(digest).where(*key, digest.dirty_at == lease).values(dirty_at=seen))
+            db.commit()
+            return 0
+        if period == WEEK:
+            _mark(db, user_id, MONTH, {month_start(start)})
+        db.commit()
+        return 1
+
+
+# --- Chat context ---
+
+def get_context_digests(db: Session, user_id: int, weeks: int = settings.DIGEST_CONTEXT_WEEKS,
+                        months: int = settings.DIGEST_CONTEXT_MONTHS) -> List[models.JournalDigest]:
+    """
+    Digests for a chat context, oldest first: week digests from the start of the month that
+    began `weeks` weeks ago, and before that up to `months` month digests.
+    """
+    digest = models.JournalDigest
+    boundary = month_start(week_start(datetime.now(timezone.utc).date()) - timedelta(weeks=max(weeks - 1, 0)))
+    recent = db.scalars(
+        select(digest).where(digest.user_id == user_id, digest.period == WEEK,
+                             digest.period_start >= boundary, digest.summary != "")
+        .order_by(digest.period_start)
+    ).all()
+    older = db.scalars(
+        select(digest).where(digest.user_id == user_id, digest.period == MONTH,
+                             digest.period_start < boundary, digest.summary != "")
+        .order_by(digest.period_start.desc())
+        .limit(months)
+    ).all()
+    return list(reversed(older)) + list(recent)
+
+
+# Process-wide scheduler, started from the app lifespan when DIGESTS_ENABLED=true
+digest_scheduler = DigestScheduler()
+# --- END OF FILE backend/app/services/digest_service.py ---
@@ -0,0 +1,182 @@
+# --- START OF FILE backend/app/services/export_service.py ---
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from ..db import database, models
+from .stats_service import count_words
+
+try: # Optional: only needed for the columnar export
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # pragma: no cover - depends on the environment
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    # format -> (media type, file extension)
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+class ExportServiceError(Exception):
+    """Raised when the columnar export cannot be produced (e.g. pyarrow is not installed)"""
+    pass
+
+
+def is_available() -> bool:
+    return pa is not None
+
+def export_schema(include_content: bool = True) -> "pa.Schema":
+    """Arrow schema of the export: entry columns, derived fields and the stored mood score (nullable)."""
+    if pa is None:
+        raise ExportServiceError("The columnar export needs pyarrow installed")
+    timestamp = pa.timestamp("us", tz="UTC")
+    fields = [
+        pa.field("id", pa.int64(), nullable=False),
+        pa.field("title", pa.string()),
+    ]
+    if include_content:
+        fields.append(pa.field("content", pa.string()))
+    fields += [
+        pa.field("created_at", timestamp),
+        pa.field("updated_at", timestamp),
+        # Derived (date parts are UTC)
+        pa.field("word_count", pa.int32()),
+        pa.field("char_count", pa.int32()),
+        pa.field("year", pa.int16()),
+        pa.field("month", pa.int8()),
+        pa.field("day", pa.int8()),
+        pa.field("weekday", pa.int8()), # Monday = 0
+        pa.field("hour", pa.int8()),
+        # Stored scores, null when the entry has not been scored
+        pa.field("mood_label", pa.dictionary(pa.int8(), pa.string())),
+        pa.field("mood_score", pa.float32()),
+        pa.field("mood_negative", pa.float32()),
+        pa.field("mood_neutral", pa.float32()),
+        pa.field("mood_positive", pa.float32()),
+    ]
+    return pa.schema(fields)
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite returns naive UTC datetimes; PostgreSQL returns aware ones
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _record_batch(rows: List, schema: "pa.Schema", include_content: bool) -> "pa.RecordBatch":
+    """Transpose one chunk of rows into columns and build a record batch from them."""
+    columns: Dict[str, list] = {name: [] for name in schema.names}
+    for row in rows:
+        created_at = _as_utc(row.created_at)
+        columns["id"].append(row.id)
+        columns["title"].append(row.title)
+        if include_content:
+            columns["content"].append(row.content)
+        columns["created_at"].append(created_at)
+        columns["updated_at"].append(_as_utc(row.updated_at))
+        columns["word_count"].append(count_words(row.content))
+        columns["char_count"].append(len(row.content) if row.content else 0)
+        columns["year"].append(created_at.year if created_at else None)
+        columns["month"].append(created_at.month if created_at else None)
+        columns["day"].append(created_at.day if created_at else None)
+        columns["weekday"].append(created_at.weekday() if created_at else None)
+        columns["hour"].append(created_at.hour if created_at else None)
+        columns["mood_label"].append(row.mood_label)
+        columns["mood_score"].append(row.mood_score)
+        columns["mood_negative"].append(row.mood_negative)
+        columns["mood_neutral"].append(row.mood_neutral)
+        columns["mood_positive"].append(row.mood_positive)
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns[field.name], type=field.type) for field in schema], schema=schema
+    )
+
+
+class _ChunkSink:
+    """
+    Write-only file object for pyarrow writers. Collects the bytes written so far
+    so the generator can hand them to the response and drop them (bounded memory).
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        # pyarrow passes buffers it may reuse; copy out what we keep
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_export(user_id: int, export_format: str = "parquet", include_content: bool = True,
+                  chunk_size: int = 1000) -> Iterator[bytes]:
+    """
+    Stream all of the user's entries as Parquet (one row group per chunk) or as an Arrow IPC stream.
+    Rows are fetched in chunks of `chunk_size` (a server-side cursor on PostgreSQL), turned into
+    a record batch, written and flushed to the client, so memory stays bounded by one chunk.
+    Opens its own session: the body is produced after the request's session has been closed.
+    """
+    schema = export_schema(include_content)
+    entry, mood = models.JournalEntry, models.JournalMoodScore
+    query = (
+        select(entry.id, entry.title, entry.content, entry.created_at, entry.updated_at,
+               mood.label.label("mood_label"), mood.score.label("mood_score"),
+               mood.negative.label("mood_negative"), mood.neutral.label("mood_neutral"),
+               mood.positive.label("mood_positive"))
+        .outerjoin(mood, mood.entry_id == entry.id)
+        .where(entry.owner_id == user_id)
+        .order_by(entry.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    sink = _ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    elif export_format == "arrow":
+        writer = pa.ipc.new_stream(sink, schema)
+    else:
+        raise ExportServiceError(f"Unknown export format: {export_format}")
+
+    db = database.SessionLocal()
+    db.info["user_id"] = user_id # Read-your-writes routing, see RoutingSession
+    exported = 0
+    try:
+        for rows in db.execute(query).partitions():
+            batch = _record_batch(rows, schema, include_content)
+            if export_format == "parquet":
+                writer.write_batch(batch, row_group_size=len(rows))
+            else:
+                writer.write_batch(batch)
+            exported += len(rows)
+            data = sink.drain()
+            if data:
+                yield data
+        writer.close()
+        yield sink.drain()
+        logger.info(f"Exported {exported} entries for user {user_id} as {export_format}.")
+    finally:
+        db.close()
+# --- END OF FILE backend/app/services/export_service.py ---
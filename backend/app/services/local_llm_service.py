@@ -0,0 +1,263 @@
+# --- START OF FILE backend/app/services/local_llm_service.py ---
+"""
+Local CPU fallback for the hosted model.
+
+When Gemini is over quota or unreachable, ai_services.backend_router sends chat turns and
+consultations here instead of failing them with 503. A small instruction-tuned causal LM
+(LOCAL_LLM_MODEL) runs on CPU through transformers + torch, optionally with int8 dynamic
+quantization of its Linear layers (as the mood classifier does).
+
+Concurrent requests are batched: a daemon thread takes whatever is queued (up to
+LOCAL_LLM_MAX_BATCH prompts) as soon as the previous batch finishes, waiting up to
+LOCAL_LLM_BATCH_WAIT_MS for company only when a request arrives alone, and decodes the
+batch in one left-padded generate() call. Requests cancelled while queued (client gone,
+deadline) are dropped before they cost a forward pass.
+
+torch/transformers are imported lazily, so the app runs without them while LOCAL_LLM_ENABLED=false.
+"""
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Messages = Sequence[Dict[str, str]] # Chat-template messages: {"role": "system" | "user" | "assistant", "content": ...}
+
+
+class LocalLLMError(Exception):
+    """Raised when the local model cannot be loaded, is overloaded or fails to generate"""
+    pass
+
+
+class LocalGenerator:
+    """
+    Small instruction model on CPU (transformers + torch), optionally int8 dynamically quantized.
+    Generates replies for a batch of chat-template conversations in one generate() call.
+    """
+
+    def __init__(self, model_name: str = settings.LOCAL_LLM_MODEL, quantize: bool = settings.LOCAL_LLM_QUANTIZE,
+                 max_input_tokens: int = settings.LOCAL_LLM_MAX_INPUT_TOKENS,
+                 temperature: float = settings.LOCAL_LLM_TEMPERATURE, num_threads: int = settings.LOCAL_LLM_NUM_THREADS):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_input_tokens = max_input_tokens
+        self.temperature = temperature
+        self.num_threads = num_threads
+        self._torch = None
+        self._tokenizer = None
+        self._model = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def load(self) -> "LocalGenerator":
+        if self._model is not None:
+            return self
+        try:
+            import torch
+            from transformers import AutoModelForCausalLM, AutoTokenizer
+        except ImportError as e:
+            raise LocalLLMError(f"The local fallback model needs torch and transformers installed: {e}")
+        try:
+            start_time = time.time()
+            if self.num_threads > 0:
+                torch.set_num_threads(self.num_threads)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            tokenizer.padding_side = "left" # Decoder-only: pad on the left so every prompt ends where generation starts
+            tokenizer.truncation_side = "left" # Over-long conversations lose their oldest tokens
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+            model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=torch.float32)
+            model.eval()
+            if self.quantize:
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self._torch, self._tokenizer, self._model = torch, tokenizer, model
+            logger.info(f"Loaded local fallback model {self.model_name} (quantized={self.quantize}) "
+                        f"in {time.time() - start_time:.1f} seconds")
+        except Exception as e:
+            logger.error(f"Failed to load local fallback model {self.model_name}: {e}", exc_info=True)
+            raise LocalLLMError(f"Failed to load the local fallback model: {e}")
+        return self
+
+    def generate(self, conversations: Sequence[Messages], max_new_tokens: int) -> Tuple[List[str], int]:
+        """Reply to each conversation. Returns (replies, generated tokens in the batch)."""
+        self.load()
+        torch, tokenizer = self._torch, self._tokenizer
+        prompts = [tokenizer.apply_chat_template(list(messages), tokenize=False, add_generation_prompt=True)
+                   for messages in conversations]
+        encoded = tokenizer(prompts, padding=True, truncation=True, max_length=self.max_input_tokens,
+                            return_tensors="pt", add_special_tokens=False)
+        sampling = {"do_sample": True, "temperature": self.temperature, "top_p": 0.9} if self.temperature > 0 else {"do_sample": False}
+        with torch.inference_mode():
+            output = self._model.generate(**encoded, max_new_tokens=max_new_tokens,
+                                          pad_token_id=tokenizer.pad_token_id, **sampling)
+        generated = output[:, encoded["input_ids"].shape[1]:]
+        replies = [text.strip() for text in tokenizer.batch_decode(generated, skip_special_tokens=True)]
+        return replies, int((generated != tokenizer.pad_token_id).sum())
+
+
+class LocalLLMWorker:
+    """
+    Daemon thread that batches concurrent generation requests onto one LocalGenerator.
+    Async callers await `generate`; the thread gathers queued requests into batches of up to
+    LOCAL_LLM_MAX_BATCH and resolves each caller's future with its reply.
+    """
+
+    def __init__(self, generator: Optional[LocalGenerator] = None, max_batch: int = settings.LOCAL_LLM_MAX_BATCH,
+                 batch_wait_ms: int = settings.LOCAL_LLM_BATCH_WAIT_MS, max_queue: int = settings.LOCAL_LLM_MAX_QUEUE):
+        self.generator = generator or LocalGenerator()
+        self.max_batch = max(1, max_batch)
+        self.batch_wait = batch_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[Tuple[Messages, int, Future]]]" = queue.Queue(maxsize=max(1, max_queue))
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._load_error: Optional[str] = None
+        self._stats_lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._stats_lock:
+            self.since = time.time()
+            self.requests = 0
+            self.failed = 0
+            self.dropped = 0 # Cancelled while queued
+            self.rejected = 0 # Queue full
+            self.batches = 0
+            self.generated_tokens = 0
+            self.busy_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the worker; it loads the model first, so the first failover does not pay for it."""
+        with self._start_lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="local-llm", daemon=True)
+            self._thread.start()
+        logger.info("Local fallback model worker started.")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self.running:
+            return
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(None) # Wake the worker up
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        logger.info("Local fallback model worker stopped.")
+
+    async def generate(self, messages: Messages, max_new_tokens: int = settings.LOCAL_LLM_MAX_NEW_TOKENS) -> str:
+        """
+        Queue one conversation and wait for the model's reply. Cancelling the caller drops the request
+        if it has not reached the model yet. Raises LocalLLMError when the model is unavailable or overloaded.
+        """
+        if self._load_error is not None:
+            raise LocalLLMError(self._load_error)
+        if not self.running:
+            self.start() # Lazily, e.g. when the app runs without its lifespan (tests, scripts)
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((messages, max_new_tokens, future))
+        except queue.Full:
+            with self._stats_lock:
+                self.rejected += 1
+            raise LocalLLMError("The local fallback model is overloaded. Please try again later.")
+        return await asyncio.wrap_future(future)
+
+    def _next_batch(self) -> List[Tuple[Messages, int, Future]]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        # Only a request that arrived alone waits for company; a backlog goes straight to the model
+        deadline = time.monotonic() + (self.batch_wait if self._queue.empty() else 0)
+        while len(batch) < self.max_batch:
+            try:
+                remaining = deadline - time.monotonic()
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self) -> None:
+        try:
+            self.generator.load()
+        except LocalLLMError as e:
+            self._load_error = str(e)
+            logger.error(f"Local fallback model disabled: {e}")
+            self._fail_queued(e)
+            return
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            # Drop requests whose callers already gave up; the rest can no longer be cancelled
+            jobs = [job for job in batch if job[2].set_running_or_notify_cancel()]
+            with self._stats_lock:
+                self.dropped += len(batch) - len(jobs)
+            if not jobs:
+                continue
+            start = time.monotonic()
+            try:
+                replies, tokens = self.generator.generate([job[0] for job in jobs], max(job[1] for job in jobs))
+            except Exception as e:
+                logger.error(f"Local generation failed for a batch of {len(jobs)}: {e}", exc_info=True)
+                with self._stats_lock:
+                    self.failed += len(jobs)
+                for job in jobs:
+                    job[2].set_exception(LocalLLMError(f"Local generation failed: {e}"))
+                continue
+            with self._stats_lock:
+                self.requests += len(jobs)
+                self.batches += 1
+                self.generated_tokens += tokens
+                self.busy_seconds += time.monotonic() - start
+            for job, reply in zip(jobs, replies):
+                job[2].set_result(reply)
+        self._fail_queued(LocalLLMError("The local fallback model was stopped."))
+
+    def _fail_queued(self, error: Exception) -> None:
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and job[2].set_running_or_notify_cancel():
+                job[2].set_exception(error)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "since": self.since,
+                "model": self.generator.model_name,
+                "loaded": self.generator.loaded,
+                "error": self._load_error,
+                "queued": self._queue.qsize(),
+                "requests": self.requests,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "generated_tokens": self.generated_tokens,
+                "tokens_per_second": self.generated_tokens / self.busy_seconds if self.busy_seconds else 0.0,
+            }
+
+
+# Process-wide worker, started from the app lifespan when LOCAL_LLM_ENABLED=true
+local_llm = LocalLLMWorker()
+# --- END OF FILE backend/app/services/local_llm_service.py ---
@@ -0,0 +1,222 @@
+# --- START OF FILE backend/app/services/mood_service.py ---
+import logging
+import queue
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import database, models
+
+logger = logging.getLogger(__name__)
+
+class MoodServiceError(Exception):
+    """Raised when the local mood model cannot be loaded or run"""
+    pass
+
+
+class MoodClassifier:
+    """
+    Local sentiment classifier on CPU (transformers + torch), optionally int8 dynamically quantized.
+    torch/transformers are imported lazily so the app runs without them when mood scoring is off.
+    """
+
+    def __init__(self, model_name: str = settings.MOOD_MODEL, quantize: bool = settings.MOOD_QUANTIZE,
+                 max_tokens: int = settings.MOOD_MAX_TOKENS, num_threads: int = settings.MOOD_NUM_THREADS):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_tokens = max_tokens
+        self.num_threads = num_threads
+        self._torch = None
+        self._tokenizer = None
+        self._model = None
+        self._labels: List[str] = []
+
+    def load(self) -> "MoodClassifier":
+        if self._model is not None:
+            return self
+        try:
+            import torch
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        except ImportError as e:
+            raise MoodServiceError(f"Mood scoring needs torch and transformers installed: {e}")
+        try:
+            start_time = time.time()
+            if self.num_threads > 0:
+                torch.set_num_threads(self.num_threads)
+            tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+            model.eval()
+            if self.quantize:
+                # int8 weights for Linear layers: ~2-3x faster on CPU, ~4x smaller, negligible accuracy loss
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            self._labels = [str(model.config.id2label[i]).lower() for i in range(model.config.num_labels)]
+            self._torch, self._tokenizer, self._model = torch, tokenizer, model
+            logger.info(f"Loaded mood model {self.model_name} (quantized={self.quantize}, labels={self._labels}) "
+                        f"in {time.time() - start_time:.1f} seconds")
+        except Exception as e:
+            logger.error(f"Failed to load mood model {self.model_name}: {e}", exc_info=True)
+            raise MoodServiceError(f"Failed to load mood model: {e}")
+        return self
+
+    def _probability(self, probabilities: Dict[str, float], name: str) -> float:
+        return next((value for label, value in probabilities.items() if name in label), 0.0)
+
+    def predict(self, texts: Sequence[str]) -> List[Dict[str, float]]:
+        """Score a micro-batch of texts. Returns one dict per text with label, score and class probabilities."""
+        self.load()
+        torch = self._torch
+        encoded = self._tokenizer(list(texts), padding=True, truncation=True,
+                                  max_length=self.max_tokens, return_tensors="pt")
+        with torch.inference_mode():
+            probabilities = torch.softmax(self._model(**encoded).logits, dim=-1).tolist()
+
+        results = []
+        for row in probabilities:
+            by_label = dict(zip(self._labels, row))
+            negative = self._probability(by_label, "neg")
+            neutral = self._probability(by_label, "neu")
+            positive = self._probability(by_label, "pos")
+            results.append({
+                "label": max(by_label, key=by_label.get),
+                "score": positive - negative,
+                "negative": negative,
+                "neutral": neutral,
+                "positive": positive,
+            })
+        return results
+
+
+def save_scores(db: Session, rows: Sequence, results: Sequence[Dict[str, float]], model_name: str) -> None:
+    """Replace the stored scores of the given (id, owner_id, ...) entry rows. Commits."""
+    entry_ids = [row.id for row in rows]
+    db.execute(delete(models.JournalMoodScore).where(models.JournalMoodScore.entry_id.in_(entry_ids)))
+    db.add_all(
+        models.JournalMoodScore(entry_id=row.id, user_id=row.owner_id, model=model_name, **result)
+        for row, result in zip(rows, results)
+    )
+    db.commit()
+
+def score_entries(db: Session, classifier: MoodClassifier, entry_ids: Iterable[int]) -> int:
+    """Load, score and store the given entries in one micro-batch. Returns the number scored."""
+    entry_ids = list(entry_ids)
+    rows = db.execute(
+        select(models.JournalEntry.id, models.JournalEntry.owner_id, models.JournalEntry.content)
+        .where(models.JournalEntry.id.in_(entry_ids))
+    ).all()
+    if not rows: # Entries deleted before we got to them
+        return 0
+    results = classifier.predict([row.content for row in rows])
+    save_scores(db, rows, results, classifier.model_name)
+    return len(rows)
+
+
+class MoodScorer:
+    """
+    Background worker that scores entries off the request path.
+    Routers submit entry ids; a daemon thread gathers them into micro-batches
+    (up to MOOD_BATCH_SIZE, waiting at most MOOD_BATCH_WAIT_MS) and runs the classifier.
+    """
+
+    def __init__(self, classifier: Optional[MoodClassifier] = None, batch_size: int = settings.MOOD_BATCH_SIZE,
+                 batch_wait_ms: int = settings.MOOD_BATCH_WAIT_MS):
+        self.classifier = classifier or MoodClassifier()
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+        self._queue: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self.scored = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="mood-scorer", daemon=True)
+        self._thread.start()
+        logger.info("Mood scorer started.")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self.running:
+            return
+        self._stopping.set()
+        self._queue.put(None) # Wake the worker up
+        self._thread.join(timeout)
+        logger.info("Mood scorer stopped.")
+
+    def submit(self, entry_ids: Iterable[int]) -> None:
+        """Queue entries for (re)scoring. No-op when the worker is not running."""
+        if not self.running:
+            return
+        for entry_id in entry_ids:
+            self._queue.put(entry_id)
+
+    def _next_batch(self) -> List[int]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = {first}
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry_id = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry_id is None:
+                break
+            batch.add(entry_id) # A set: rapid re-saves of one entry are scored once
+        return list(batch)
+
+    def _run(self) -> None:
+        try:
+            self.classifier.load()
+        except MoodServiceError as e:
+            logger.error(f"Mood scorer disabled: {e}")
+            return
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            db = database.use_primary(database.SessionLocal())
+            try:
+                self.scored += score_entries(db, self.classifier, batch)
+            except Exception as e:
+                self.failed += len(batch)
+                db.rollback()
+                logger.error(f"Mood scoring failed for entries {batch}: {e}", exc_info=True)
+            finally:
+                db.close()
+
+
+def get_mood_timeline(db: Session, user_id: int, start: date, end: date) -> List[Dict]:
+    """Scored entries of the user created within [start, end] (UTC days), oldest first. Content is not loaded."""
+    entry, mood = models.JournalEntry, models.JournalMoodScore
+    rows = db.execute(
+        select(entry.id.label("entry_id"), entry.title, entry.created_at, mood.label, mood.score,
+               mood.negative, mood.neutral, mood.positive)
+        .join(mood, mood.entry_id == entry.id)
+        .where(
+            entry.owner_id == user_id,
+            entry.created_at >= datetime.combine(start, dt_time.min, tzinfo=timezone.utc),
+            entry.created_at < datetime.combine(end + timedelta(days=1), dt_time.min, tzinfo=timezone.utc),
+        )
+        .order_by(entry.created_at)
+    ).all()
+    return [row._asdict() for row in rows]
+
+
+# Process-wide worker, started from the app lifespan when MOOD_SCORING_ENABLED=true
+mood_scorer = MoodScorer()
+# --- END OF FILE backend/app/services/mood_service.py ---
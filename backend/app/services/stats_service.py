@@ -0,0 +1,181 @@
+# --- START OF FILE backend/app/services/stats_service.py ---
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..db import models
+
+logger = logging.getLogger(__name__)
+
+Bucket = Tuple[date, int] # (UTC day, UTC hour)
+
+def count_words(text: Optional[str]) -> int:
+    return len(text.split()) if text else 0
+
+def _bucket(created_at: datetime) -> Bucket:
+    # SQLite hands back naive UTC datetimes; PostgreSQL returns aware ones
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return created_at.date(), created_at.hour
+
+
+class ActivityDeltas:
+    """Accumulates (entry_count, word_count) changes per bucket before writing them in one statement."""
+
+    def __init__(self):
+        self._deltas: Dict[Bucket, List[int]] = defaultdict(lambda: [0, 0])
+
+    def add(self, created_at: Optional[datetime], entries: int, words: int) -> "ActivityDeltas":
+        if created_at is None or (entries == 0 and words == 0):
+            return self
+        delta = self._deltas[_bucket(created_at)]
+        delta[0] += entries
+        delta[1] += words
+        return self
+
+    def items(self):
+        return [(bucket, delta) for bucket, delta in self._deltas.items() if delta[0] or delta[1]]
+
+
+def apply_deltas(db: Session, user_id: int, deltas: ActivityDeltas) -> None:
+    """
+    Add the accumulated deltas to the user's activity rows (upsert), inside the caller's transaction.
+    Uses INSERT ... ON CONFLICT on PostgreSQL/SQLite and falls back to read-modify-write elsewhere.
+    """
+    items = deltas.items()
+    if not items:
+        return
+    table = models.JournalActivityStat.__table__
+    rows = [
+        {"user_id": user_id, "day": day, "hour": hour, "entry_count": entries, "word_count": words}
+        for (day, hour), (entries, words) in items
+    ]
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.hour],
+            set_={
+                "entry_count": table.c.entry_count + stmt.excluded.entry_count,
+                "word_count": table.c.word_count + stmt.excluded.word_count,
+            },
+        )
+        db.execute(stmt)
+    else:
+        for row in rows:
+            existing = db.get(models.JournalActivityStat, (user_id, row["day"], row["hour"]))
+            if existing is None:
+                db.add(models.JournalActivityStat(**row))
+            else:
+                existing.entry_count += row["entry_count"]
+                existing.word_count += row["word_count"]
+        db.flush()
+
+    if any(entries < 0 for _, (entries, _) in items):
+        # Deleting the last entry of a bucket leaves an empty row behind; drop it
+        db.execute(
+            delete(table).where(table.c.user_id == user_id, table.c.entry_count <= 0)
+        )
+
+def rebuild(db: Session, user_id: Optional[int] = None, chunk_size: int = 1000) -> int:
+    """
+    Recompute activity rows from journal_entries (backfill / repair), for one user or everyone.
+    Streams entries in chunks; returns the number of entries scanned. Commits when done.
+    """
+    table = models.JournalActivityStat.__table__
+    entry = models.JournalEntry
+    clear = delete(table)
+    query = select(entry.owner_id, entry.created_at, entry.content).order_by(entry.owner_id)
+    if user_id is not None:
+        clear = clear.where(table.c.user_id == user_id)
+        query = query.where(entry.owner_id == user_id)
+    db.execute(clear)
+
+    scanned = 0
+    per_user: Dict[int, ActivityDeltas] = defaultdict(ActivityDeltas)
+    for owner_id, created_at, content in db.execute(query.execution_options(yield_per=chunk_size)):
+        per_user[owner_id].add(created_at, 1, count_words(content))
+        scanned += 1
+    for owner_id, deltas in per_user.items():
+        apply_deltas(db, owner_id, deltas)
+    db.commit()
+    logger.info(f"Rebuilt writing stats from {scanned} entries ({len(per_user)} users).")
+    return scanned
+
+def _streaks(active_days: List[date], today: date) -> Tuple[int, int]:
+    """(current, longest) runs of consecutive active days; current counts back from today or yesterday."""
+    longest = run = 0
+    previous: Optional[date] = None
+    for day in active_days:
+        run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+    current = 0
+    if active_days and today - active_days[-1] <= timedelta(days=1):
+        current = 1
+        for i in range(len(active_days) - 1, 0, -1):
+            if active_days[i] - active_days[i - 1] != timedelta(days=1):
+                break
+            current += 1
+    return current, longest
+
+def get_stats(db: Session, user_id: int, start: date, end: date, tz_offset_hours: int = 0) -> dict:
+    """
+    Writing statistics for [start, end] (inclusive, in the user's timezone given as a whole-hour UTC offset).
+    Reads only the aggregate rows of the range: O(days), independent of the number of entries.
+    """
+    table = models.JournalActivityStat.__table__
+    offset = timedelta(hours=tz_offset_hours)
+    # Buckets are UTC; widen the query by a day on each side and filter after shifting
+    rows = db.execute(
+        select(table.c.day, table.c.hour, table.c.entry_count, table.c.word_count)
+        .where(
+            table.c.user_id == user_id,
+            table.c.day >= start - timedelta(days=1),
+            table.c.day <= end + timedelta(days=1),
+        )
+    ).all()
+
+    daily: Dict[date, List[int]] = defaultdict(lambda: [0, 0])
+    by_weekday = [0] * 7
+    by_hour = [0] * 24
+    for day, hour, entries, words in rows:
+        local = datetime(day.year, day.month, day.day, hour) + offset
+        if not (start <= local.date() <= end):
+            continue
+        daily[local.date()][0] += entries
+        daily[local.date()][1] += words
+        by_weekday[local.weekday()] += entries
+        by_hour[local.hour] += entries
+
+    active_days = sorted(day for day, (entries, _) in daily.items() if entries > 0)
+    today = (datetime.now(timezone.utc) + offset).date()
+    current_streak, longest_streak = _streaks(active_days, min(today, end))
+    total_entries = sum(entries for entries, _ in daily.values())
+    total_words = sum(words for _, words in daily.values())
+    span_days = (end - start).days + 1
+    return {
+        "start": start,
+        "end": end,
+        "tz_offset_hours": tz_offset_hours,
+        "total_entries": total_entries,
+        "total_words": total_words,
+        "active_days": len(active_days),
+        "entries_per_day": round(total_entries / span_days, 3) if span_days > 0 else 0.0,
+        "avg_words_per_entry": round(total_words / total_entries, 1) if total_entries else 0.0,
+        "current_streak": current_streak,
+        "longest_streak": longest_streak,
+        "daily": [
+            {"date": day, "entries": entries, "words": words}
+            for day, (entries, words) in sorted(daily.items()) if entries or words
+        ],
+        "by_weekday": by_weekday, # Monday = 0
+        "by_hour": by_hour,
+    }
+# --- END OF FILE backend/app/services/stats_service.py ---
@@ -0,0 +1,287 @@
+# --- START OF FILE backend/app/services/usage_service.py ---
+"""
+Per-user Gemini token accounting and daily budgets.
+
+The AI services report each response's usage metadata (prompt and output token counts) with
+the user and feature. UsageMeter adds them to in-memory counters per (user, UTC day, feature);
+a daemon thread writes the pending counters every USAGE_FLUSH_SECONDS (sooner once
+USAGE_FLUSH_BATCH are pending) as one upsert that adds to llm_usage_stats. A crash loses at
+most one flush interval of counts.
+
+USAGE_DAILY_TOKEN_BUDGET (tokens per user per UTC day, all features) degrades in steps
+instead of failing at the provider quota:
+    DEGRADED    from USAGE_DEGRADE_AT of the budget: chat and consult contexts shrink to
+                USAGE_DEGRADED_CONTEXT_ENTRIES entries, without digests
+    NO_CONSULT  from USAGE_REFUSE_CONSULT_AT: consultations are refused (429)
+    EXHAUSTED   at the budget: chat turns are refused too, until midnight UTC
+Budget checks read a cached daily total (the flushed total, re-read every
+USAGE_BUDGET_REFRESH_SECONDS, plus this process's own counts), so they cost no query;
+with several workers a user's total lags by up to the refresh interval.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..db import database, models
+
+logger = logging.getLogger(__name__)
+
+CHAT, CONSULT, DIGEST = "chat", "consult", "digest"
+OK, DEGRADED, NO_CONSULT, EXHAUSTED = 0, 1, 2, 3
+LEVEL_NAMES = ("ok", "degraded", "no_consult", "exhausted")
+
+Key = Tuple[int, date, str] # (user_id, UTC day, feature)
+
+
+class BudgetExceeded(Exception):
+    """A feature was refused because the user's daily token budget is (nearly) used up."""
+
+    def __init__(self, feature: str, retry_after: int):
+        super().__init__(f"Daily AI usage limit reached for {feature}. Please try again after midnight UTC.")
+        self.feature = feature
+        self.retry_after = retry_after # Seconds until the budget resets
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+def seconds_until_reset() -> int:
+    now = datetime.now(timezone.utc)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+    return max(1, int((midnight - now).total_seconds()))
+
+def token_counts(usage: Any) -> Tuple[int, int]:
+    """(prompt, output) tokens of a response's usage_metadata; missing fields count as 0."""
+    if usage is None:
+        return 0, 0
+    return int(getattr(usage, "prompt_token_count", 0) or 0), int(getattr(usage, "candidates_token_count", 0) or 0)
+
+
+class UsageMeter:
+    """In-memory token counters, flushed in batches by a daemon thread, and the budget checks built on them."""
+
+    def __init__(self, flush_seconds: float = settings.USAGE_FLUSH_SECONDS,
+                 batch_size: int = settings.USAGE_FLUSH_BATCH,
+                 refresh_seconds: float = settings.USAGE_BUDGET_REFRESH_SECONDS):
+        self.flush_interval = flush_seconds
+        self.batch_size = max(1, batch_size)
+        self.refresh = refresh_seconds
+        self._lock = threading.Lock()
+        self._pending: Dict[Key, List[int]] = {} # [requests, prompt tokens, output tokens]
+        self._spent: Dict[int, List] = {} # user_id -> [day, loaded at (monotonic), tokens today]
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._wake = threading.Event()
+        self.flushed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self.running:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="usage-meter", daemon=True)
+            self._thread.start()
+        logger.info("Usage meter started.")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Write the pending counters, then stop the worker."""
+        if not self.running:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        logger.info("Usage meter stopped.")
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+        self.flush()
+
+    # --- Metering ---
+
+    def record(self, user_id: Optional[int], feature: str, usage: Any) -> None:
+        """Count one model response's tokens for the user (no-op without a user or usage metadata)."""
+        prompt, output = token_counts(usage)
+        if user_id is None or not (prompt or output):
+            return
+        if not self.running:
+            self.start() # Lazily, e.g. when the app runs without its lifespan (tests, scripts)
+        day = _today()
+        with self._lock:
+            counter = self._pending.setdefault((user_id, day, feature), [0, 0, 0])
+            counter[0] += 1
+            counter[1] += prompt
+            counter[2] += output
+            spent = self._spent.get(user_id)
+            if spent is not None and spent[0] == day:
+                spent[2] += prompt + output
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Add the pending counters to llm_usage_stats in one statement. Returns the number of rows written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            today = _today()
+            for user_id in [user_id for user_id, spent in self._spent.items() if spent[0] != today]:
+                del self._spent[user_id]
+        if not pending:
+            return 0
+        rows = [
+            {"user_id": user_id, "day": day, "feature": feature,
+             "requests": requests, "prompt_tokens": prompt, "output_tokens": output}
+            for (user_id, day, feature), (requests, prompt, output) in pending.items()
+        ]
+        db = database.use_primary(database.SessionLocal())
+        try:
+            _add_rows(db, rows)
+            db.commit()
+            self.flushed += len(rows)
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            self.failed += len(rows)
+            logger.error(f"Failed to write {len(rows)} usage counters, keeping them for the next flush: {e}", exc_info=True)
+            with self._lock:
+                for key, (requests, prompt, output) in pending.items():
+                    counter = self._pending.setdefault(key, [0, 0, 0])
+                    counter[0] += requests
+                    counter[1] += prompt
+                    counter[2] += output
+            return 0
+        finally:
+            db.close()
+
+    # --- Budgets ---
+
+    def spent_today(self, user_id: int, db: Optional[Session] = None) -> int:
+        """Tokens the user used today (UTC), from the cache; reloaded every USAGE_BUDGET_REFRESH_SECONDS."""
+        day = _today()
+        with self._lock:
+            spent = self._spent.get(user_id)
+            if spent is not None and spent[0] == day and time.monotonic() - spent[1] < self.refresh:
+                return spent[2]
+        if db is not None:
+            flushed = _load_day_total(db, user_id, day)
+        else:
+            session = database.SessionLocal()
+            try:
+                flushed = _load_day_total(session, user_id, day)
+            finally:
+                session.close()
+        with self._lock:
+            pending = sum(prompt + output for (uid, d, _), (_, prompt, output) in self._pending.items()
+                          if uid == user_id and d == day)
+            self._spent[user_id] = [day, time.monotonic(), flushed + pending]
+            return flushed + pending
+
+    def level(self, user_id: int, db: Optional[Session] = None) -> int:
+        """The user's budget level today: OK, DEGRADED, NO_CONSULT or EXHAUSTED."""
+        budget = settings.USAGE_DAILY_TOKEN_BUDGET
+        if budget <= 0:
+            return OK
+        used = self.spent_today(user_id, db) / budget
+        if used >= 1:
+            return EXHAUSTED
+        if used >= settings.USAGE_REFUSE_CONSULT_AT:
+            return NO_CONSULT
+        if used >= settings.USAGE_DEGRADE_AT:
+            return DEGRADED
+        return OK
+
+    def check(self, user_id: int, feature: str, db: Optional[Session] = None) -> int:
+        """Raise BudgetExceeded if the user's level refuses `feature`, else return the level."""
+        level = self.level(user_id, db)
+        if level == EXHAUSTED or (level == NO_CONSULT and feature == CONSULT):
+            raise BudgetExceeded(feature, seconds_until_reset())
+        return level
+
+
+def _add_rows(db: Session, rows: List[Dict]) -> None:
+    """Upsert usage rows, adding to existing counters (same pattern as stats_service.apply_deltas)."""
+    table = models.LLMUsageStat.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.day, table.c.feature],
+            set_={
+                "requests": table.c.requests + stmt.excluded.requests,
+                "prompt_tokens": table.c.prompt_tokens + stmt.excluded.prompt_tokens,
+                "output_tokens": table.c.output_tokens + stmt.excluded.output_tokens,
+            },
+        )
+        db.execute(stmt)
+    else:
+        for row in rows:
+            existing = db.get(models.LLMUsageStat, (row["user_id"], row["day"], row["feature"]))
+            if existing is None:
+                db.add(models.LLMUsageStat(**row))
+            else:
+                existing.requests += row["requests"]
+                existing.prompt_tokens += row["prompt_tokens"]
+                existing.output_tokens += row["output_tokens"]
+        db.flush()
+
+def _load_day_total(db: Session, user_id: int, day: date) -> int:
+    usage = models.LLMUsageStat
+    return db.scalar(
+        select(func.coalesce(func.sum(usage.prompt_tokens + usage.output_tokens), 0))
+        .where(usage.user_id == user_id, usage.day == day)
+    ) or 0
+
+
+# --- Reports ---
+
+def get_usage(db: Session, user_id: int, start: date, end: date) -> List:
+    """The user's usage rows for [start, end] (UTC days, inclusive), oldest first."""
+    usage = models.LLMUsageStat
+    return db.execute(
+        select(usage.day, usage.feature, usage.requests, usage.prompt_tokens, usage.output_tokens)
+        .where(usage.user_id == user_id, usage.day >= start, usage.day <= end)
+        .order_by(usage.day, usage.feature)
+    ).all()
+
+def top_users(db: Session, start: date, end: date, limit: int = 20) -> List:
+    """Users with the most tokens over [start, end], with their totals per feature."""
+    usage = models.LLMUsageStat
+    tokens = func.sum(usage.prompt_tokens + usage.output_tokens)
+    top = (
+        select(usage.user_id)
+        .where(usage.day >= start, usage.day <= end)
+        .group_by(usage.user_id)
+        .order_by(tokens.desc())
+        .limit(limit)
+        .subquery()
+    )
+    return db.execute(
+        select(usage.user_id, models.User.email, usage.feature,
+               func.sum(usage.requests).label("requests"),
+               func.sum(usage.prompt_tokens).label("prompt_tokens"),
+               func.sum(usage.output_tokens).label("output_tokens"))
+        .join(models.User, models.User.id == usage.user_id)
+        .where(usage.user_id.in_(select(top.c.user_id)), usage.day >= start, usage.day <= end)
+        .group_by(usage.user_id, models.User.email, usage.feature)
+    ).all()
+
+
+# Process-wide meter; the AI services report to it, the app lifespan starts and stops it
+usage_meter = UsageMeter()
+# --- END OF FILE backend/app/services/usage_service.py ---
@@ -0,0 +1,59 @@
+# --- START OF FILE backend/benchmarks/_common.py ---
+"""
+Shared setup for the benchmark scripts.
+
+Each benchmark runs the real FastAPI app in-process (TestClient) against a
+throwaway database. Set BENCH_DATABASE_URL to benchmark against PostgreSQL;
+by default a temporary SQLite file is used.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def configure_database() -> str:
+    """Point the app at the benchmark database. Must run before importing `app`."""
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp(prefix='journal-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("SKIP_DB_INIT", "false")
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    return url
+
+def make_client(email: str = "bench@example.com", password: str = "benchmark") -> Tuple["TestClient", Dict[str, str], int]:
+    """Start the app, register a user and return (client, auth headers, user_id)."""
+    configure_database()
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    client = TestClient(app)
+    client.post("/api/v1/auth/register", json={"email": email, "password": password})
+    token = client.post("/api/v1/auth/token", data={"username": email, "password": password}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    user_id = client.get("/api/v1/auth/users/me", headers=headers).json()["id"]
+    return client, headers, user_id
+
+def sample_text(words: int, seed: int = 0) -> str:
+    vocabulary = ("hôm nay mình cảm thấy khá mệt nhưng vẫn vui vì được gặp bạn bè "
+                  "today I walked along the river and thought about work family and plans").split()
+    return " ".join(vocabulary[(seed * 7 + i * 13) % len(vocabulary)] for i in range(words))
+
+def timeit(fn: Callable[[], object], repeat: int) -> List[float]:
+    """Run `fn` `repeat` times and return the wall-clock durations in milliseconds."""
+    fn() # Warm-up
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def describe(durations: List[float]) -> str:
+    ordered = sorted(durations)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"mean {statistics.mean(ordered):8.2f} ms | p50 {statistics.median(ordered):8.2f} ms | p95 {p95:8.2f} ms"
+# --- END OF FILE backend/benchmarks/_common.py ---
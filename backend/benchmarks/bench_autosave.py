@@ -0,0 +1,87 @@
+# --- START OF FILE backend/benchmarks/bench_autosave.py ---
+"""
+Editor autosave: full PUT /api/v1/journal/{id} per save vs. PATCH .../autosave
+with text edits, written through (AUTOSAVE_COALESCE_MS=0) or coalesced.
+
+    cd backend && python benchmarks/bench_autosave.py --words 3000 --saves 100 --interval-ms 50 --coalesce-ms 500
+
+Each save types a few words somewhere in the entry, `--interval-ms` apart.
+Reports bytes on the wire (request + response bodies), UPDATE statements on
+journal_entries and the bytes they wrote, and the request latency.
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import event
+
+from _common import describe, make_client, sample_text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=3000, help="Size of the edited entry")
+    parser.add_argument("--saves", type=int, default=100)
+    parser.add_argument("--interval-ms", type=int, default=50, help="Pause between saves (typing time)")
+    parser.add_argument("--coalesce-ms", type=int, default=500, help="Coalescing window of the buffered run")
+    args = parser.parse_args()
+
+    client, headers, _ = make_client()
+    from app.db import database
+    from app.services.autosave_service import autosave_buffer
+
+    writes = {"statements": 0, "bytes": 0}
+    @event.listens_for(database.engine, "before_cursor_execute")
+    def count_updates(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("UPDATE JOURNAL_ENTRIES"):
+            writes["statements"] += 1
+            writes["bytes"] += sum(len(p.encode()) for p in (parameters or ()) if isinstance(p, str))
+
+    def run(label, save):
+        entry = client.post("/api/v1/journal/", json={"title": label, "content": sample_text(args.words)},
+                            headers=headers).json()
+        state = {"id": entry["id"], "version": entry["version"], "content": entry["content"]}
+        rng = random.Random(42)
+        writes.update(statements=0, bytes=0)
+        wire, latencies = 0, []
+        for i in range(args.saves):
+            position = rng.randrange(len(state["content"]))
+            insert = f" word{i} more{i}"
+            new_content = state["content"][:position] + insert + state["content"][position:]
+            start = time.perf_counter()
+            sent, response = save(state, position, insert, new_content)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.text
+            wire += sent + len(response.content)
+            state["version"] = response.json()["version"]
+            state["content"] = new_content
+            time.sleep(args.interval_ms / 1000)
+        stored = client.get(f"/api/v1/journal/{state['id']}", headers=headers).json() # Flushes pending autosaves
+        assert stored["content"] == state["content"]
+        print(f"{label:<22} | wire {wire / 1024:9.1f} KiB | {writes['statements']:4d} UPDATEs "
+              f"| {writes['bytes'] / 1024:9.1f} KiB written | {describe(latencies)}")
+
+    def put(state, position, insert, new_content):
+        request = client.build_request("PUT", f"/api/v1/journal/{state['id']}",
+                                       json={"title": "put", "content": new_content}, headers=headers)
+        return len(request.content), client.send(request)
+
+    def patch(state, position, insert, new_content):
+        request = client.build_request("PATCH", f"/api/v1/journal/{state['id']}/autosave", headers=headers, json={
+            "base_version": state["version"], "edits": [{"start": position, "delete": 0, "insert": insert}],
+        })
+        return len(request.content), client.send(request)
+
+    print(f"{args.saves} saves of a {args.words}-word entry, {args.interval_ms} ms apart\n")
+    run("PUT (full entry)", put)
+    autosave_buffer.coalesce_seconds = 0
+    run("PATCH write-through", patch)
+    autosave_buffer.coalesce_seconds = args.coalesce_ms / 1000
+    autosave_buffer.start()
+    run(f"PATCH coalesced {args.coalesce_ms}ms", patch)
+    autosave_buffer.stop()
+    print(f"\nBuffered autosaves: {autosave_buffer.autosaves}, writes: {autosave_buffer.writes}, "
+          f"conflicts: {autosave_buffer.conflicts}")
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_autosave.py ---
@@ -0,0 +1,67 @@
+# --- START OF FILE backend/benchmarks/bench_chat_transport.py ---
+"""
+Per-turn server overhead of chat over HTTP (POST /api/v1/chat/ per message:
+JWT decode, user lookup, DB session, ContextService) vs. the WebSocket
+channel (/api/v1/chat/ws: authenticated once, session bound to the socket).
+
+    cd backend && python benchmarks/bench_chat_transport.py --turns 500
+
+The user's chat session is replaced by an instant echo so that only the
+transport and per-request work are measured, not the model.
+"""
+import argparse
+import time
+
+from _common import describe, make_client
+
+class EchoChat:
+    """Stands in for an initialized ChatService; replies instantly."""
+    is_initialized = True
+    last_backend = "gemini"
+
+    async def send_message(self, message: str) -> str:
+        return message
+
+    async def stream_message(self, message: str):
+        yield message
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=500)
+    args = parser.parse_args()
+
+    client, headers, user_id = make_client()
+    from app.services.context_service import ContextService
+    if not hasattr(ContextService, "_chat_services"):
+        ContextService._chat_services = {}
+    ContextService._chat_services[user_id] = EchoChat()
+
+    http = []
+    for i in range(args.turns):
+        start = time.perf_counter()
+        response = client.post("/api/v1/chat/", json={"message": f"hello {i}"}, headers=headers)
+        http.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.text
+
+    token = headers["Authorization"].split(" ", 1)[1]
+    ws = []
+    connect_start = time.perf_counter()
+    with client.websocket_connect("/api/v1/chat/ws") as socket:
+        socket.send_json({"type": "auth", "token": token})
+        assert socket.receive_json()["type"] == "ready"
+        connect_ms = (time.perf_counter() - connect_start) * 1000
+        for i in range(args.turns):
+            start = time.perf_counter()
+            socket.send_json({"type": "message", "message": f"hello {i}"})
+            while socket.receive_json()["type"] != "done":
+                pass
+            ws.append((time.perf_counter() - start) * 1000)
+
+    print(f"{args.turns} turns, model replaced by an instant echo\n")
+    print(f"HTTP POST /chat/  | {describe(http)}")
+    print(f"WebSocket turn    | {describe(ws)}")
+    print(f"WebSocket connect | {connect_ms:8.2f} ms (once per socket: JWT decode + user lookup)")
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_chat_transport.py ---
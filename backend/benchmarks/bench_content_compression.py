@@ -0,0 +1,84 @@
+# --- START OF FILE backend/benchmarks/bench_content_compression.py ---
+"""
+Storage size and read/write latency of journal content stored plain vs.
+compressed at rest (db/compression.py): zlib, zstd, and zstd with a
+dictionary trained on a separate sample of entries.
+
+    cd backend && python benchmarks/bench_content_compression.py --entries 2000 --min-words 300 --max-words 1500
+
+Writes insert all entries in one transaction through the ORM column type;
+reads select and decode all of them. zstd modes are skipped without zstandard.
+"""
+import argparse
+import random
+import time
+
+from _common import configure_database
+
+VOCABULARY = ("hôm nay mình cảm thấy khá mệt nhưng vẫn vui vì được gặp bạn bè đi dạo công viên "
+              "buổi chiều trời mát công việc gia đình kế hoạch ngày mai cố gắng "
+              "today I walked along the river and thought about work family plans tired happy "
+              "grateful meeting friends weekend coffee morning evening").split()
+
+def make_entries(count: int, min_words: int, max_words: int, seed: int):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(min_words, max_words)))
+            for _ in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--min-words", type=int, default=300)
+    parser.add_argument("--max-words", type=int, default=1500)
+    parser.add_argument("--min-bytes", type=int, default=2048, help="CONTENT_COMPRESSION_MIN_BYTES")
+    args = parser.parse_args()
+
+    configure_database()
+    from sqlalchemy import LargeBinary, Text, cast, delete, func, insert, select, type_coerce
+    from app.db import compression, database, models
+
+    database.init_db()
+    texts = make_entries(args.entries, args.min_words, args.max_words, seed=1)
+    db = database.SessionLocal()
+    user = models.User(email="bench-compression@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    modes = [("plain", compression.ContentCodec(codec="off"))]
+    modes.append(("zlib", compression.ContentCodec(codec="zlib", min_bytes=args.min_bytes)))
+    if compression.zstandard is not None:
+        modes.append(("zstd", compression.ContentCodec(codec="zstd", min_bytes=args.min_bytes)))
+        zdict = compression.train_dictionary(make_entries(500, args.min_words, args.max_words, seed=2))
+        with_dict = compression.ContentCodec(codec="zstd", min_bytes=args.min_bytes)
+        with_dict._dicts, with_dict._active_dict_id = {zdict.dict_id(): zdict}, zdict.dict_id()
+        modes.append(("zstd+dict", with_dict))
+
+    entry = models.JournalEntry
+    plain_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    print(f"{args.entries} entries, {plain_bytes / 1024:.0f} KiB of text\n")
+    for name, codec in modes:
+        compression.content_codec = codec # CompressedText looks the codec up on every call
+        db.execute(delete(entry))
+        db.commit()
+
+        start = time.perf_counter()
+        db.execute(insert(entry), [{"title": f"Entry {i}", "content": text, "owner_id": user.id}
+                                   for i, text in enumerate(texts)])
+        db.commit()
+        write_ms = (time.perf_counter() - start) * 1000
+
+        raw = type_coerce(entry.content, Text) # Stored form, bypassing CompressedText
+        byte_length = func.length(cast(raw, LargeBinary)) if db.get_bind().dialect.name == "sqlite" else func.octet_length(raw)
+        stored = db.scalar(select(func.sum(byte_length)))
+        start = time.perf_counter()
+        loaded = db.scalars(select(entry.content)).all()
+        read_ms = (time.perf_counter() - start) * 1000
+        assert loaded == texts
+
+        print(f"{name:10s} | stored {stored / 1024:8.0f} KiB ({stored / plain_bytes:6.1%}) "
+              f"| write {write_ms:8.1f} ms | read {read_ms:8.1f} ms")
+    db.close()
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_content_compression.py ---
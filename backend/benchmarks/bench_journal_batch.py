@@ -0,0 +1,71 @@
+# --- START OF FILE backend/benchmarks/bench_journal_batch.py ---
+"""
+Throughput of the batch endpoints (/api/v1/journal/batch...) against the
+per-entry endpoints for create, update and delete.
+
+    cd backend && python benchmarks/bench_journal_batch.py --entries 500 --batch-size 100
+"""
+import argparse
+import time
+
+from _common import make_client, sample_text
+
+def rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:9.1f} entries/s ({seconds * 1000:8.1f} ms)"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--words", type=int, default=200)
+    args = parser.parse_args()
+
+    client, headers, _ = make_client()
+    items = [{"title": f"Entry {i}", "content": sample_text(args.words, seed=i)} for i in range(args.entries)]
+    chunks = [items[i:i + args.batch_size] for i in range(0, len(items), args.batch_size)]
+
+    # --- Create ---
+    start = time.perf_counter()
+    single_ids = [client.post("/api/v1/journal/", json=item, headers=headers).json()["id"] for item in items]
+    single_create = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_ids = []
+    for chunk in chunks:
+        results = client.post("/api/v1/journal/batch", json={"items": chunk}, headers=headers).json()["results"]
+        batch_ids.extend(result["id"] for result in results)
+    batch_create = time.perf_counter() - start
+
+    # --- Update ---
+    start = time.perf_counter()
+    for journal_id in single_ids:
+        client.put(f"/api/v1/journal/{journal_id}", json={"title": "updated"}, headers=headers)
+    single_update = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(batch_ids), args.batch_size):
+        chunk = [{"id": journal_id, "title": "updated"} for journal_id in batch_ids[i:i + args.batch_size]]
+        client.patch("/api/v1/journal/batch", json={"items": chunk}, headers=headers)
+    batch_update = time.perf_counter() - start
+
+    # --- Delete ---
+    start = time.perf_counter()
+    for journal_id in single_ids:
+        client.delete(f"/api/v1/journal/{journal_id}", headers=headers)
+    single_delete = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(0, len(batch_ids), args.batch_size):
+        client.post("/api/v1/journal/batch/delete", json={"ids": batch_ids[i:i + args.batch_size]}, headers=headers)
+    batch_delete = time.perf_counter() - start
+
+    print(f"{args.entries} entries, batch size {args.batch_size}\n")
+    print(f"{'':8}| {'per-entry':>32} | {'batch':>32}")
+    for name, single, batch in (("create", single_create, batch_create),
+                                ("update", single_update, batch_update),
+                                ("delete", single_delete, batch_delete)):
+        print(f"{name:8}| {rate(args.entries, single)} | {rate(args.entries, batch)} | x{single / batch:5.1f}")
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_journal_batch.py ---
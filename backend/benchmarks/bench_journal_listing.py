@@ -0,0 +1,43 @@
+# --- START OF FILE backend/benchmarks/bench_journal_listing.py ---
+"""
+Compare the full listing (GET /api/v1/journal/) with the summary listing
+(GET /api/v1/journal/summary): payload size and response time.
+
+    cd backend && python benchmarks/bench_journal_listing.py --entries 200 --words 600
+"""
+import argparse
+
+from _common import make_client, sample_text, timeit, describe
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--words", type=int, default=600, help="Words per entry body")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    client, headers, user_id = make_client()
+
+    from app.db import database, models
+    db = database.SessionLocal()
+    db.add_all(
+        models.JournalEntry(title=f"Entry {i}", content=sample_text(args.words, seed=i), owner_id=user_id)
+        for i in range(args.entries)
+    )
+    db.commit()
+    db.close()
+
+    limit = min(args.entries, 200)
+    cases = {
+        "full   ": f"/api/v1/journal/?limit={limit}",
+        "summary": f"/api/v1/journal/summary?limit={limit}",
+    }
+    print(f"{args.entries} entries x {args.words} words, limit={limit}, {args.repeat} requests each\n")
+    for name, url in cases.items():
+        size = len(client.get(url, headers=headers).content)
+        durations = timeit(lambda: client.get(url, headers=headers), args.repeat)
+        print(f"{name} | {size / 1024:9.1f} KiB | {describe(durations)}")
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_journal_listing.py ---
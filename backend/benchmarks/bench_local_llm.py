@@ -0,0 +1,72 @@
+# --- START OF FILE backend/benchmarks/bench_local_llm.py ---
+"""
+CPU throughput and latency of the local fallback model (services/local_llm_service.py)
+under concurrent requests, with and without batching: each round fires --concurrency
+journal consultations at once at a LocalLLMWorker and measures every request's latency
+and the generated tokens per second.
+
+    cd backend && python benchmarks/bench_local_llm.py --requests 32 --concurrency 1 4 8 --max-batch 1 8
+
+--max-batch 1 decodes the requests one by one (no batching). torch is pinned to --threads
+intra-op threads (default: all cores). Requires torch and transformers; the model is
+downloaded on first run.
+"""
+import argparse
+import asyncio
+import time
+
+from _common import configure_database, describe, sample_text
+
+async def run_round(worker, conversations, concurrency: int, max_new_tokens: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(messages):
+        async with semaphore:
+            start = time.perf_counter()
+            await worker.generate(messages, max_new_tokens)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(messages) for messages in conversations))
+    return latencies, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--words", type=int, default=120, help="Journal entry length in the prompt")
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--fp32", action="store_true", help="Skip int8 quantization")
+    parser.add_argument("--model", default=None, help="Defaults to LOCAL_LLM_MODEL")
+    args = parser.parse_args()
+
+    configure_database() # Importing app modules reads settings
+    from app.core.config import settings
+    from app.services.local_llm_service import LocalGenerator, LocalLLMWorker
+
+    generator = LocalGenerator(model_name=args.model or settings.LOCAL_LLM_MODEL, quantize=not args.fp32,
+                               num_threads=args.threads).load()
+    conversations = [
+        [{"role": "user", "content": f"Hãy tham vấn nhẹ nhàng cho đoạn nhật ký này:\n\n{sample_text(args.words, seed=i)}"}]
+        for i in range(args.requests)
+    ]
+    generator.generate(conversations[:1], 8) # Warm-up
+    print(f"{generator.model_name} ({'fp32' if args.fp32 else 'int8'}): {args.requests} requests, "
+          f"{args.words}-word entries, up to {args.max_new_tokens} new tokens\n")
+    for max_batch in args.max_batch:
+        for concurrency in args.concurrency:
+            worker = LocalLLMWorker(generator, max_batch=max_batch, max_queue=args.requests)
+            worker.start()
+            latencies, elapsed = asyncio.run(run_round(worker, conversations, concurrency, args.max_new_tokens))
+            stats = worker.snapshot()
+            worker.stop()
+            print(f"batch <= {max_batch:2d} | concurrency {concurrency:2d} | {describe(latencies)} | "
+                  f"{stats['generated_tokens'] / elapsed:7.1f} tokens/s | {args.requests / elapsed:5.2f} req/s | "
+                  f"avg batch {stats['avg_batch_size']:.1f}")
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_local_llm.py ---
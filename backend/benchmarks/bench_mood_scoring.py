@@ -0,0 +1,46 @@
+# --- START OF FILE backend/benchmarks/bench_mood_scoring.py ---
+"""
+CPU throughput of the local mood classifier (services/mood_service.py), in
+entries per second per core, for the fp32 model and the int8 dynamically
+quantized one, across micro-batch sizes.
+
+    cd backend && python benchmarks/bench_mood_scoring.py --entries 256 --batch-sizes 1 8 16 32
+
+torch is pinned to --threads intra-op threads (default 1), so the numbers are per core.
+Requires torch and transformers; the model is downloaded on first run.
+"""
+import argparse
+import time
+
+from _common import sample_text, configure_database
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=256)
+    parser.add_argument("--words", type=int, default=150)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 16, 32])
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--model", default=None, help="Defaults to MOOD_MODEL")
+    args = parser.parse_args()
+
+    configure_database() # Importing app modules reads settings
+    from app.core.config import settings
+    from app.services.mood_service import MoodClassifier
+
+    texts = [sample_text(args.words, seed=i) for i in range(args.entries)]
+    model_name = args.model or settings.MOOD_MODEL
+    print(f"{model_name}: {args.entries} entries x {args.words} words, {args.threads} thread(s)\n")
+    for quantize in (False, True):
+        classifier = MoodClassifier(model_name=model_name, quantize=quantize, num_threads=args.threads).load()
+        classifier.predict(texts[:4]) # Warm-up
+        for batch_size in args.batch_sizes:
+            start = time.perf_counter()
+            for i in range(0, len(texts), batch_size):
+                classifier.predict(texts[i:i + batch_size])
+            elapsed = time.perf_counter() - start
+            per_core = args.entries / elapsed / args.threads
+            print(f"{'int8' if quantize else 'fp32'} | batch {batch_size:3d} | {per_core:8.1f} entries/s/core")
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_mood_scoring.py ---
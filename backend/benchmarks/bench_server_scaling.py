@@ -0,0 +1,106 @@
+# --- START OF FILE backend/benchmarks/bench_server_scaling.py ---
+"""
+Requests per second of the production server (`run.py --prod`: gunicorn +
+uvicorn workers, uvloop/httptools, preloaded app) as the worker count grows.
+
+    cd backend && python benchmarks/bench_server_scaling.py --workers 1 2 4 --clients 16 --duration 10
+
+Each run starts a fresh server, seeds one user with --entries entries, and
+hammers --path with --clients load-generator processes (keep-alive
+connections). Use at least as many clients as workers, and keep the load
+generator off the server's cores if you can, e.g. with `taskset`.
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+from _common import BACKEND_DIR, configure_database, sample_text
+
+def wait_until_up(base_url: str, timeout: float = 60.0) -> None:
+    import httpx
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} did not come up")
+
+def seed(base_url: str, entries: int) -> dict:
+    import httpx
+    with httpx.Client(base_url=base_url) as client:
+        credentials = {"email": "bench-scaling@example.com", "password": "benchmark"}
+        client.post("/api/v1/auth/register", json=credentials)
+        token = client.post("/api/v1/auth/token", data={"username": credentials["email"],
+                                                         "password": credentials["password"]}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        items = [{"title": f"Entry {i}", "content": sample_text(150, seed=i)} for i in range(entries)]
+        for i in range(0, len(items), 100):
+            client.post("/api/v1/journal/batch", json={"items": items[i:i + 100]}, headers=headers)
+    return headers
+
+def load(args) -> tuple:
+    """One load-generator process: request `path` in a loop until the deadline. Returns (ok, errors)."""
+    import httpx
+    base_url, path, headers, deadline = args
+    ok = errors = 0
+    with httpx.Client(base_url=base_url, headers=headers, timeout=10.0) as client:
+        while time.time() < deadline:
+            try:
+                response = client.get(path)
+                if response.status_code == 200:
+                    ok += 1
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+    return ok, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16, help="Load-generator processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per run")
+    parser.add_argument("--path", default="/api/v1/journal/summary?limit=50")
+    parser.add_argument("--entries", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    configure_database() # Sets DATABASE_URL; the servers inherit it and share the database
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ, PYTHONUNBUFFERED="1", GUNICORN_ACCESS_LOG="")
+    print(f"{args.path} | {args.clients} clients | {args.duration:.0f} s per run | {os.cpu_count()} CPUs\n")
+
+    headers = None
+    baseline = None
+    for workers in args.workers:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, "run.py"), "--prod", "--workers", str(workers),
+             "--host", "127.0.0.1", "--port", str(args.port)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_until_up(base_url)
+            if headers is None:
+                headers = seed(base_url, args.entries)
+            load((base_url, args.path, headers, time.time() + 1.0)) # Warm-up
+            deadline = time.time() + args.duration
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.map(load, [(base_url, args.path, headers, deadline)] * args.clients)
+            ok = sum(result[0] for result in results)
+            errors = sum(result[1] for result in results)
+            rps = ok / args.duration
+            baseline = baseline or rps
+            print(f"{workers:2d} worker(s) | {rps:9.1f} req/s | x{rps / baseline:4.2f} | {errors} errors")
+        finally:
+            server.terminate() # SIGTERM: graceful drain
+            server.wait(timeout=60)
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_server_scaling.py ---
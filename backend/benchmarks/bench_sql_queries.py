@@ -0,0 +1,104 @@
+# --- START OF FILE backend/benchmarks/bench_sql_queries.py ---
+"""
+SQL statements per request for the main API endpoints, measured with the SQL
+profiler (app/db/profiler.py), compared with the budget in sql_query_budget.json.
+
+    cd backend && python benchmarks/bench_sql_queries.py            # exits 1 on a regression
+    cd backend && python benchmarks/bench_sql_queries.py --update   # accept the current counts
+
+An endpoint regresses when a request issues more statements than its budget or
+shows an N+1 pattern. Run it after changing crud.py or the routers. The committed
+budget is measured on the default SQLite database (BENCH_DATABASE_URL unset).
+"""
+import argparse
+import json
+import os
+import sys
+
+from _common import make_client, sample_text
+
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sql_query_budget.json")
+
+def exercise(client, headers):
+    """One pass over the endpoints the frontend uses."""
+    def check(response, expected=200):
+        assert response.status_code == expected, f"{response.request.method} {response.request.url}: {response.text}"
+        return response
+
+    ids = [check(client.post("/api/v1/journal/", json={"title": f"t{i}", "content": sample_text(200, i)},
+                             headers=headers), 201).json()["id"] for i in range(3)]
+    batch = check(client.post("/api/v1/journal/batch", json={"items": [
+        {"title": f"b{i}", "content": sample_text(50, i)} for i in range(5)
+    ]}, headers=headers), 201).json()
+    batch_ids = [item["id"] for item in batch["results"]]
+
+    check(client.get("/api/v1/auth/users/me", headers=headers))
+    check(client.get("/api/v1/journal/", headers=headers))
+    summary = check(client.get("/api/v1/journal/summary", headers=headers))
+    check(client.get("/api/v1/journal/summary", headers={**headers, "If-None-Match": summary.headers["etag"]}), 304)
+    entry = check(client.get(f"/api/v1/journal/{ids[0]}", headers=headers))
+    check(client.get(f"/api/v1/journal/{ids[0]}", headers={**headers, "If-None-Match": entry.headers["etag"]}), 304)
+    entry = check(client.put(f"/api/v1/journal/{ids[0]}", json={"content": sample_text(220)}, headers=headers)).json()
+    check(client.patch(f"/api/v1/journal/{ids[0]}/autosave", json={
+        "base_version": entry["version"], "edits": [{"start": 0, "insert": "hello "}],
+    }, headers=headers))
+    check(client.get(f"/api/v1/journal/{ids[0]}", headers=headers)) # Flushes the autosave
+    check(client.patch("/api/v1/journal/batch", json={"items": [
+        {"id": journal_id, "title": "renamed"} for journal_id in batch_ids
+    ]}, headers=headers))
+    check(client.post("/api/v1/journal/batch/delete", json={"ids": batch_ids[:3]}, headers=headers))
+    check(client.delete(f"/api/v1/journal/{ids[2]}", headers=headers), 204)
+    check(client.get("/api/v1/stats/", headers=headers))
+    check(client.get("/api/v1/stats/mood", headers=headers))
+    check(client.get("/api/v1/chat/history", headers=headers))
+    check(client.get("/api/v1/chat/sessions", headers=headers))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--update", action="store_true", help=f"Write the measured counts to {os.path.basename(BUDGET_FILE)}")
+    args = parser.parse_args()
+
+    os.environ["SQL_PROFILING_ENABLED"] = "true"
+    os.environ["AUTOSAVE_COALESCE_MS"] = "3000" # The flush on read is part of what is measured
+    client, headers, _ = make_client()
+    from app.db.profiler import sql_profiler
+    sql_profiler.reset() # Drop app startup and registration
+    exercise(client, headers)
+    endpoints = sql_profiler.snapshot()["endpoints"]
+    endpoints.pop("(background)", None)
+
+    budget = {}
+    if os.path.exists(BUDGET_FILE):
+        with open(BUDGET_FILE) as f:
+            budget = json.load(f)
+
+    regressions = []
+    print(f"{'endpoint':<48} {'req':>4} {'avg':>6} {'max':>4} {'budget':>6}  flags")
+    for name, stats in sorted(endpoints.items()):
+        limit = budget.get(name)
+        flags = []
+        if stats["n_plus_one_requests"]:
+            flags.append("N+1")
+        if stats["repeated_statement_requests"]:
+            flags.append("repeated")
+        if limit is not None and stats["max_queries"] > limit:
+            flags.append("OVER BUDGET")
+        if "N+1" in flags or "OVER BUDGET" in flags:
+            regressions.append(name)
+        print(f"{name:<48} {stats['requests']:>4} {stats['avg_queries']:>6} {stats['max_queries']:>4} "
+              f"{limit if limit is not None else '-':>6}  {' '.join(flags)}")
+        for offender in stats["offenders"]:
+            print(f"    {offender['kind']} x{offender['max_per_request']}: {offender['sql']}")
+
+    if args.update:
+        with open(BUDGET_FILE, "w") as f:
+            json.dump({name: stats["max_queries"] for name, stats in sorted(endpoints.items())}, f, indent=2)
+            f.write("\n")
+        print(f"\nBudget written to {BUDGET_FILE}")
+    elif regressions:
+        print(f"\n{len(regressions)} endpoint(s) regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_sql_queries.py ---
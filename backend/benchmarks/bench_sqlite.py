@@ -0,0 +1,111 @@
+# --- START OF FILE backend/benchmarks/bench_sqlite.py ---
+"""
+Concurrent read/write throughput of the SQLite fallback database, with the
+previous setup (rollback journal, pooled connections that all write) vs. the
+tuned one (SQLITE_TUNING: WAL, synchronous=NORMAL, one writer connection and a
+pool of read-only connections).
+
+    cd backend && python benchmarks/bench_sqlite.py --readers 8 --writers 4 --seconds 5
+
+Readers list a user's 20 newest entries; writers insert an entry or update one,
+one transaction each. Reports operations per second, "database is locked"
+errors and latency per operation type. Each setup runs on a fresh database file.
+"""
+import argparse
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import exc, insert, select, update
+
+from _common import configure_database, describe, sample_text
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8, help="Reader threads")
+    parser.add_argument("--writers", type=int, default=4, help="Writer threads")
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--entries", type=int, default=2000, help="Entries seeded before the run")
+    args = parser.parse_args()
+
+    configure_database()
+    from app.core.config import settings
+    from app.db import database, models
+
+    entries, users = models.JournalEntry.__table__, models.User.__table__
+
+    def run(label, tuned):
+        settings.SQLITE_TUNING = tuned
+        url = f"sqlite:///{tempfile.mkdtemp(prefix='journal-sqlite-bench-')}/bench.db"
+        writer = database._build_engine(url)
+        reader = database._build_engine(url, reader=True) if tuned else writer
+        database.Base.metadata.create_all(writer)
+        with writer.begin() as conn:
+            conn.execute(insert(users), [{"email": f"u{i}@example.com", "hashed_password": "x"} for i in range(args.users)])
+            conn.execute(insert(entries), [{"title": f"t{i}", "content": sample_text(200, i), "owner_id": i % args.users + 1}
+                                           for i in range(args.entries)])
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        results = {"read": [], "write": [], "locked": 0}
+
+        def read_loop(seed):
+            rng, durations = random.Random(seed), []
+            while not stop.is_set():
+                start = time.perf_counter()
+                with reader.connect() as conn:
+                    conn.execute(select(entries).where(entries.c.owner_id == rng.randint(1, args.users))
+                                 .order_by(entries.c.created_at.desc()).limit(20)).all()
+                durations.append((time.perf_counter() - start) * 1000)
+            with lock:
+                results["read"].extend(durations)
+
+        def write_loop(seed):
+            rng, durations, locked = random.Random(seed), [], 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    with writer.begin() as conn:
+                        if rng.random() < 0.5:
+                            conn.execute(insert(entries).values(title="new", content=sample_text(200, seed),
+                                                                owner_id=rng.randint(1, args.users)))
+                        else:
+                            conn.execute(update(entries).where(entries.c.id == rng.randint(1, args.entries))
+                                         .values(content=sample_text(210, seed), version=entries.c.version + 1))
+                except exc.OperationalError as e:
+                    if "locked" not in str(e):
+                        raise
+                    locked += 1
+                    continue
+                durations.append((time.perf_counter() - start) * 1000)
+            with lock:
+                results["write"].extend(durations)
+                results["locked"] += locked
+
+        threads = [threading.Thread(target=read_loop, args=(i,)) for i in range(args.readers)]
+        threads += [threading.Thread(target=write_loop, args=(100 + i,)) for i in range(args.writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        for bind in {writer, reader}:
+            bind.dispose()
+
+        print(f"{label}")
+        for kind in ("read", "write"):
+            durations = results[kind]
+            print(f"  {kind:<5} {len(durations) / args.seconds:9.1f} ops/s | "
+                  f"{describe(durations) if durations else 'no operations completed'}")
+        print(f"  'database is locked' errors: {results['locked']}")
+
+    print(f"{args.readers} readers, {args.writers} writers, {args.seconds:g} s, {args.entries} seeded entries\n")
+    run("Untuned (rollback journal, shared read/write pool)", tuned=False)
+    run("Tuned (WAL, 1 writer + read-only pool)", tuned=True)
+
+if __name__ == "__main__":
+    main()
+# --- END OF FILE backend/benchmarks/bench_sqlite.py ---
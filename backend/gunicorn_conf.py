@@ -0,0 +1,53 @@
+# --- START OF FILE backend/gunicorn_conf.py ---
+"""
+Gunicorn settings for production: `python run.py --prod` or
+`gunicorn -c gunicorn_conf.py app.main:app`.
+
+Every value can be overridden with the environment variable named next to it.
+"""
+import multiprocessing
+import os
+
+# --- Workers ---
+# Async workers: one per core is enough, each runs its own event loop (uvloop + httptools when installed)
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+os.environ["WEB_CONCURRENCY"] = str(workers) # The app's settings read it (per-process state such as autosave coalescing)
+try: # Maintained home of the worker class; uvicorn.workers is deprecated
+    import uvicorn_worker # noqa: F401
+    worker_class = "uvicorn_worker.UvicornWorker"
+except ImportError:
+    worker_class = "uvicorn.workers.UvicornWorker"
+
+# Import the app once in the master and fork it: settings, routers and the precompressed
+# static assets are shared copy-on-write, and import errors fail the deploy before any worker starts
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# --- Socket ---
+bind = os.getenv("BIND", f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}")
+backlog = int(os.getenv("GUNICORN_BACKLOG", 2048)) # Pending connections queued by the kernel
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5)) # Seconds; keep above the proxy's idle timeout to its upstream
+
+# --- Timeouts / graceful drain ---
+# Workers stop accepting on SIGTERM and get graceful_timeout seconds to finish in-flight requests
+# (chat replies included) before they are killed
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60)) # Heartbeat timeout of a stuck worker
+# Recycle workers now and then (with jitter, so they do not restart together) to bound memory growth
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 1000))
+
+# --- Logging ---
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+def post_fork(server, worker):
+    # The master opened DB connections while importing the app (init_db); a forked worker
+    # must not share those sockets, so drop them from its pools without closing them
+    from app.db import database
+    database.dispose_engines(close=False)
+    server.log.info(f"Worker {worker.pid} ready (pools reset after fork)")
+
+def worker_int(worker):
+    worker.log.info(f"Worker {worker.pid} interrupted, draining")
+# --- END OF FILE backend/gunicorn_conf.py ---
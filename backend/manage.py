@@ -0,0 +1,253 @@
+import argparse
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import database
+
+def rebuild_stats(args):
+    from app.services import stats_service
+    database.init_db()
+    db = database.use_primary(database.SessionLocal())
+    try:
+        scanned = stats_service.rebuild(db, user_id=args.user_id)
+        print(f"Rebuilt writing stats from {scanned} entries.")
+    finally:
+        db.close()
+
+def score_moods(args):
+    from sqlalchemy import select
+    from app.db import models
+    from app.services import mood_service
+    database.init_db()
+    classifier = mood_service.MoodClassifier().load()
+    db = database.use_primary(database.SessionLocal())
+    try:
+        query = select(models.JournalEntry.id).order_by(models.JournalEntry.id)
+        if args.user_id is not None:
+            query = query.where(models.JournalEntry.owner_id == args.user_id)
+        if not args.rescore:
+            query = query.where(~models.JournalEntry.id.in_(select(models.JournalMoodScore.entry_id)))
+        entry_ids = list(db.scalars(query))
+        scored = 0
+        for i in range(0, len(entry_ids), args.batch_size):
+            scored += mood_service.score_entries(db, classifier, entry_ids[i:i + args.batch_size])
+            print(f"Scored {scored}/{len(entry_ids)} entries", end="\r")
+        print(f"\nScored {scored} entries with {classifier.model_name}.")
+    finally:
+        db.close()
+
+def train_content_dict(args):
+    from sqlalchemy import func, select
+    from app.core.config import settings
+    from app.db import compression, models
+    out_dir = args.out_dir or settings.CONTENT_DICT_DIR
+    if not out_dir:
+        sys.exit("Set CONTENT_DICT_DIR (or pass --out-dir) to store the dictionary.")
+    db = database.SessionLocal()
+    try:
+        samples = list(db.scalars(
+            select(models.JournalEntry.content).order_by(func.random()).limit(args.samples)
+        ))
+    finally:
+        db.close()
+    if len(samples) < 10:
+        sys.exit(f"Only {len(samples)} entries found; need more samples to train a useful dictionary.")
+    zdict = compression.train_dictionary(samples, dict_size=args.dict_size)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"content-{zdict.dict_id()}{compression.DICT_SUFFIX}")
+    with open(path, "wb") as handle:
+        handle.write(zdict.as_bytes())
+    print(f"Trained a {len(zdict)}-byte dictionary from {len(samples)} entries: {path}")
+    print("New writes use the newest dictionary after a restart; keep older files, existing rows need them.")
+
+def compress_content(args):
+    from sqlalchemy import Text, bindparam, select, type_coerce, update
+    from app.db import compression, models
+    database.init_db()
+    entry = models.JournalEntry
+    raw_content = type_coerce(entry.content, Text) # Stored form, bypassing CompressedText
+    db = database.use_primary(database.SessionLocal())
+    changed = scanned = 0
+    last_id = 0
+    try:
+        while True:
+            rows = db.execute(
+                select(entry.id, entry.updated_at, raw_content.label("stored"))
+                .where(entry.id > last_id).order_by(entry.id).limit(args.batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            params = []
+            for row in rows:
+                text = compression.content_codec.decode(row.stored)
+                if args.decompress and not text.startswith(compression.MARKER):
+                    stored = text
+                else:
+                    stored = compression.content_codec.encode(text)
+                if stored != row.stored:
+                    # Keep updated_at: the entry did not change for the user (and its ETag stays valid)
+                    params.append({"entry_id": row.id, "stored": stored, "kept_updated_at": row.updated_at})
+            if params:
+                db.execute(
+                    update(entry.__table__)
+                    .where(entry.__table__.c.id == bindparam("entry_id"))
+                    .values(content=type_coerce(bindparam("stored"), Text), updated_at=bindparam("kept_updated_at")),
+                    params,
+                )
+                db.commit()
+            changed += len(params)
+            scanned += len(rows)
+            print(f"Scanned {scanned} entries, rewrote {changed}", end="\r")
+    finally:
+        db.close()
+    print(f"\n{'Decompressed' if args.decompress else 'Compressed'} {changed} of {scanned} entries.")
+
+def build_digests(args):
+    from app.services import digest_service
+    database.init_db()
+    db = database.use_primary(database.SessionLocal())
+    try:
+        marked = digest_service.backfill(db, user_id=args.user_id)
+    finally:
+        db.close()
+    print(f"Marked {marked} weeks for summarizing.")
+    scheduler = digest_service.DigestScheduler()
+    rebuilt = 0
+    while True: # No settle period: summarize everything now
+        done = scheduler.run_once(settle_seconds=0)
+        if not done:
+            break
+        rebuilt += done
+        print(f"Rebuilt {rebuilt} digests", end="\r")
+    print(f"\nRebuilt {rebuilt} digests ({scheduler.failed} failed, retried by the scheduler later).")
+
+def usage_report(args):
+    from collections import defaultdict
+    from datetime import datetime, timedelta, timezone
+    from app.services import usage_service
+    database.init_db()
+    end = datetime.now(timezone.utc).date()
+    start = end - timedelta(days=args.days - 1)
+    db = database.SessionLocal()
+    try:
+        rows = usage_service.top_users(db, start, end, limit=args.top)
+    finally:
+        db.close()
+    users = defaultdict(lambda: {"email": "", "requests": 0, "tokens": 0, "features": {}})
+    for row in rows:
+        user = users[row.user_id]
+        user["email"] = row.email
+        user["requests"] += row.requests
+        user["tokens"] += row.prompt_tokens + row.output_tokens
+        user["features"][row.feature] = row.prompt_tokens + row.output_tokens
+    print(f"Gemini tokens {start} .. {end} (UTC), top {args.top} users:")
+    for user_id, user in sorted(users.items(), key=lambda item: -item[1]["tokens"]):
+        features = ", ".join(f"{name} {tokens:,}" for name, tokens in sorted(user["features"].items()))
+        print(f"  {user_id:>6}  {user['email']:<32} {user['tokens']:>12,} tokens  {user['requests']:>6} requests  ({features})")
+
+def _require_partitioning():
+    from app.db import partitioning
+    if not partitioning.is_enabled(database.SQLALCHEMY_DATABASE_URL):
+        sys.exit("Journal partitioning is off: set JOURNAL_PARTITIONING (time, owner or time_owner) and use PostgreSQL.")
+    return partitioning
+
+def list_partitions(args):
+    partitioning = _require_partitioning()
+    with database.engine.connect() as connection:
+        print(f"{partitioning.TABLE}: {partitioning.mode()} partitioning")
+        for row in partitioning.list_partitions(connection):
+            print(f"  {row['name']:<32} {row['bound']:<60} ~{row['estimated_rows']} rows")
+
+def ensure_partitions(args):
+    partitioning = _require_partitioning()
+    database.init_db()
+    with database.engine.begin() as connection:
+        created = partitioning.ensure_partitions(connection, ahead=args.ahead)
+    print(f"Created {len(created)} partition(s){': ' + ', '.join(created) if created else ''}.")
+
+def detach_partition(args):
+    partitioning = _require_partitioning()
+    if args.concurrently:
+        with database.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            partitioning.detach_partition(connection, args.name, concurrently=True)
+    else:
+        with database.engine.begin() as connection:
+            partitioning.detach_partition(connection, args.name)
+    print(f"Detached {args.name}; it is now a standalone table (archive it with pg_dump -t {args.name}, then drop it).")
+
+def attach_partition(args):
+    partitioning = _require_partitioning()
+    with database.engine.begin() as connection:
+        partitioning.attach_partition(connection, args.name)
+    print(f"Attached {args.name}.")
+
+def partition_journal(args):
+    partitioning = _require_partitioning()
+    database.init_db()
+    with database.engine.begin() as connection:
+        copied = partitioning.migrate_plain_table(connection)
+    print(f"Copied {copied} entries into the partitioned {partitioning.TABLE}. "
+          f"The old table is kept as {partitioning.TABLE}_unpartitioned; drop it once verified.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance commands for the AI Journal backend.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-stats", help="Backfill/repair the writing stats aggregates from journal entries")
+    rebuild.add_argument("--user-id", type=int, default=None, help="Only rebuild this user (default: everyone)")
+    rebuild.set_defaults(func=rebuild_stats)
+
+    moods = commands.add_parser("score-moods", help="Backfill local mood scores for entries that have none")
+    moods.add_argument("--user-id", type=int, default=None, help="Only score this user's entries")
+    moods.add_argument("--rescore", action="store_true", help="Also re-score entries that already have a score")
+    moods.add_argument("--batch-size", type=int, default=32)
+    moods.set_defaults(func=score_moods)
+
+    train = commands.add_parser("train-content-dict", help="Train a zstd dictionary for content compression from existing entries")
+    train.add_argument("--samples", type=int, default=5000, help="Number of random entries to sample")
+    train.add_argument("--dict-size", type=int, default=64 * 1024, help="Dictionary size in bytes")
+    train.add_argument("--out-dir", default=None, help="Default: CONTENT_DICT_DIR")
+    train.set_defaults(func=train_content_dict)
+
+    compress = commands.add_parser("compress-content", help="Rewrite stored entry bodies with the current CONTENT_COMPRESSION settings")
+    compress.add_argument("--decompress", action="store_true", help="Store every entry as plain text again")
+    compress.add_argument("--batch-size", type=int, default=500)
+    compress.set_defaults(func=compress_content)
+
+    digests = commands.add_parser("build-digests", help="Summarize every week and month of journal entries now (DIGESTS_*)")
+    digests.add_argument("--user-id", type=int, default=None, help="Only this user's digests")
+    digests.set_defaults(func=build_digests)
+
+    usage = commands.add_parser("usage-report", help="Users with the most Gemini tokens over the last days, per feature")
+    usage.add_argument("--days", type=int, default=7)
+    usage.add_argument("--top", type=int, default=20)
+    usage.set_defaults(func=usage_report)
+
+    parts = commands.add_parser("list-partitions", help="Show the journal_entries partitions (JOURNAL_PARTITIONING)")
+    parts.set_defaults(func=list_partitions)
+
+    ensure = commands.add_parser("ensure-partitions", help="Create upcoming time partitions of journal_entries (run monthly, e.g. from cron)")
+    ensure.add_argument("--ahead", type=int, default=None, help="Ranges to create past the current one (default: JOURNAL_PARTITIONS_AHEAD)")
+    ensure.set_defaults(func=ensure_partitions)
+
+    detach = commands.add_parser("detach-partition", help="Detach an old time partition for archiving, e.g. journal_entries_p202401")
+    detach.add_argument("name")
+    detach.add_argument("--concurrently", action="store_true", help="Do not block queries while detaching (PostgreSQL 14+)")
+    detach.set_defaults(func=detach_partition)
+
+    attach = commands.add_parser("attach-partition", help="Attach a detached or restored time partition again")
+    attach.add_argument("name")
+    attach.set_defaults(func=attach_partition)
+
+    migrate = commands.add_parser("partition-journal", help="Convert an existing plain journal_entries table into the partitioned layout")
+    migrate.set_defaults(func=partition_journal)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
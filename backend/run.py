@@ -1,3 +1,4 @@
+import argparse
 import os
 import sys
 import uvicorn
@@ -5,7 +6,35 @@ import uvicorn
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.main import app
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def run_production(args):
+    """Multi-worker server: gunicorn + uvicorn workers with the app preloaded (see gunicorn_conf.py)."""
+    if args.workers:
+        os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    os.environ.setdefault("WEB_CONCURRENCY", str(os.cpu_count() or 1))
+    os.environ.setdefault("BIND", f"{args.host or '0.0.0.0'}:{args.port}")
+    try:
+        import gunicorn # noqa: F401
+    except ImportError: # e.g. Windows: plain uvicorn workers, without preload
+        print("gunicorn not available, falling back to uvicorn --workers")
+        uvicorn.run("app.main:app", host=args.host or "0.0.0.0", port=args.port,
+                    workers=int(os.environ["WEB_CONCURRENCY"]), loop="auto", http="auto",
+                    backlog=2048, timeout_keep_alive=5, timeout_graceful_shutdown=30,
+                    proxy_headers=True, app_dir=BACKEND_DIR)
+        return
+    os.chdir(BACKEND_DIR)
+    os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "app.main:app"])
 
 if __name__ == "__main__":
-    uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the AI Journal backend.")
+    parser.add_argument("--prod", action="store_true", help="Production mode: multi-worker gunicorn, no reload")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (--prod only; default: one per core)")
+    parser.add_argument("--host", default=None, help="Default: 127.0.0.1, or 0.0.0.0 with --prod")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    args = parser.parse_args()
+
+    if args.prod:
+        run_production(args)
+    else:
+        uvicorn.run("app.main:app", host=args.host or "127.0.0.1", port=args.port, reload=True)
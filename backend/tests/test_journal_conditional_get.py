@@ -0,0 +1,78 @@
+# --- START OF FILE backend/tests/test_journal_conditional_get.py ---
+"""
+Conditional GET on journal entries and listings must never answer 304 for content the
+client has not seen, e.g. after the newest entry is deleted and a new one created.
+
+    cd backend && python -m pytest -q tests
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Settings and the engine are read at import time: point them at a throwaway SQLite file first
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.db"
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="module")
+def headers(client):
+    credentials = {"email": "etag@example.com", "password": "secret1"}
+    assert client.post("/api/v1/auth/register", json=credentials).status_code == 201
+    token = client.post("/api/v1/auth/token", data={"username": credentials["email"],
+                                                  "password": credentials["password"]}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def _create(client, headers, title):
+    response = client.post("/api/v1/journal/", json={"title": title, "content": f"{title} body"}, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def test_delete_then_create_invalidates_validators(client, headers):
+    _create(client, headers, "first")
+    newest = _create(client, headers, "second")
+    entry = client.get(f"/api/v1/journal/{newest}", headers=headers)
+    listing = client.get("/api/v1/journal/", headers=headers)
+    summaries = client.get("/api/v1/journal/summary", headers=headers)
+    assert "last-modified" not in listing.headers and "last-modified" not in summaries.headers
+
+    assert client.delete(f"/api/v1/journal/{newest}", headers=headers).status_code == 204
+    replacement = _create(client, headers, "third")
+    assert replacement != newest # No id reuse
+
+    response = client.get(f"/api/v1/journal/{newest}", headers={**headers, "If-None-Match": entry.headers["etag"]})
+    assert response.status_code == 404
+    response = client.get(f"/api/v1/journal/{replacement}", headers={**headers, "If-None-Match": entry.headers["etag"]})
+    assert response.status_code == 200 and response.json()["title"] == "third"
+    for old in (listing, summaries):
+        path = "/api/v1/journal/" if old is listing else "/api/v1/journal/summary"
+        response = client.get(path, headers={**headers, "If-None-Match": old.headers["etag"]})
+        assert response.status_code == 200
+        assert [item["title"] for item in response.json()] == ["third", "first"]
+
+
+def test_delete_is_not_hidden_by_if_modified_since(client, headers):
+    keep = _create(client, headers, "keep")
+    doomed = _create(client, headers, "doomed")
+    listing = client.get("/api/v1/journal/", headers=headers)
+    assert client.delete(f"/api/v1/journal/{doomed}", headers=headers).status_code == 204
+
+    response = client.get("/api/v1/journal/", headers={**headers, "If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"})
+    assert response.status_code == 200
+    assert doomed not in [item["id"] for item in response.json()] and keep in [item["id"] for item in response.json()]
+    response = client.get("/api/v1/journal/", headers={**headers, "If-None-Match": listing.headers["etag"]})
+    assert response.status_code == 200
+# --- END OF FILE backend/tests/test_journal_conditional_get.py ---
@@ -30,6 +30,7 @@ class ApiService {
     this.token = null;
     localStorage.removeItem("journalToken");
     console.log("Token cleared from localStorage");
+    if (this.chatSocket) this.chatSocket.close(); // The socket is bound to the old token's user
   }
 
   // Get headers for requests
@@ -200,6 +201,12 @@ class ApiService {
     return this.request(`${API_V1_PREFIX}/journal/?skip=${skip}&limit=${limit}`);
   }
 
+  // Lightweight listing (id, title, dates, preview) for the sidebar
+  async getJournalSummaries(skip = 0, limit = 100) {
+    console.log(`Fetching journal summaries (skip=${skip}, limit=${limit})`);
+    return this.request(`${API_V1_PREFIX}/journal/summary?skip=${skip}&limit=${limit}`);
+  }
+
   async getJournalEntry(id) {
     console.log("Fetching journal entry:", id);
     return this.request(`${API_V1_PREFIX}/journal/${id}`);
@@ -221,6 +228,16 @@ class ApiService {
      });
    }
 
+   async autosaveJournalEntry(id, baseVersion, edits, title = null) {
+     // Sends only what changed since baseVersion; returns { id, version, pending }
+     const body = { base_version: baseVersion, edits };
+     if (title !== null) body.title = title;
+     return this.request(`${API_V1_PREFIX}/journal/${id}/autosave`, {
+         method: 'PATCH',
+         body
+     });
+   }
+
    async deleteJournalEntry(id) {
      console.log("Deleting journal entry:", id);
      return this.request(`${API_V1_PREFIX}/journal/${id}`, {
@@ -247,6 +264,60 @@ class ApiService {
     // Errors thrown by request/handleResponse will propagate up
   }
 
+  // --- Chat over WebSocket: authenticated once per socket, replies streamed in chunks ---
+  openChatSocket() {
+    if (!this.token || !("WebSocket" in window)) {
+      return Promise.reject(new Error("WebSocket chat unavailable"));
+    }
+    if (this.chatSocket && this.chatSocket.readyState === WebSocket.OPEN) return Promise.resolve(this.chatSocket);
+    if (this.chatSocketPromise) return this.chatSocketPromise;
+
+    const base = this.baseURL || window.location.origin;
+    const url = `${base.replace(/^http/, "ws")}${API_V1_PREFIX}/chat/ws`;
+    this.chatSocketPromise = new Promise((resolve, reject) => {
+      const socket = new WebSocket(url);
+      // The token goes in the first frame, not the URL: access logs record URLs
+      socket.onopen = () => socket.send(JSON.stringify({ type: "auth", token: this.token }));
+      socket.onmessage = (event) => {
+        const frame = JSON.parse(event.data);
+        if (frame.type === "ready") {
+          this.chatSocket = socket;
+          resolve(socket);
+        } else if (frame.type === "ping") {
+          socket.send(JSON.stringify({ type: "pong" })); // Heartbeat
+        } else if (this.chatTurn) {
+          this.chatTurn(frame);
+        }
+      };
+      socket.onclose = () => {
+        if (this.chatSocket === socket) this.chatSocket = null;
+        this.chatSocketPromise = null;
+        if (this.chatTurn) this.chatTurn({ type: "error", status: 0, detail: "Chat connection closed." });
+        reject(new Error("WebSocket chat unavailable")); // No-op if the socket had opened
+      };
+    });
+    return this.chatSocketPromise;
+  }
+
+  async streamChatMessage(message, onChunk) {
+    // Rejects with "WebSocket chat unavailable" if no socket could be opened (callers fall back to HTTP)
+    const socket = await this.openChatSocket();
+    return new Promise((resolve, reject) => {
+      this.chatTurn = (frame) => {
+        if (frame.type === "chunk") {
+          onChunk(frame.text);
+        } else if (frame.type === "done") {
+          this.chatTurn = null;
+          resolve({ reply: frame.reply });
+        } else if (frame.type === "error") {
+          this.chatTurn = null;
+          reject(new Error(`Error ${frame.status}: ${frame.detail}`));
+        }
+      };
+      socket.send(JSON.stringify({ type: "message", message }));
+    });
+  }
+
   async getChatContext() {
     console.log("Getting chat context from API");
     // Useful for checking if user has entries before allowing chat UI interaction
@@ -256,6 +327,14 @@ class ApiService {
      // Expects List[JournalEntry] or 404 if no entries
   }
 
+  async getChatHistory(before = null) {
+    // Messages of the current conversation, oldest first; pass next_cursor back as `before` for older ones
+    const query = before !== null ? `?before=${before}` : '';
+    return this.request(`${API_V1_PREFIX}/chat/history${query}`, {
+        method: 'GET'
+    });
+  }
+
 }
 
 // Create and export a single instance of the API service
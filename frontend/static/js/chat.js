@@ -18,6 +18,7 @@ class ChatService {
         this.hasEntries = false; // Flag to check if user has journal entries
         this.isProcessing = false; // Flag to prevent multiple submissions
         this.initialCheckDone = false; // Flag to ensure initial check runs once
+        this.loadEarlierButton = null; // Shown while older stored messages remain
 
         // Log initialization status
         console.log("Chat elements found:", {
@@ -76,10 +77,11 @@ class ChatService {
 
         try {
             // Always get fresh context from server
-            const entries = await apiService.getChatContext(); // This will now prepare a new chat session
+            const entries = await apiService.getChatContext(); // Prepares the chat session (reused server-side if no entry changed)
             this.hasEntries = true; // If successful, user has entries
             console.log("Initial entry check successful. User has entries.");
             this.displayWelcomeMessage(); // Display standard welcome message
+            await this.loadHistory(); // Stored messages of the resumed conversation go above the welcome
 
         } catch (error) {
             console.error('Error checking for entries:', error);
@@ -119,6 +121,36 @@ class ChatService {
         this.displayMessage({ role: 'ai', content: welcomeText });
     }
 
+    async loadHistory(before = null) {
+        let page;
+        try {
+            page = await apiService.getChatHistory(before);
+        } catch (error) {
+            console.error('Error loading chat history:', error); // Not fatal: the chat still works
+            return;
+        }
+        if (this.loadEarlierButton) this.loadEarlierButton.remove();
+        // Older messages are inserted above what is already shown, keeping the scroll position
+        const anchor = this.messagesContainer.firstChild;
+        const previousHeight = this.messagesContainer.scrollHeight;
+        page.messages.forEach(message => {
+            const role = message.role === 'model' ? 'ai' : message.role;
+            this.displayMessage({ role, content: message.content }, anchor);
+        });
+        if (page.next_cursor !== null) {
+            this.loadEarlierButton = document.createElement('button');
+            this.loadEarlierButton.className = 'load-earlier-button';
+            this.loadEarlierButton.textContent = 'Xem tin nhắn cũ hơn';
+            this.loadEarlierButton.addEventListener('click', () => this.loadHistory(page.next_cursor));
+            this.messagesContainer.insertBefore(this.loadEarlierButton, this.messagesContainer.firstChild);
+        }
+        if (before === null) {
+            this.scrollToBottom();
+        } else {
+            this.messagesContainer.scrollTop += this.messagesContainer.scrollHeight - previousHeight;
+        }
+    }
+
     async handleSendMessage() {
         if (!this.messageInput || !this.sendButton) return; // Guard
         const userMessage = this.messageInput.value.trim();
@@ -141,11 +173,29 @@ class ChatService {
         this.messageInput.style.height = 'auto';
         // Don't refocus immediately, wait for AI response
 
+        let aiContent = null; // Message bubble filled while the reply streams in
         try {
-            const response = await apiService.sendChatMessage(userMessage);
+            let response;
+            let streamed = '';
+            try {
+                response = await apiService.streamChatMessage(userMessage, (text) => {
+                    if (!aiContent) aiContent = this.displayMessage({ role: 'ai', content: '' });
+                    streamed += text;
+                    aiContent.textContent = streamed; // Plain text while streaming, markdown once done
+                    this.scrollToBottom();
+                });
+            } catch (error) {
+                if (error.message !== 'WebSocket chat unavailable') throw error;
+                // No socket (blocked by a proxy, old browser...): same turn over HTTP
+                response = await apiService.sendChatMessage(userMessage);
+            }
 
             if (response && typeof response.reply === 'string') {
-                this.displayMessage({ role: 'ai', content: response.reply });
+                if (aiContent) {
+                    this.renderContent(aiContent, 'ai', response.reply);
+                } else {
+                    this.displayMessage({ role: 'ai', content: response.reply });
+                }
             } else {
                  console.error('Invalid response format from server:', response);
                 throw new Error('Phản hồi không hợp lệ từ máy chủ.');
@@ -184,7 +234,7 @@ class ChatService {
         }
     }
 
-    displayMessage(messageData) { // { role: 'user'/'ai', content: '...' }
+    displayMessage(messageData, before = null) { // { role: 'user'/'ai', content: '...' }; `before` inserts above that node
         if (!this.messagesContainer) return;
 
         const messageDiv = document.createElement('div');
@@ -192,27 +242,37 @@ class ChatService {
 
         const contentDiv = document.createElement('div');
         contentDiv.className = 'message-content';
+        this.renderContent(contentDiv, messageData.role, messageData.content);
+
+        messageDiv.appendChild(contentDiv);
+        if (before) {
+            this.messagesContainer.insertBefore(messageDiv, before);
+        } else {
+            this.messagesContainer.appendChild(messageDiv);
+            this.scrollToBottom();
+        }
+        return contentDiv; // Lets a streamed reply be filled in place
+    }
 
+    renderContent(contentDiv, role, content) {
+        contentDiv.innerHTML = '';
         try {
-            if (messageData.role === 'ai' && window.marked) {
+            if (role === 'ai' && window.marked) {
                 // Sanitize potentially harmful HTML before parsing markdown
                 // Basic sanitization (more robust needed for production)
-                // const sanitizedHtml = messageData.content.replace(/<script.*?>.*?<\/script>/gi, '');
-                contentDiv.innerHTML = marked.parse(messageData.content); // Use parse for block elements
+                // const sanitizedHtml = content.replace(/<script.*?>.*?<\/script>/gi, '');
+                contentDiv.innerHTML = marked.parse(content); // Use parse for block elements
             } else {
                  const p = document.createElement('p');
-                 p.textContent = messageData.content;
+                 p.textContent = content;
                  contentDiv.appendChild(p);
             }
         } catch (error) {
             console.error('Error parsing markdown:', error);
             const p = document.createElement('p');
-            p.textContent = messageData.content; // Fallback to plain text
+            p.textContent = content; // Fallback to plain text
             contentDiv.appendChild(p);
         }
-
-        messageDiv.appendChild(contentDiv);
-        this.messagesContainer.appendChild(messageDiv);
         this.scrollToBottom();
     }
 
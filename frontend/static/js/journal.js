@@ -30,9 +30,13 @@ class JournalService {
 
 
     // State
-    this.entries = []; // Local cache of entries
+    this.entries = []; // Local cache of entry summaries (no full content)
+    this.currentEntry = null; // Full data of the entry being viewed
     this.currentEntryId = null; // ID of the currently viewed/edited entry
     this.isEditing = false;
+    this.autosaveTimer = null;
+    this.autosaveInFlight = false;
+    this.autosaved = null; // { id, version, title, content } last acknowledged by the server while editing
 
     // Ensure essential elements exist before proceeding
     if (!this.entriesList || !this.entryView || !this.entryEditor || !this.newEntryBtn) {
@@ -58,6 +62,8 @@ class JournalService {
     if (this.getAiBtn) this.getAiBtn.addEventListener("click", this.handleGetAIConsultation.bind(this));
     if (this.editEntryBtn) this.editEntryBtn.addEventListener("click", this.showEditEntryForm.bind(this));
     if (this.deleteEntryBtn) this.deleteEntryBtn.addEventListener("click", this.handleDeleteEntry.bind(this));
+    if (this.titleInput) this.titleInput.addEventListener("input", this.scheduleAutosave.bind(this));
+    if (this.contentInput) this.contentInput.addEventListener("input", this.scheduleAutosave.bind(this));
 
 
     // Initial load of journal entries
@@ -68,7 +74,7 @@ class JournalService {
      if (!this.entriesList) return;
      this.entriesList.innerHTML = '<p class="text-center text-muted">Đang tải danh sách...</p>';
     try {
-      this.entries = await apiService.getJournalEntries();
+      this.entries = await apiService.getJournalSummaries();
       this.renderEntriesList();
 
       // Automatically select the first entry if available, otherwise show placeholder
@@ -143,6 +149,7 @@ class JournalService {
        // API service handles 401/404 appropriately
       const entry = await apiService.getJournalEntry(id);
       this.currentEntryId = entry.id;
+      this.currentEntry = entry;
       this.isEditing = false; // Ensure we are in view mode
 
       // Update entry view elements
@@ -208,8 +215,8 @@ class JournalService {
      console.log(`Showing edit form for entry ${this.currentEntryId}`);
      this.isEditing = true;
 
-     // Find the current entry data from cache (assuming it's loaded)
-     const entry = this.entries.find(e => e.id === this.currentEntryId);
+     // The sidebar only holds summaries, so edit from the fully loaded entry being viewed
+     const entry = this.currentEntry && this.currentEntry.id === this.currentEntryId ? this.currentEntry : null;
      if (!entry) {
          showNotification("Không tìm thấy dữ liệu bài viết để chỉnh sửa.", true);
          return;
@@ -221,6 +228,7 @@ class JournalService {
      this.titleInput.value = entry.title;
      this.contentInput.value = entry.content;
      this.editorTitle.textContent = "Chỉnh sửa bài viết"; // Set editor title
+     this.autosaved = { id: entry.id, version: entry.version, title: entry.title, content: entry.content };
 
      // Show editor, hide entry view and placeholder
      this.entryView.classList.add("hidden");
@@ -230,8 +238,64 @@ class JournalService {
    }
 
 
+  // --- Autosave (edit mode only): sends a text diff against the last acknowledged version ---
+  scheduleAutosave() {
+    if (!this.isEditing || !this.autosaved) return;
+    clearTimeout(this.autosaveTimer);
+    this.autosaveTimer = setTimeout(() => this.autosave(), 1500);
+  }
+
+  stopAutosave() {
+    clearTimeout(this.autosaveTimer);
+    this.autosaveTimer = null;
+    this.autosaved = null;
+  }
+
+  // Smallest single splice turning `before` into `after` (common prefix and suffix are kept)
+  diffText(before, after) {
+    let start = 0;
+    while (start < before.length && start < after.length && before[start] === after[start]) start++;
+    let end = 0;
+    while (end < before.length - start && end < after.length - start
+           && before[before.length - 1 - end] === after[after.length - 1 - end]) end++;
+    return { start, delete: before.length - start - end, insert: after.slice(start, after.length - end) };
+  }
+
+  async autosave() {
+    const saved = this.autosaved;
+    if (!saved) return;
+    if (this.autosaveInFlight) { // The next diff needs the version this one returns
+      this.scheduleAutosave();
+      return;
+    }
+    const title = this.titleInput.value.trim();
+    const content = this.contentInput.value;
+    if (!title || !content.trim()) return; // Not a valid entry yet
+    if (title === saved.title && content === saved.content) return;
+
+    const edits = content === saved.content ? [] : [this.diffText(saved.content, content)];
+    this.autosaveInFlight = true;
+    try {
+      const result = await apiService.autosaveJournalEntry(saved.id, saved.version, edits,
+                                                           title === saved.title ? null : title);
+      if (this.autosaved === saved) {
+        this.autosaved = { id: saved.id, version: result.version, title, content };
+      }
+    } catch (error) {
+      console.error("Autosave failed:", error);
+      if (error.message && error.message.includes("409")) {
+        // Changed elsewhere: stop autosaving; "Lưu bài viết" still saves the whole entry
+        this.stopAutosave();
+        showNotification("Bài viết đã được thay đổi ở nơi khác. Tự động lưu đã tạm dừng.", true);
+      }
+    } finally {
+      this.autosaveInFlight = false;
+    }
+  }
+
   cancelEditOrView() {
      console.log("Cancel action triggered");
+     this.stopAutosave();
     // If currently editing, go back to viewing that entry
     if (this.isEditing && this.currentEntryId) {
       this.viewEntry(this.currentEntryId);
@@ -261,6 +325,7 @@ class JournalService {
         return;
     }
 
+     this.stopAutosave(); // The full save below supersedes pending autosaves
      const submitButton = this.entryForm.querySelector('button[type="submit"]');
      submitButton.disabled = true;
      submitButton.textContent = 'Đang lưu...';